@@ -1,29 +1,220 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import os, json, logging, io, asyncio, uuid
-from datetime import datetime
+import os, json, logging, io, asyncio, uuid, time, threading, html, warnings, functools, itertools
+import gzip, tempfile, argparse, cProfile, pstats, gc, tracemalloc, weakref, sys, signal
+from contextvars import ContextVar
+from types import SimpleNamespace
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict, deque
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
 from pathlib import Path
 from contextlib import contextmanager
-from typing import Optional, Union
+from typing import Callable, Optional, Union
 
 import numpy as np
 import pandas as pd
 import yfinance as yf
 import requests
+import httpx
 
 import matplotlib
 matplotlib.use("Agg")
 import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
 from matplotlib import colormaps
+from matplotlib.collections import LineCollection
 from matplotlib.colors import Normalize
+from PIL import Image
 
-from telegram import Update
-from telegram.ext import Application, CommandHandler, ContextTypes
+from telegram import (
+    InlineQueryResultArticle,
+    InlineQueryResultCachedPhoto,
+    InputTextMessageContent,
+    Update,
+)
+from telegram.error import RetryAfter
+from telegram.ext import Application, CommandHandler, ContextTypes, InlineQueryHandler
 
 # ---------------------- CONFIG ----------------------
 TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "REEMPLAZA_CON_TU_TOKEN")
 STATE_FILE = Path("state.json")  # persistencia por chat_id
+# Varios bots en un proceso: JSON [{"name", "token" | "token_env", "tickers", "state_file"}]
+BOTS_FILE = os.getenv("CCL_BOTS_FILE")
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Representación compacta (float32 + índice int32 de días) en el camino caliente
+COMPACT_PRICES = _env_flag("CCL_COMPACT_PRICES")
+# Reporta bytes por etapa en get_var / plot_tickers_usd
+MEMORY_REPORT = _env_flag("CCL_MEMORY_REPORT")
+
+# Circuit breaker de Yahoo Finance
+YAHOO_FAILURE_THRESHOLD = int(os.getenv("YAHOO_FAILURE_THRESHOLD", "5"))
+YAHOO_RESET_TIMEOUT = float(os.getenv("YAHOO_RESET_TIMEOUT", "60"))
+YAHOO_SLOW_CALL_SECONDS = float(os.getenv("YAHOO_SLOW_CALL_SECONDS", "25"))
+STALE_REFRESH_ATTEMPTS = int(os.getenv("STALE_REFRESH_ATTEMPTS", "10"))
+
+# Cliente async propio para el endpoint chart de Yahoo (en lugar de yf.download)
+YAHOO_ASYNC_CLIENT = _env_flag("CCL_ASYNC_CLIENT")
+YAHOO_CHART_URL = os.getenv("YAHOO_CHART_URL", "https://query1.finance.yahoo.com")
+YAHOO_MAX_CONNECTIONS = int(os.getenv("YAHOO_MAX_CONNECTIONS", "8"))
+
+# Cola de render: concurrencia y umbral de saturación (→ /cclvars en modo texto)
+RENDER_CONCURRENCY = int(os.getenv("CCL_RENDER_CONCURRENCY", "2"))
+RENDER_QUEUE_LIMIT = int(os.getenv("CCL_RENDER_QUEUE_LIMIT", "8"))
+TEXT_ONLY_FLAGS = ("txt", "texto", "text")
+
+# Respuestas progresivas: tamaño de lote y cadencia de edición del placeholder
+PROGRESS_CHUNK_SIZE = int(os.getenv("CCL_PROGRESS_CHUNK_SIZE", "10"))
+PROGRESS_EDIT_INTERVAL = float(os.getenv("CCL_PROGRESS_EDIT_INTERVAL", "1.5"))
+
+# Horizontes de /cclhorizontes (terminan en /fin): NM = meses, NY = años, YTD
+HORIZONS = [h.strip().upper() for h in os.getenv("CCL_HORIZONS", "1M,3M,YTD,1Y").split(",") if h.strip()]
+
+# Sectores para /cclsectores (CCL_SECTORS_FILE: {"sectors": {...}, "shares": {...}})
+DEFAULT_SECTORS = {
+    "Bancos": ["GGAL", "BMA", "BBAR", "SUPV", "BPAT", "BHIP"],
+    "Energía": ["YPFD", "PAMP", "TGSU2", "CEPU", "EDN", "TRAN"],
+    "Materiales": ["ALUA", "TXAR", "LOMA"],
+}
+SECTORS_FILE = os.getenv("CCL_SECTORS_FILE")
+
+# Cache de matrices de correlación por (rango, universo)
+CORR_CACHE_SIZE = int(os.getenv("CCL_CORR_CACHE_SIZE", "16"))
+CORR_CACHE_TTL = float(os.getenv("CCL_CORR_CACHE_TTL", "21600"))
+
+# /cclplot con más tickers que esto usa una grilla de small multiples
+SMALL_MULTIPLES_THRESHOLD = int(os.getenv("CCL_SMALL_MULTIPLES_THRESHOLD", "8"))
+SMALL_MULTIPLES_MAX_COLS = 6
+
+# /cclexport: filas por bloque y tope en memoria del buffer antes de pasar a disco
+EXPORT_CHUNK_ROWS = int(os.getenv("CCL_EXPORT_CHUNK_ROWS", "250"))
+EXPORT_SPOOL_BYTES = int(os.getenv("CCL_EXPORT_SPOOL_BYTES", str(8 * 1024 * 1024)))
+EXPORT_FORMATS = ("csv", "parquet")
+EXPORT_KINDS = ("series", "vars")
+
+# /profile: chats habilitados (ids separados por coma) y tope de comandos por sesión
+ADMIN_CHAT_IDS = {
+    int(x) for x in os.getenv("CCL_ADMIN_CHAT_IDS", "").replace(" ", "").split(",") if x
+}
+PROFILE_MAX_RUNS = int(os.getenv("CCL_PROFILE_MAX_RUNS", "50"))
+
+# Suscripciones: zona horaria de los horarios, cadencia del scheduler y envíos en paralelo
+SUBSCRIPTION_TZ = ZoneInfo(os.getenv("CCL_TZ", "America/Argentina/Buenos_Aires"))
+SUBSCRIPTION_TICK = float(os.getenv("CCL_SUBSCRIPTION_TICK", "30"))
+SUBSCRIPTION_FANOUT = int(os.getenv("CCL_SUBSCRIPTION_FANOUT", "20"))
+# Un grupo que falla se reintenta con backoff exponencial entre estos dos valores (s)
+SUBSCRIPTION_RETRY_SECONDS = float(os.getenv("CCL_SUBSCRIPTION_RETRY_SECONDS", "120"))
+SUBSCRIPTION_RETRY_MAX = float(os.getenv("CCL_SUBSCRIPTION_RETRY_MAX", "3600"))
+
+# Cola de envíos a Telegram: tasa global y por chat (msgs/s y ráfaga) y reintentos por flood
+SEND_GLOBAL_RATE = float(os.getenv("CCL_SEND_GLOBAL_RATE", "30"))
+SEND_GLOBAL_BURST = float(os.getenv("CCL_SEND_GLOBAL_BURST", "30"))
+SEND_CHAT_RATE = float(os.getenv("CCL_SEND_CHAT_RATE", "1"))
+SEND_CHAT_BURST = float(os.getenv("CCL_SEND_CHAT_BURST", "3"))
+SEND_MAX_RETRIES = int(os.getenv("CCL_SEND_MAX_RETRIES", "3"))
+
+# Intradiario (/cclvivo, /cclmovers): barras, cadencia de polling, capacidad del buffer y horario BYMA
+INTRADAY_INTERVAL = os.getenv("CCL_INTRADAY_INTERVAL", "1m")
+INTRADAY_POLL_SECONDS = float(os.getenv("CCL_INTRADAY_POLL_SECONDS", "60"))
+INTRADAY_BUFFER_BARS = int(os.getenv("CCL_INTRADAY_BUFFER_BARS", "420"))
+MARKET_HOURS = ("11:00", "17:00")
+# Con el mercado cerrado y el buffer vacío los reintentos se espacian hasta este tope (s)
+INTRADAY_CLOSED_BACKOFF = float(os.getenv("CCL_INTRADAY_CLOSED_BACKOFF", "3600"))
+
+# CCL: "single" (YPFD.BA / YPF) o "composite" (agregado robusto de varios pares LOCAL:ADR:ACCIONES_POR_ADR)
+CCL_MODE = os.getenv("CCL_MODE", "single").strip().lower()
+CCL_PAIRS = [
+    (local.strip().upper(), adr.strip().upper(), float(ratio))
+    for local, adr, ratio in (
+        item.split(":")
+        for item in os.getenv(
+            "CCL_PAIRS", "YPFD.BA:YPF:1,GGAL.BA:GGAL:10,BMA.BA:BMA:10,PAMP.BA:PAM:25"
+        ).split(",")
+        if item.strip()
+    )
+]
+CCL_AGGREGATE = os.getenv("CCL_AGGREGATE", "median").strip().lower()  # median | trimmed
+CCL_TRIM = float(os.getenv("CCL_TRIM", "0.2"))
+
+# Presupuesto de tiempo por comando en segundos (CCL_DEADLINES="cclvars=45,cclplot=30"; 0 = sin límite)
+COMMAND_DEADLINES = {"cclvars": 45.0, "cclplot": 30.0}
+COMMAND_DEADLINES.update(
+    (name.strip(), float(seconds))
+    for name, seconds in (
+        item.split("=") for item in os.getenv("CCL_DEADLINES", "").split(",") if item.strip()
+    )
+)
+DEADLINE_MIN_CALL_TIMEOUT = 2.0
+
+# Watchdog de memoria: cadencia (0 = apagado), crecimiento que dispara alerta y tope para el soft-restart
+WATCHDOG_INTERVAL = float(os.getenv("CCL_WATCHDOG_INTERVAL", "300"))
+WATCHDOG_GROWTH_MB = float(os.getenv("CCL_WATCHDOG_GROWTH_MB", "150"))
+WATCHDOG_LIMIT_MB = float(os.getenv("CCL_WATCHDOG_LIMIT_MB", "0"))
+WATCHDOG_EXIT_ON_LIMIT = _env_flag("CCL_WATCHDOG_EXIT_ON_LIMIT")
+WATCHDOG_BUFFER_ALERT = int(os.getenv("CCL_WATCHDOG_BUFFER_ALERT", "32"))
+
+# Modo inline: refresco de datos precalculados, cache de respuestas y chat donde se suben las miniaturas
+INLINE_REFRESH_SECONDS = float(os.getenv("CCL_INLINE_REFRESH", "900"))
+# Tras el cierre se sigue refrescando hasta esta hora (Yahoo asienta el cierre diario)
+INLINE_SETTLE_UNTIL = os.getenv("CCL_INLINE_SETTLE_UNTIL", "19:00")
+INLINE_CACHE_TIME = int(os.getenv("CCL_INLINE_CACHE_TIME", "60"))
+INLINE_THUMB_CHAT = os.getenv("CCL_INLINE_THUMB_CHAT")
+INLINE_HORIZONS = ["1W", "1M", "YTD", "1Y"]
+INLINE_MAX_RESULTS = 10
+
+# Downsampling LTTB en /cclplot: puntos por píxel de ancho del PNG
+PLOT_DOWNSAMPLE = _env_flag("CCL_PLOT_DOWNSAMPLE", True)
+PLOT_POINTS_PER_PIXEL = float(os.getenv("CCL_PLOT_POINTS_PER_PIXEL", "1.0"))
+
+# Perfiles de render: dpi, escala de la figura, bbox ajustado (2ª pasada de layout),
+# compresión PNG (0-9), colores de paleta (0 = sin cuantizar), formato (png | jpeg | webp)
+# y calidad JPEG/WebP. CCL_RENDER_PROFILES='{"fast": {"format": "webp"}}' los ajusta.
+RENDER_PROFILES = {
+    "fast": {"dpi": 80, "scale": 0.8, "tight": False, "compress": 1, "colors": 64,
+             "format": "png", "quality": 80},
+    "standard": {"dpi": 150, "scale": 1.0, "tight": True, "compress": 6, "colors": 0,
+                 "format": "png", "quality": 90},
+    "hq": {"dpi": 200, "scale": 1.0, "tight": True, "compress": 9, "colors": 0,
+           "format": "png", "quality": 95},
+}
+for _name, _overrides in json.loads(os.getenv("CCL_RENDER_PROFILES", "{}")).items():
+    RENDER_PROFILES.setdefault(_name, dict(RENDER_PROFILES["standard"])).update(_overrides)
+RENDER_PROFILE_ORDER = list(RENDER_PROFILES)  # de más barato a más caro
+RENDER_PROFILE_DEFAULT = os.getenv("CCL_RENDER_PROFILE", "standard")
+# Tope de perfil según renders pendientes (CCL_RENDER_LOAD_PROFILES="3=standard,6=fast")
+RENDER_LOAD_PROFILES = sorted(
+    (
+        (int(pending), name.strip())
+        for pending, name in (
+            item.split("=") for item in os.getenv("CCL_RENDER_LOAD_PROFILES", "6=fast").split(",")
+            if item.strip()
+        )
+    ),
+    reverse=True,
+)
+
+# Telegram rechaza fotos con ancho + alto > 10000 px; se deja margen para bbox tight
+PHOTO_MAX_PIXELS = int(os.getenv("CCL_PHOTO_MAX_PIXELS", "9000"))
+# Con más columnas que esto el heatmap se transpone (p. ej. /cclperiodos S)
+HEATMAP_MAX_COLS = int(os.getenv("CCL_HEATMAP_MAX_COLS", "30"))
+
+# Índice de metadatos por ticker (listado, última rueda, validez) persistido en JSON
+TICKER_INDEX_FILE = Path(os.getenv("CCL_TICKER_INDEX_FILE", "tickers.json"))
+# Segundos que un ticker sin datos se rechaza sin consultar a Yahoo
+TICKER_NEGATIVE_TTL = float(os.getenv("CCL_TICKER_NEGATIVE_TTL", "21600"))
+# Segundos que vale una fecha de listado / deslistado deducida antes de volver a consultar
+TICKER_RANGE_TTL = float(os.getenv("CCL_TICKER_RANGE_TTL", "604800"))
+# Días de tolerancia (feriados, fines de semana) para deducir listado / deslistado
+TICKER_RANGE_SLACK_DAYS = int(os.getenv("CCL_TICKER_RANGE_SLACK_DAYS", "10"))
 
 log_level = os.getenv("LOG_LEVEL", "INFO").upper()
 configured_level = getattr(logging, log_level, None)
@@ -131,6 +322,192 @@ def _locked_file(file_obj, lock_type, *, _backend=None):
         backend.release(file_obj)
 
 
+# ------------------ COLA DE ENVÍOS -----------------
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+
+class _TokenBucket:
+    """Token bucket de ``rate`` tokens/s con capacidad ``burst`` (rate<=0: sin límite)."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.stamp: Optional[float] = None
+
+    def _refill(self, now: float) -> None:
+        if self.stamp is not None and self.rate > 0:
+            self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def wait_time(self, now: float) -> float:
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        return 0.0 if self.tokens >= 1.0 else (1.0 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        if self.rate > 0:
+            self._refill(now)
+            self.tokens -= 1.0
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.burst
+
+
+def _retry_after_seconds(ex: RetryAfter) -> float:
+    value = ex.retry_after
+    return float(value.total_seconds() if hasattr(value, "total_seconds") else value)
+
+
+class SendQueue:
+    """Cola única de llamadas salientes a la Bot API.
+
+    Respeta una tasa global y otra por chat (token buckets), atiende primero
+    las respuestas interactivas (``PRIORITY_INTERACTIVE``) y después los envíos
+    masivos (``PRIORITY_BULK``), y ante ``RetryAfter`` pausa el despacho el
+    tiempo pedido y reencola el envío. Sin ``start()`` las llamadas van directo.
+
+    Telegram limita por token: con varios bots en el proceso la tasa global,
+    los buckets por chat y la pausa se llevan por bot (``current_bot()`` al
+    encolar), así un ``RetryAfter`` de uno no frena a los demás.
+    """
+
+    def __init__(self, global_rate: float, global_burst: float, chat_rate: float,
+                 chat_burst: float, max_retries: int = 3):
+        self.global_rate = global_rate
+        self.global_burst = global_burst
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._bots: dict[Optional[str], _TokenBucket] = {}
+        self._chats: dict[tuple[Optional[str], int], _TokenBucket] = {}
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._seq = itertools.count()
+        self._paused_until: dict[Optional[str], float] = {}
+        self._deferred = 0
+        self._inflight: set[asyncio.Task] = set()
+
+    @property
+    def started(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def depth(self) -> int:
+        """Envíos esperando turno (incluye los demorados por tasa del chat)."""
+        return (self._queue.qsize() if self._queue is not None else 0) + self._deferred
+
+    def start(self) -> None:
+        if not self.started:
+            self._queue = asyncio.PriorityQueue()
+            self._task = asyncio.get_running_loop().create_task(self._dispatch())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._queue is not None and not self._queue.empty():
+            *_, job = self._queue.get_nowait()
+            if not job[4].done():
+                job[4].cancel()
+
+    async def submit(self, chat_id: Optional[int], func, *args,
+                     priority: int = PRIORITY_INTERACTIVE, **kwargs):
+        """Encola ``func(*args, **kwargs)`` para ``chat_id`` y espera su resultado."""
+        if not self.started:
+            return await func(*args, **kwargs)
+        future = asyncio.get_running_loop().create_future()
+        bot = _BOT.get()
+        self._put(priority, (chat_id, func, args, kwargs, future, 0, bot.name if bot else None))
+        return await future
+
+    def _put(self, priority: int, job: tuple) -> None:
+        self._queue.put_nowait((priority, next(self._seq), job))
+
+    def _undefer(self, priority: int, job: tuple) -> None:
+        self._deferred -= 1
+        self._put(priority, job)
+
+    def _bot_bucket(self, bot: Optional[str]) -> _TokenBucket:
+        bucket = self._bots.get(bot)
+        if bucket is None:
+            bucket = self._bots[bot] = _TokenBucket(self.global_rate, self.global_burst)
+        return bucket
+
+    def _chat_bucket(self, bot: Optional[str], chat_id: int, now: float) -> _TokenBucket:
+        key = (bot, chat_id)
+        bucket = self._chats.get(key)
+        if bucket is None:
+            if len(self._chats) > 10_000:
+                self._chats = {k: b for k, b in self._chats.items() if not b.idle(now)}
+            bucket = self._chats[key] = _TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def _dispatch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            priority, seq, job = await self._queue.get()
+            chat_id, future, bot = job[0], job[4], job[6]
+            if future.done():
+                continue
+            now = loop.time()
+            bot_bucket = self._bot_bucket(bot)
+            wait = max(bot_bucket.wait_time(now), self._paused_until.get(bot, 0.0) - now)
+            if wait > 0:
+                # Se aparta sin frenar a los otros bots; al volver compite por prioridad.
+                self._deferred += 1
+                loop.call_later(wait, self._undefer, priority, job)
+                continue
+            if chat_id is not None:
+                bucket = self._chat_bucket(bot, chat_id, now)
+                chat_wait = bucket.wait_time(now)
+                if chat_wait > 0:
+                    self._deferred += 1
+                    loop.call_later(chat_wait, self._undefer, priority, job)
+                    continue
+                bucket.take(now)
+            bot_bucket.take(now)
+            task = loop.create_task(self._send(priority, job))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _send(self, priority: int, job: tuple) -> None:
+        chat_id, func, args, kwargs, future, attempt, bot = job
+        try:
+            result = await func(*args, **kwargs)
+        except RetryAfter as ex:
+            delay = _retry_after_seconds(ex)
+            loop = asyncio.get_running_loop()
+            self._paused_until[bot] = max(self._paused_until.get(bot, 0.0), loop.time() + delay)
+            log.warning(
+                "SendQueue flood control bot=%s chat_id=%s retry_after=%.1fs attempt=%d depth=%d",
+                bot, chat_id, delay, attempt + 1, self.depth,
+            )
+            if attempt < self.max_retries:
+                self._put(priority, (chat_id, func, args, kwargs, future, attempt + 1, bot))
+            elif not future.done():
+                future.set_exception(ex)
+            return
+        except Exception as ex:
+            if not future.done():
+                future.set_exception(ex)
+            return
+        if not future.done():
+            future.set_result(result)
+
+
+SEND_QUEUE = SendQueue(
+    SEND_GLOBAL_RATE, SEND_GLOBAL_BURST, SEND_CHAT_RATE, SEND_CHAT_BURST, SEND_MAX_RETRIES
+)
+
+
 async def _reply_via(
     chat,
     message,
@@ -141,17 +518,18 @@ async def _reply_via(
     args: tuple,
     kwargs: dict,
 ):
+    chat_id = getattr(chat, "id", None)
     if message is not None:
         reply_func = getattr(message, message_method, None)
         if reply_func is not None:
-            return await reply_func(*args, **kwargs)
+            return await SEND_QUEUE.submit(chat_id, reply_func, *args, **kwargs)
 
     if chat is not None:
         bot = getattr(context, "bot", None)
         if bot is not None:
             send_func = getattr(bot, bot_method, None)
             if send_func is not None:
-                return await send_func(chat.id, *args, **kwargs)
+                return await SEND_QUEUE.submit(chat_id, send_func, chat.id, *args, **kwargs)
 
     log.warning(
         "Unable to respond via %s/%s chat_id=%s message_present=%s",
@@ -186,43 +564,134 @@ async def _reply_photo(chat, message, context, *args, **kwargs):
         kwargs=kwargs,
     )
 
+
+async def _reply_document(chat, message, context, *args, **kwargs):
+    return await _reply_via(
+        chat,
+        message,
+        context,
+        message_method="reply_document",
+        bot_method="send_document",
+        args=args,
+        kwargs=kwargs,
+    )
+
 # ------------------ UTIL / PERSISTENCIA -------------
+class BotProfile:
+    """Un bot del proceso: token, universo por defecto y archivo de estado propio.
+
+    Descargas, caches y render son compartidos; lo que depende del bot se
+    resuelve con ``current_bot()`` (``universe()``, ``state_file()``).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        token: str,
+        *,
+        tickers: Optional[list[str]] = None,
+        state_file: Optional[Path] = None,
+    ):
+        self.name = name
+        self.token = token
+        self.tickers = [norm_ticker_ba(t) for t in tickers] if tickers else None
+        self.state_file = Path(state_file) if state_file else Path(f"state-{name}.json")
+
+    def __repr__(self) -> str:
+        return f"BotProfile({self.name!r}, tickers={len(self.tickers or [])})"
+
+
+_BOT: ContextVar[Optional[BotProfile]] = ContextVar("ccl_bot", default=None)
+
+
+def current_bot() -> Optional[BotProfile]:
+    return _BOT.get()
+
+
+def state_file() -> Path:
+    """Archivo de estado del bot activo (``STATE_FILE`` fuera de un bot)."""
+    bot = _BOT.get()
+    return bot.state_file if bot is not None else STATE_FILE
+
+
+def universe() -> list[str]:
+    """Tickers por defecto del bot activo (``TICKERS`` si no define los suyos)."""
+    bot = _BOT.get()
+    return bot.tickers if bot is not None and bot.tickers else TICKERS
+
+
+def load_bots(path: Union[str, Path]) -> list[BotProfile]:
+    """Lee ``CCL_BOTS_FILE``; el token va literal (``token``) o en una variable (``token_env``)."""
+    with open(path, encoding="utf-8") as file_obj:
+        entries = json.load(file_obj)
+    profiles = []
+    for i, entry in enumerate(entries):
+        name = entry.get("name") or f"bot{i + 1}"
+        token = entry.get("token") or os.getenv(entry.get("token_env") or "", "")
+        if not token:
+            raise SystemExit(f"El bot {name} de {path} no tiene token (token / token_env).")
+        profiles.append(BotProfile(
+            name, token, tickers=entry.get("tickers"), state_file=entry.get("state_file"),
+        ))
+    if len({p.name for p in profiles}) != len(profiles):
+        raise SystemExit(f"Nombres de bot repetidos en {path}.")
+    return profiles
+
+
+def with_bot(profile: Optional[BotProfile], handler):
+    """Corre ``handler`` con ``profile`` como bot activo."""
+    if profile is None:
+        return handler
+
+    @functools.wraps(handler)
+    async def wrapper(update, context):
+        token = _BOT.set(profile)
+        try:
+            return await handler(update, context)
+        finally:
+            _BOT.reset(token)
+
+    return wrapper
+
+
 def load_state() -> dict:
-    if STATE_FILE.exists():
+    path = state_file()
+    if path.exists():
         try:
-            with STATE_FILE.open("r", encoding="utf-8") as file_obj:
+            with path.open("r", encoding="utf-8") as file_obj:
                 with _locked_file(file_obj, LOCK_SH) as locked:
                     size = os.fstat(locked.fileno()).st_size
                     log.debug(
                         "Loading state from %s (%s bytes)",
-                        STATE_FILE.resolve(),
+                        path.resolve(),
                         size,
                     )
                     data = locked.read()
             state = json.loads(data)
             log.debug(
                 "Loaded state from %s (%s bytes)",
-                STATE_FILE.resolve(),
+                path.resolve(),
                 size,
             )
             return state
         except Exception as ex:
-            log.error(f"Error loading state from {STATE_FILE.resolve()}: {ex}")
+            log.error(f"Error loading state from {path.resolve()}: {ex}")
     else:
-        log.debug(f"State file {STATE_FILE.resolve()} does not exist")
+        log.debug(f"State file {path.resolve()} does not exist")
     return {}
 
 def save_state(state: dict, chat_id: Optional[int] = None) -> None:
+    path = state_file()
     try:
         data = json.dumps(state, ensure_ascii=False, indent=2)
-        STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        path.parent.mkdir(parents=True, exist_ok=True)
         log.debug(
             "Saving state to %s (%s bytes)",
-            STATE_FILE.resolve(),
+            path.resolve(),
             len(data),
         )
-        mode = "r+" if STATE_FILE.exists() else "w"
-        with STATE_FILE.open(mode, encoding="utf-8") as file_obj:
+        mode = "r+" if path.exists() else "w"
+        with path.open(mode, encoding="utf-8") as file_obj:
             with _locked_file(file_obj, LOCK_EX) as locked:
                 locked.seek(0)
                 locked.truncate()
@@ -232,7 +701,7 @@ def save_state(state: dict, chat_id: Optional[int] = None) -> None:
                 final_size = os.fstat(locked.fileno()).st_size
         log.debug(
             "Saved state to %s (%s bytes)",
-            STATE_FILE.resolve(),
+            path.resolve(),
             final_size,
         )
     except Exception as ex:
@@ -240,14 +709,14 @@ def save_state(state: dict, chat_id: Optional[int] = None) -> None:
             log.error(
                 "Error saving state for chat_id=%s to %s: %s",
                 chat_id,
-                STATE_FILE.resolve(),
+                path.resolve(),
                 ex,
                 exc_info=True,
             )
         else:
             log.error(
                 "Error saving state to %s: %s",
-                STATE_FILE.resolve(),
+                path.resolve(),
                 ex,
                 exc_info=True,
             )
@@ -286,9 +755,33 @@ def toggle_normalize(chat_id: int) -> bool:
     log.info(f"chat_id={chat_id} normalize toggled {current} -> {new_state}")
     return new_state
 
+def get_render_choice(chat_id: int) -> Optional[str]:
+    return get_chat_state(chat_id).get("render")
+
+def set_render_choice(chat_id: int, name: Optional[str]) -> None:
+    set_chat_state(chat_id, render=name)
+
+def get_subscription(chat_id: int) -> Optional[dict]:
+    return get_chat_state(chat_id).get("subscription")
+
+def set_subscription(chat_id: int, subscription: Optional[dict]) -> None:
+    set_chat_state(chat_id, subscription=subscription)
+
+def mark_subscriptions_sent(chat_ids: list[int], day: str) -> None:
+    """Marca ``last_sent`` en muchos chats con una sola lectura/escritura del estado."""
+    state = load_state()
+    for chat_id in chat_ids:
+        subscription = state.get(str(chat_id), {}).get("subscription")
+        if subscription:
+            subscription["last_sent"] = day
+    save_state(state)
+
 def parse_date(s: str) -> str:
     return datetime.strptime(s, "%Y-%m-%d").date().isoformat()
 
+def parse_time_of_day(s: str) -> str:
+    return datetime.strptime(s, "%H:%M").strftime("%H:%M")
+
 def norm_ticker_ba(t: str) -> str:
     t = t.strip().upper()
     if not t.endswith(".BA"):
@@ -299,857 +792,4714 @@ def prettify_symbol(s: str) -> str:
     return s.replace(".BA", "")
 
 
-def ensure_utc_naive_index(index: pd.Index) -> pd.Index:
+def ensure_utc_naive_index(index: pd.Index, *, copy: Optional[bool] = None) -> pd.Index:
     """Return a UTC-naive ``DatetimeIndex`` when possible.
 
     ``yfinance`` sometimes returns timezone-aware indexes and other times
     timezone-naive ones. We only convert to UTC and drop the timezone when the
     index is tz-aware; otherwise we simply reuse the original index (copying it
-    to avoid unintended shared references).
+    to avoid unintended shared references). ``copy=None`` skips that defensive
+    copy when ``COMPACT_PRICES`` is enabled.
     """
 
+    if copy is None:
+        copy = not COMPACT_PRICES
     if isinstance(index, pd.DatetimeIndex):
         if index.tz is not None:
             return index.tz_convert("UTC").tz_localize(None)
-        return index.copy()
+        return index.copy() if copy else index
     return index
 
-# ------------------ NÚCLEO FINANCIERO ----------------
-TICKERS = [norm_ticker_ba(x) for x in [
-    'ALUA','BMA','BYMA','CEPU','COME','CRES','CVH','EDN','GGAL','MIRG',
-    'PAMP','SUPV','TECO2','TGNO4','TGSU2','TRAN','TXAR','VALO','YPFD',
-    'DOME','AGRO','AUSO','BBAR','BHIP','BPAT','CADO','CAPX','CARC',
-    'CELU','CGPA2','CTIO','DGCU2','DYCA','FERR','FIPL','BOLT','A3',
-    'GARO','GBAN','GCLA','GRIM','HARG','HAVA','INTR','INVJ','IRSA',
-    'LEDE','LOMA','LONG','METR','MOLA','MOLI','MORI','OEST','PATA',
-    'POLL','RICH','RIGO','ROSE','SAMI','SEMI'
-]]
 
-def download_ccl(start: str, end: str) -> pd.Series:
-    """CCL = YPFD.BA / YPF (Close)."""
-    try:
-        log.info("download_ccl request %s start=%s end=%s", "YPFD.BA", start, end)
-        df_ars = yf.download(["YPFD.BA"], start=start, end=end, auto_adjust=True, progress=False)
-        log.info(
-            "download_ccl response %s shape=%s index_range=%s→%s",
-            "YPFD.BA",
-            getattr(df_ars, "shape", None),
-            df_ars.index.min() if getattr(df_ars, "index", None) is not None and not df_ars.index.empty else None,
-            df_ars.index.max() if getattr(df_ars, "index", None) is not None and not df_ars.index.empty else None,
-        )
-    except Exception as ex:
-        log.error("download_ccl error downloading %s: %s", "YPFD.BA", ex, exc_info=True)
-        raise
-    try:
-        log.info("download_ccl request %s start=%s end=%s", "YPF", start, end)
-        df_us = yf.download(["YPF"], start=start, end=end, auto_adjust=True, progress=False)
-        log.info(
-            "download_ccl response %s shape=%s index_range=%s→%s",
-            "YPF",
-            getattr(df_us, "shape", None),
-            df_us.index.min() if getattr(df_us, "index", None) is not None and not df_us.index.empty else None,
-            df_us.index.max() if getattr(df_us, "index", None) is not None and not df_us.index.empty else None,
-        )
-    except Exception as ex:
-        log.error("download_ccl error downloading %s: %s", "YPF", ex, exc_info=True)
-        raise
-    # Normalizar índices para evitar problemas de zona horaria
-    for df in (df_ars, df_us):
-        if isinstance(df.index, pd.DatetimeIndex):
-            df.index = ensure_utc_naive_index(df.index)
-    ypf_ars = df_ars["Close"]["YPFD.BA"] if isinstance(df_ars["Close"], pd.DataFrame) else df_ars["Close"]
-    ypf_usd = df_us["Close"]["YPF"]     if isinstance(df_us["Close"],  pd.DataFrame) else df_us["Close"]
-    ccl = (ypf_ars / ypf_usd).to_frame("CCL").asfreq("D").ffill().bfill()["CCL"]
-    if isinstance(ccl.index, pd.DatetimeIndex):
-        ccl.index = ensure_utc_naive_index(ccl.index)
-    idx = getattr(ccl, "index", None)
-    index_min = idx.min() if idx is not None and not idx.empty else None
-    index_max = idx.max() if idx is not None and not idx.empty else None
-    log.debug(
-        "download_ccl result size=%s index_range=%s→%s",
-        ccl.size,
-        index_min,
-        index_max,
-    )
-    return ccl
+# ------------------ MEMORIA / COMPACTO ---------------
+def to_day_index(index: pd.Index) -> pd.Index:
+    """``DatetimeIndex`` → ``Index`` int32 con días desde 1970-01-01."""
+    if not isinstance(index, pd.DatetimeIndex):
+        return index
+    days = index.values.astype("datetime64[D]").astype(np.int64).astype(np.int32)
+    return pd.Index(days, dtype=np.int32, name=index.name)
 
-def get_var(start: str, end: str) -> tuple[pd.Series, str]:
-    """Retornos en USD (vía CCL) entre start y end, ordenados ascendente (%)."""
-    data: dict[str, pd.Series] = {}
-    failed: list[str] = []
 
-    def normalize_index(obj: Union[pd.DataFrame, pd.Series]) -> Union[pd.DataFrame, pd.Series]:
-        if isinstance(obj.index, pd.DatetimeIndex):
-            obj.index = ensure_utc_naive_index(obj.index)
-        return obj
+def from_day_index(index: pd.Index) -> pd.Index:
+    """Inversa de ``to_day_index``; deja intactos los índices no enteros."""
+    if index.dtype != np.int32:
+        return index
+    return pd.DatetimeIndex(index.to_numpy().astype("datetime64[D]"), name=index.name)
 
-    def mark_failed(ticker: str, reason: str) -> None:
-        if ticker not in failed:
-            log.warning(f"Fallo descargando {ticker}: {reason}")
-            failed.append(ticker)
 
-    try:
-        bulk = yf.download(
-            TICKERS,
-            start=start,
-            end=end,
-            auto_adjust=True,
-            progress=False,
-            threads=False,
-        )
-        idx = getattr(bulk, "index", None)
-        index_min = idx.min() if idx is not None and not getattr(idx, "empty", True) else None
-        index_max = idx.max() if idx is not None and not getattr(idx, "empty", True) else None
-        log.info(
-            "get_var bulk download shape=%s index_range=%s→%s",
-            getattr(bulk, "shape", None),
-            index_min,
-            index_max,
-        )
-    except (TimeoutError, requests.exceptions.RequestException, Exception) as ex:
-        log.warning("get_var descarga masiva fallida: %s", ex)
-        for ticker in TICKERS:
-            mark_failed(ticker, str(ex))
-        bulk = None
-
-    close = None
-    if isinstance(bulk, pd.DataFrame) and not bulk.empty:
-        try:
-            close = bulk["Close"]
-        except KeyError:
-            close = None
-    elif isinstance(bulk, pd.Series) and not bulk.empty:
-        close = bulk
-
-    if close is None or (hasattr(close, "empty") and close.empty):
-        for ticker in TICKERS:
-            mark_failed(ticker, "sin datos en descarga masiva")
-    else:
-        if isinstance(close, pd.Series):
-            name = close.name if isinstance(close.name, str) else TICKERS[0]
-            close = close.to_frame(name)
-        normalize_index(close)
-        for ticker in TICKERS:
-            if ticker not in close.columns:
-                mark_failed(ticker, "sin datos en descarga masiva")
-                continue
-            ser = close[ticker]
-            if isinstance(ser, pd.DataFrame):
-                ser = ser.iloc[:, 0]
-            if ser.dropna().empty:
-                mark_failed(ticker, "serie vacía en descarga masiva")
-                continue
-            data[ticker] = ser
+def compact_prices(obj: Union[pd.DataFrame, pd.Series]) -> Union[pd.DataFrame, pd.Series]:
+    """Convierte precios a float32 con índice int32 de días (sin copias extra)."""
+    obj = obj.astype(np.float32)
+    if isinstance(obj.index, pd.DatetimeIndex):
+        obj.index = to_day_index(ensure_utc_naive_index(obj.index, copy=False))
+    return obj
 
-    failed = [ticker for ticker in failed if ticker not in data]
 
-    if failed:
-        retry_fail: list[str] = []
-        for t in failed:
-            try:
-                df = yf.download(
-                    [t],
-                    start=start,
-                    end=end,
-                    auto_adjust=True,
-                    progress=False,
-                    timeout=30,
-                )
-            except (TimeoutError, requests.exceptions.RequestException, Exception) as ex:
-                log.warning(f"Reintento fallido para {t}: {ex}")
-                retry_fail.append(t)
-                continue
+def nbytes(obj) -> int:
+    """Bytes ocupados por un DataFrame/Series (índice incluido) o un buffer."""
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(index=True, deep=True))
+    if isinstance(obj, io.BytesIO):
+        return obj.getbuffer().nbytes
+    return 0
 
-            if "Close" not in df:
-                retry_fail.append(t)
-                continue
 
-            ser = df["Close"][t] if isinstance(df["Close"], pd.DataFrame) else df["Close"]
-            normalize_index(ser)
-            if ser.dropna().empty:
-                retry_fail.append(t)
-                continue
-            data[t] = ser
-        failed = retry_fail
+LAST_MEMORY_REPORT: dict[str, dict[str, int]] = {}
+_LIVE_BUFFERS: "weakref.WeakSet[io.BytesIO]" = weakref.WeakSet()
 
-    if not data:
-        raise RuntimeError("No se pudieron descargar precios.")
 
-    close = pd.DataFrame(data)
-    if isinstance(close.index, pd.DatetimeIndex):
-        close.index = ensure_utc_naive_index(close.index)
+def new_buffer(initial: bytes = b"") -> io.BytesIO:
+    """``io.BytesIO`` registrado para que el watchdog cuente los buffers vivos."""
+    bio = io.BytesIO(initial)
+    _LIVE_BUFFERS.add(bio)
+    return bio
 
-    ccl = download_ccl(start, end).to_frame().ffill()
-    if isinstance(ccl.index, pd.DatetimeIndex):
-        ccl.index = ensure_utc_naive_index(ccl.index)
-    close_usd = close.div(ccl["CCL"], axis=0)
 
-    var = (close_usd.iloc[-1] / close_usd.iloc[0] - 1.0) * 100.0
-    msg = ""
-    if failed:
-        msg = "Tickers omitidos por error de descarga: " + ", ".join(prettify_symbol(t) for t in failed)
-    return var.dropna().sort_values(), msg
+def rss_bytes() -> int:
+    """RSS actual del proceso (``/proc``); sin ``/proc`` cae al pico de ``getrusage``."""
+    try:
+        with open("/proc/self/status", encoding="ascii") as file_obj:
+            for line in file_obj:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
 
-def plot_top_bottom(real_returns: pd.Series, top_n: int, bottom_n: int,
-                    start_label: str, end_label: str, normalize_flag: bool,
-                    cmap_pos: str = "Blues", cmap_neg: str = "Reds") -> io.BytesIO:
-    """Colorea con gradiente. Si normalize_flag=True, aclara 'Base 100=ini' en títulos."""
-    rr = real_returns.dropna()
-    if rr.empty:
-        raise RuntimeError("No hay datos para el rango seleccionado.")
-    best = rr.nlargest(top_n)
-    worst = rr.nsmallest(bottom_n)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
 
-    best_min = float(best.min())
-    best_max = float(best.max())
-    cmap_best = colormaps.get_cmap(cmap_pos)
-    if best_min == best_max:
-        log.info(
-            "plot_top_bottom uniform best returns value=%s; skipping normalization",
-            best_min,
-        )
-        colors_pos = np.tile(cmap_best(0.5), (len(best), 1))
-    else:
-        norm_pos = Normalize(vmin=best_min, vmax=best_max)
-        colors_pos = cmap_best(norm_pos(best.values))
 
-    abs_worst = np.abs(worst)
-    worst_min = float(abs_worst.min())
-    worst_max = float(abs_worst.max())
-    cmap_worst = colormaps.get_cmap(cmap_neg)
-    if worst_min == worst_max:
-        log.info(
-            "plot_top_bottom uniform worst returns magnitude=%s; skipping normalization",
-            worst_min,
-        )
-        colors_neg = np.tile(cmap_worst(0.5), (len(worst), 1))
-    else:
-        norm_neg = Normalize(vmin=worst_min, vmax=worst_max)
-        colors_neg = cmap_worst(norm_neg(abs_worst.values))
+class _StageMeter:
+    """Acumula bytes por etapa; sólo mide cuando ``MEMORY_REPORT`` está activo."""
 
-    fig = plt.figure(figsize=(11.5, 8.5), dpi=150, constrained_layout=True)
-    gs = fig.add_gridspec(2, 1, height_ratios=[1, 1], hspace=0.32)
+    def __init__(self, scope: str):
+        self.scope = scope
+        self.enabled = MEMORY_REPORT
+        self.stages: dict[str, int] = {}
+
+    def record(self, stage: str, obj) -> None:
+        if not self.enabled or obj is None:
+            return
+        size = nbytes(obj)
+        self.stages[stage] = size
+        log.info("%s memory stage=%s bytes=%s", self.scope, stage, size)
+
+    def finish(self) -> None:
+        if not self.enabled:
+            return
+        LAST_MEMORY_REPORT[self.scope] = dict(self.stages)
+        log.info(
+            "%s memory report compact=%s stages=%s",
+            self.scope,
+            COMPACT_PRICES,
+            self.stages,
+        )
+
+# ------------------ ÍNDICE DE TICKERS ----------------
+def _day(value) -> Optional[pd.Timestamp]:
+    if value is None:
+        return None
+    day = pd.Timestamp(value)
+    return (day.tz_localize(None) if day.tzinfo is not None else day).normalize()
+
+
+def _iso_day(value: Optional[pd.Timestamp]) -> Optional[str]:
+    return None if value is None else value.strftime("%Y-%m-%d")
+
+
+class TickerIndex:
+    """Metadatos de cada símbolo visto, para no preguntarle a Yahoo lo que ya sabemos.
+
+    Por símbolo guarda la primera y última rueda con precio observadas
+    (``first``/``last``) y, cuando una consulta cubrió bastante antes o después
+    sin datos (``slack_days``), la fecha de listado (``listed``) o deslistado
+    (``delisted``), que se vuelven a verificar pasados ``range_ttl`` segundos
+    (una suspensión larga no deja afuera al ticker para siempre). Un símbolo
+    sin datos queda inválido hasta ``expires`` (``negative_ttl`` segundos),
+    salvo los del universo (``TICKERS`` / ``universe()``): para ellos una
+    respuesta vacía de Yahoo es más probablemente un error que un ticker
+    inexistente. Se persiste en ``path`` (JSON con lock, como ``state.json``)
+    desde ``flush``; sin ``path`` vive sólo en memoria.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        *,
+        negative_ttl: float = TICKER_NEGATIVE_TTL,
+        range_ttl: float = TICKER_RANGE_TTL,
+        slack_days: int = TICKER_RANGE_SLACK_DAYS,
+        flush_interval: float = 300.0,
+    ):
+        self.path = path
+        self.negative_ttl = negative_ttl
+        self.range_ttl = range_ttl
+        self.slack = pd.Timedelta(days=slack_days)
+        self.flush_interval = flush_interval
+        self._entries: dict[str, dict] = {}
+        self._loaded = path is None
+        self._dirty = False
+        self._lock = threading.RLock()
+        self._task: Optional[asyncio.Task] = None
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.path.exists():
+            return
+        try:
+            with self.path.open("r", encoding="utf-8") as file_obj:
+                with _locked_file(file_obj, LOCK_SH) as locked:
+                    data = json.loads(locked.read() or "{}")
+        except Exception as ex:
+            log.error("Error loading ticker index from %s: %s", self.path.resolve(), ex)
+            return
+        self._entries.update(data)
+        log.info("Loaded ticker index from %s (%d symbols)", self.path.resolve(), len(data))
+
+    def flush(self) -> bool:
+        """Escribe el índice si cambió; devuelve si escribió."""
+        with self._lock:
+            if self.path is None or not self._dirty:
+                return False
+            data = json.dumps(self._entries, ensure_ascii=False, indent=1, sort_keys=True)
+            self._dirty = False
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            mode = "r+" if self.path.exists() else "w"
+            with self.path.open(mode, encoding="utf-8") as file_obj:
+                with _locked_file(file_obj, LOCK_EX) as locked:
+                    locked.seek(0)
+                    locked.truncate()
+                    locked.write(data)
+                    locked.flush()
+                    os.fsync(locked.fileno())
+        except Exception as ex:
+            log.error("Error saving ticker index to %s: %s", self.path.resolve(), ex)
+            with self._lock:
+                self._dirty = True
+            return False
+        log.debug("Saved ticker index to %s (%s bytes)", self.path.resolve(), len(data))
+        return True
+
+    def get(self, symbol: str) -> Optional[dict]:
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._entries.get(symbol)
+            return dict(entry) if entry is not None else None
+
+    def is_invalid(self, symbol: str, now: Optional[float] = None) -> bool:
+        """True si ``symbol`` no tuvo datos y la marca todavía no venció."""
+        entry = self.get(symbol)
+        if entry is None or entry.get("valid", True):
+            return False
+        return (time.time() if now is None else now) < entry.get("expires", 0)
+
+    def invalid(self, symbols: list[str]) -> list[str]:
+        return [symbol for symbol in symbols if self.is_invalid(symbol)]
+
+    def _inferred(self, entry: dict, field: str, now: float) -> Optional[pd.Timestamp]:
+        """``listed`` / ``delisted`` de ``entry`` si la deducción no venció."""
+        if entry.get(field) is None or now - entry.get(f"{field}_at", 0) >= self.range_ttl:
+            return None
+        return _day(entry[field])
+
+    def select(
+        self, symbols: list[str], start: str, end: str, *, full: bool = False
+    ) -> tuple[list[str], list[str]]:
+        """Separa ``symbols`` en (a descargar, descartados) para ``start`` → ``end``.
+
+        Se descartan los inválidos vigentes y los que se sabe que no cotizaron en
+        el rango; con ``full`` también los listados después de ``start``.
+        """
+        start_ts, end_ts = _day(start), _day(end)
+        now = time.time()
+        keep: list[str] = []
+        skipped: list[str] = []
+        for symbol in symbols:
+            entry = self.get(symbol) or {}
+            listed = self._inferred(entry, "listed", now)
+            delisted = self._inferred(entry, "delisted", now)
+            out = (
+                self.is_invalid(symbol)
+                or (listed is not None and listed >= end_ts)
+                or (listed is not None and full and listed > start_ts + self.slack)
+                or (delisted is not None and delisted < start_ts)
+            )
+            (skipped if out else keep).append(symbol)
+        if skipped:
+            log.info("TickerIndex skipping %s for %s→%s", skipped, start, end)
+        return keep, skipped
+
+    def record_prices(self, close: Union[pd.DataFrame, pd.Series], start: str, end: str) -> None:
+        """Actualiza el índice con los cierres bajados para ``start`` → ``end``."""
+        if isinstance(close, pd.Series):
+            close = close.to_frame(close.name)
+        if not isinstance(close.index, pd.DatetimeIndex):
+            return
+        for symbol in close.columns.unique():
+            column = close[symbol]
+            if isinstance(column, pd.DataFrame):
+                column = column.iloc[:, 0]
+            days = column.dropna().index
+            if not days.empty:
+                self._update(symbol, start, end, days.min(), days.max())
+
+    def record_missing(self, symbols: list[str], start: str, end: str) -> None:
+        """Registra ``symbols`` sin datos en el rango (con Yahoo respondiendo)."""
+        for symbol in symbols:
+            self._update(symbol, start, end, None, None)
+
+    def _update(self, symbol, start, end, first, last) -> None:
+        now = time.time()
+        since = _day(start)
+        today = pd.Timestamp.today().normalize()
+        until = min(_day(end), today)
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._entries.get(symbol)
+            if entry is None or not entry.get("valid"):
+                if first is None:
+                    # Un rango histórico vacío puede ser un listado posterior, y
+                    # en el universo un vacío suele ser un error de Yahoo
+                    if until < today - self.slack or symbol in TICKERS or symbol in universe():
+                        return
+                    self._dirty = True
+                    log.info("TickerIndex marking %s invalid for %.0fs", symbol, self.negative_ttl)
+                    self._entries[symbol] = {
+                        "valid": False,
+                        "checked": now,
+                        "expires": now + self.negative_ttl,
+                    }
+                    return
+                entry = {"valid": True}
+            known_first, known_last = _day(entry.get("first")), _day(entry.get("last"))
+            listed, delisted = _day(entry.get("listed")), _day(entry.get("delisted"))
+            listed_at, delisted_at = entry.get("listed_at"), entry.get("delisted_at")
+            if first is not None:
+                first, last = _day(first), _day(last)
+                known_first = first if known_first is None else min(known_first, first)
+                known_last = last if known_last is None else max(known_last, last)
+                if listed is not None and first < listed:
+                    listed = None
+                if delisted is not None and last > delisted:
+                    delisted = None
+            # Sin ruedas entre ``since`` y la primera conocida: es el listado
+            if since + self.slack < known_first <= until + self.slack:
+                listed, listed_at = known_first, now
+            # Sin ruedas entre la última conocida y ``until``: dejó de cotizar
+            if since - self.slack <= known_last < until - self.slack:
+                delisted, delisted_at = known_last, now
+            self._dirty = True
+            self._entries[symbol] = {
+                "valid": True,
+                "first": _iso_day(known_first),
+                "last": _iso_day(known_last),
+                "listed": _iso_day(listed),
+                "listed_at": listed_at if listed is not None else None,
+                "delisted": _iso_day(delisted),
+                "delisted_at": delisted_at if delisted is not None else None,
+                "checked": now,
+            }
+
+    def start(self) -> None:
+        if self.path is not None and (self._task is None or self._task.done()):
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await asyncio.to_thread(self.flush)
+
+
+TICKER_INDEX = TickerIndex(TICKER_INDEX_FILE)
+
+# ---------------------- PROFILING --------------------
+class ProfileSession:
+    """Acumula cProfile de los próximos ``runs`` comandos.
+
+    El perfil se toma en los hilos de trabajo (``profile_call``), que es donde
+    corre lo pesado (descargas, cálculo y render); del handler en sí se guarda
+    el tiempo de pared. Los stats de todas las llamadas se suman en un único
+    ``pstats.Stats``.
+    """
+
+    def __init__(self, owner_chat_id: int, runs: int):
+        self.owner_chat_id = owner_chat_id
+        self.runs = runs
+        self.remaining = runs
+        self.active = 0
+        self.closed = False
+        self.commands: list[tuple[str, float]] = []
+        self.calls = 0
+        self.skipped = 0
+        self._stats: Optional[pstats.Stats] = None
+        self._lock = threading.Lock()
+
+    def claim(self) -> bool:
+        if self.closed or self.remaining <= 0:
+            return False
+        self.remaining -= 1
+        self.active += 1
+        return True
+
+    def release(self, command: str, elapsed: float) -> bool:
+        """Registra un comando terminado; True cuando la sesión quedó completa."""
+        self.active -= 1
+        self.commands.append((command, elapsed))
+        return self.remaining <= 0 and self.active <= 0 and not self.closed
+
+    def add(self, profile: cProfile.Profile) -> None:
+        with self._lock:
+            if self.closed:
+                return
+            self.calls += 1
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+
+    def skip(self) -> None:
+        """Cuenta una llamada que corrió sin perfil (había otra perfilándose)."""
+        with self._lock:
+            self.skipped += 1
+
+    def report(self, limit: int = 40) -> io.BytesIO:
+        with self._lock:
+            self.closed = True
+            out = io.StringIO()
+            out.write(f"Comandos perfilados: {len(self.commands)}/{self.runs}\n")
+            for command, elapsed in self.commands:
+                out.write(f"  /{command:<16} {elapsed:8.3f} s\n")
+            out.write(f"Llamadas bloqueantes perfiladas: {self.calls}\n")
+            if self.skipped:
+                out.write(f"Llamadas concurrentes sin perfilar: {self.skipped}\n")
+            out.write("\n")
+            if self._stats is None:
+                out.write("Sin trabajo bloqueante registrado.\n")
+            else:
+                self._stats.stream = out
+                for key in ("cumulative", "tottime"):
+                    out.write(f"===== orden: {key} =====\n")
+                    self._stats.sort_stats(key).print_stats(limit)
+        return new_buffer(out.getvalue().encode("utf-8"))
+
+
+_PROFILE: ContextVar[Optional[ProfileSession]] = ContextVar("ccl_profile", default=None)
+PROFILE_SESSION: Optional[ProfileSession] = None
+
+
+# cProfile no admite dos perfiles activos a la vez (ValueError en 3.12+)
+_PROFILER_LOCK = threading.Lock()
+
+
+def profile_call(func, *args, **kwargs):
+    """Ejecuta ``func`` bajo cProfile si el comando actual está siendo perfilado.
+
+    Se perfila una llamada por vez en todo el proceso; las concurrentes corren
+    sin perfil y se cuentan en ``ProfileSession.skipped``.
+    """
+    session = _PROFILE.get()
+    if session is None:
+        return func(*args, **kwargs)
+    if not _PROFILER_LOCK.acquire(blocking=False):
+        session.skip()
+        return func(*args, **kwargs)
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        # Otro profiler (fuera del bot) ya está activo
+        _PROFILER_LOCK.release()
+        session.skip()
+        return func(*args, **kwargs)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profile.disable()
+        _PROFILER_LOCK.release()
+        session.add(profile)
+
+# ------------------ YAHOO / CIRCUIT BREAKER --------
+class UpstreamUnavailableError(RuntimeError):
+    """Yahoo Finance no disponible: el circuito está abierto."""
+
+
+class CircuitBreaker:
+    """Circuit breaker thread-safe: closed → open → half_open → closed.
+
+    Tras ``failure_threshold`` fallas consecutivas (excepciones o llamadas más
+    lentas que ``slow_call_seconds``) se abre y rechaza llamadas durante
+    ``reset_timeout`` segundos; luego deja pasar una única llamada de prueba.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 60.0,
+        slow_call_seconds: Optional[float] = None,
+        clock=time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.slow_call_seconds = slow_call_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def is_open(self) -> bool:
+        """True mientras se rechazan llamadas (open sin vencer o prueba en curso)."""
+        with self._lock:
+            if self.state == "open":
+                return self._clock() - self._opened_at < self.reset_timeout
+            return self.state == "half_open" and self._trial_in_flight
+
+    def retry_in(self) -> float:
+        with self._lock:
+            if self.state != "open":
+                return 0.0
+            return max(0.0, self.reset_timeout - (self._clock() - self._opened_at))
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open":
+                if self._clock() - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = "half_open"
+                log.info("circuit %s half_open", self.name)
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != "closed":
+                log.info("circuit %s closed", self.name)
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    log.warning(
+                        "circuit %s open failures=%s retry_in=%ss",
+                        self.name,
+                        self.failures,
+                        self.reset_timeout,
+                    )
+                self.state = "open"
+                self._opened_at = self._clock()
+
+    def record_neutral(self) -> None:
+        """Respuesta sin datos: no cuenta como éxito ni falla (salvo en prueba)."""
+        with self._lock:
+            trial = self.state == "half_open" and self._trial_in_flight
+        if trial:
+            self.record_failure()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+
+
+YAHOO_BREAKER = CircuitBreaker(
+    "yahoo",
+    failure_threshold=YAHOO_FAILURE_THRESHOLD,
+    reset_timeout=YAHOO_RESET_TIMEOUT,
+    slow_call_seconds=YAHOO_SLOW_CALL_SECONDS,
+)
+
+
+class Deadline:
+    """Presupuesto de tiempo de un comando; ``omitted`` junta lo que no llegó a hacerse."""
+
+    def __init__(self, seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.seconds = seconds
+        self._clock = clock
+        self.expires_at = clock() + seconds
+        self.omitted: list[str] = []
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - self._clock())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
+
+    def omit(self, items) -> None:
+        self.omitted.extend(i for i in items if i not in self.omitted)
+
+
+_DEADLINE: ContextVar[Optional[Deadline]] = ContextVar("ccl_deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """Deadline del comando en curso (se propaga a los hilos de ``asyncio.to_thread``)."""
+    return _DEADLINE.get()
+
+
+async def within_deadline(awaitable):
+    """``await`` acotado por el deadline actual; ``TimeoutError`` si se agota."""
+    deadline = current_deadline()
+    if deadline is None:
+        return await awaitable
+    return await asyncio.wait_for(awaitable, timeout=deadline.remaining())
+
+
+def yf_download(*args, **kwargs):
+    """``yf.download`` detrás de ``YAHOO_BREAKER``.
+
+    Con el circuito abierto falla al instante con ``UpstreamUnavailableError``
+    en lugar de esperar timeouts. Dentro de un comando con deadline el timeout
+    HTTP se recorta a lo que queda del presupuesto.
+    """
+    if not YAHOO_BREAKER.allow():
+        raise UpstreamUnavailableError(
+            "Yahoo Finance no responde; reintentá en unos minutos."
+        )
+    deadline = current_deadline()
+    if deadline is not None:
+        kwargs["timeout"] = max(
+            DEADLINE_MIN_CALL_TIMEOUT, min(kwargs.get("timeout", 10), deadline.remaining())
+        )
+    started = time.monotonic()
+    try:
+        df = yf.download(*args, **kwargs)
+    except Exception:
+        YAHOO_BREAKER.record_failure()
+        raise
+    elapsed = time.monotonic() - started
+    slow = YAHOO_BREAKER.slow_call_seconds
+    if slow is not None and elapsed > slow:
+        log.warning("yf_download slow call elapsed=%.1fs tickers=%s", elapsed, args[:1])
+        YAHOO_BREAKER.record_failure()
+    elif getattr(df, "empty", True):
+        YAHOO_BREAKER.record_neutral()
+    else:
+        YAHOO_BREAKER.record_success()
+    return df
+
+
+class _LRUCache:
+    """Diccionario acotado thread-safe que descarta el uso menos reciente."""
+
+    def __init__(self, maxsize: int = 32):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+# (tipo, *args) -> (timestamp, valor) del último resultado bueno
+LAST_GOOD = _LRUCache(maxsize=64)
+_REFRESHING: set = set()
+_BACKGROUND_TASKS: set = set()
+
+
+def _cache_key(kind: str, args: tuple) -> tuple:
+    key = (kind,) + tuple(tuple(a) if isinstance(a, list) else a for a in args)
+    # Bots con universo propio no comparten resultados por defecto con el resto
+    scope = universe()
+    return key if scope is TICKERS else key + (tuple(scope),)
+
+
+def _freeze(value):
+    if isinstance(value, io.BytesIO):
+        return value.getvalue()
+    return value
+
+
+def _thaw(value):
+    if isinstance(value, bytes):
+        return new_buffer(value)
+    return value
+
+
+def stale_note(age_seconds: float) -> str:
+    minutes = int(age_seconds // 60)
+    if minutes < 1:
+        age = "menos de 1 min"
+    elif minutes < 120:
+        age = f"{minutes} min"
+    else:
+        age = f"{minutes // 60} h"
+    return f"⚠️ Yahoo Finance no responde: datos de hace {age}."
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Await directo para corutinas; ``asyncio.to_thread`` para funciones bloqueantes."""
+    if asyncio.iscoroutinefunction(func):
+        return await func(*args, **kwargs)
+    return await asyncio.to_thread(profile_call, func, *args, **kwargs)
+
+
+def _spawn_background(coro) -> asyncio.Task:
+    task = asyncio.get_running_loop().create_task(coro)
+    _BACKGROUND_TASKS.add(task)
+    task.add_done_callback(_BACKGROUND_TASKS.discard)
+    return task
+
+
+async def _refresh_stale(key: tuple, func, args: tuple) -> None:
+    try:
+        for attempt in range(1, STALE_REFRESH_ATTEMPTS + 1):
+            await asyncio.sleep(max(YAHOO_BREAKER.retry_in(), 1.0))
+            try:
+                value = await run_blocking(func, *args)
+            except Exception as ex:
+                log.warning("refresh %s attempt=%s failed: %s", key[0], attempt, ex)
+                continue
+            LAST_GOOD.put(key, (time.time(), _freeze(value)))
+            log.info("refresh %s succeeded attempt=%s", key[0], attempt)
+            return
+        log.warning("refresh %s gave up after %s attempts", key[0], STALE_REFRESH_ATTEMPTS)
+    finally:
+        _REFRESHING.discard(key)
+
+
+def _schedule_refresh(key: tuple, func, args: tuple) -> None:
+    if key in _REFRESHING:
+        return
+    _REFRESHING.add(key)
+    _spawn_background(_refresh_stale(key, func, args))
+
+
+async def fetch_with_stale(kind: str, func, *args, **kwargs):
+    """Corre ``func(*args)`` (en un hilo si es bloqueante) con stale-while-revalidate.
+
+    Devuelve ``(valor, antigüedad)``: la antigüedad es ``None`` para datos
+    frescos, o los segundos del último resultado bueno cuando Yahoo está caído
+    (en ese caso se agenda un único refresco en segundo plano). ``kwargs`` sólo
+    se pasan a la llamada en primer plano y no forman parte de la clave. Un
+    resultado recortado por el deadline (tickers omitidos) no se guarda.
+    """
+    key = _cache_key(kind, args)
+    cached = LAST_GOOD.get(key)
+    if cached is not None and YAHOO_BREAKER.is_open:
+        _schedule_refresh(key, func, args)
+        return _thaw(cached[1]), time.time() - cached[0]
+    deadline = current_deadline()
+    omitted_before = len(deadline.omitted) if deadline is not None else 0
+    try:
+        value = await run_blocking(func, *args, **kwargs)
+    except RuntimeError as ex:
+        upstream_down = isinstance(ex, UpstreamUnavailableError) or YAHOO_BREAKER.is_open
+        if cached is None or not upstream_down:
+            raise
+        log.warning("%s serving stale data: %s", kind, ex)
+        _schedule_refresh(key, func, args)
+        return _thaw(cached[1]), time.time() - cached[0]
+    if deadline is not None and len(deadline.omitted) > omitted_before:
+        log.info("%s truncated by deadline; not stored as last good", kind)
+    else:
+        LAST_GOOD.put(key, (time.time(), _freeze(value)))
+    if isinstance(value, io.BytesIO):
+        value.seek(0)
+    return value, None
+
+# ------------------ NÚCLEO FINANCIERO ----------------
+TICKERS = [norm_ticker_ba(x) for x in [
+    'ALUA','BMA','BYMA','CEPU','COME','CRES','CVH','EDN','GGAL','MIRG',
+    'PAMP','SUPV','TECO2','TGNO4','TGSU2','TRAN','TXAR','VALO','YPFD',
+    'DOME','AGRO','AUSO','BBAR','BHIP','BPAT','CADO','CAPX','CARC',
+    'CELU','CGPA2','CTIO','DGCU2','DYCA','FERR','FIPL','BOLT','A3',
+    'GARO','GBAN','GCLA','GRIM','HARG','HAVA','INTR','INVJ','IRSA',
+    'LEDE','LOMA','LONG','METR','MOLA','MOLI','MORI','OEST','PATA',
+    'POLL','RICH','RIGO','ROSE','SAMI','SEMI'
+]]
+
+def ccl_from_legs(local: pd.Series, adr: pd.Series) -> pd.Series:
+    """CCL diario = local / ADR, con huecos rellenados (ffill/bfill)."""
+    ccl = (local / adr).to_frame("CCL").asfreq("D").ffill().bfill()["CCL"]
+    if isinstance(ccl.index, pd.DatetimeIndex):
+        ccl.index = ensure_utc_naive_index(ccl.index)
+    return ccl
+
+def composite_ccl(
+    local: pd.DataFrame,
+    adr: pd.DataFrame,
+    ratios: np.ndarray,
+    method: str = "median",
+    trim: float = 0.2,
+) -> pd.Series:
+    """CCL compuesto: por día, agregado robusto del CCL implícito de cada par.
+
+    ``local`` y ``adr`` son cierres fechas × pares (mismo orden de columnas);
+    el CCL del par *i* es ``local_i * ratios_i / adr_i``. ``method`` es
+    ``"median"`` o ``"trimmed"`` (media recortando ``trim`` de cada punta).
+    Los pares sin dato ese día no participan.
+    """
+    implied = local.to_numpy(dtype=np.float64) * ratios / adr.to_numpy(dtype=np.float64)
+    implied[~np.isfinite(implied)] = np.nan
+    valid = (~np.isnan(implied)).sum(axis=1)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        if method == "trimmed":
+            ordered = np.sort(implied, axis=1)  # NaN al final
+            cut = np.floor(valid * trim).astype(int)
+            pos = np.arange(ordered.shape[1])
+            keep = (pos >= cut[:, None]) & (pos < (valid - cut)[:, None])
+            values = np.where(keep, ordered, 0.0).sum(axis=1) / keep.sum(axis=1)
+        else:
+            values = np.nanmedian(implied, axis=1)
+    return pd.Series(values, index=local.index, name="CCL")
+
+def ccl_symbols() -> list[str]:
+    """Símbolos que necesita el CCL configurado (patas locales y ADRs)."""
+    if CCL_MODE != "composite":
+        return ["YPFD.BA", "YPF"]
+    return list(dict.fromkeys(s for local, adr, _ in CCL_PAIRS for s in (local, adr)))
+
+def ccl_from_frame(close: pd.DataFrame) -> pd.Series:
+    """CCL diario (simple o compuesto según ``CCL_MODE``) desde cierres por símbolo."""
+    if CCL_MODE != "composite":
+        return ccl_from_legs(close["YPFD.BA"], close["YPF"])
+    pairs = [p for p in CCL_PAIRS if p[0] in close.columns and p[1] in close.columns]
+    if not pairs:
+        raise RuntimeError("No se pudo descargar ningún par para el CCL compuesto.")
+    ccl = composite_ccl(
+        close[[p[0] for p in pairs]],
+        close[[p[1] for p in pairs]],
+        np.array([p[2] for p in pairs]),
+        CCL_AGGREGATE,
+        CCL_TRIM,
+    ).dropna()
+    ccl = ccl.to_frame().asfreq("D").ffill().bfill()["CCL"]
+    if isinstance(ccl.index, pd.DatetimeIndex):
+        ccl.index = ensure_utc_naive_index(ccl.index)
+    return ccl
+
+CCL_CACHE = _LRUCache(maxsize=int(os.getenv("CCL_PRICE_CACHE_SIZE", "8")))
+
+def download_ccl_composite(start: str, end: str) -> pd.Series:
+    """CCL compuesto con todas las patas de ``CCL_PAIRS`` en una sola descarga (cacheado)."""
+    symbols = ccl_symbols()
+    key = (start, end, tuple(CCL_PAIRS), CCL_AGGREGATE, CCL_TRIM)
+    cached = CCL_CACHE.get(key)
+    if cached is not None and time.time() - cached[0] < PRICE_CACHE_TTL:
+        return cached[1]
+    log.info("download_ccl_composite request pairs=%d start=%s end=%s", len(CCL_PAIRS), start, end)
+    raw = yf_download(symbols, start=start, end=end, auto_adjust=True, progress=False)
+    close = raw["Close"]
+    if isinstance(close, pd.Series):
+        close = close.to_frame(symbols[0])
+    if isinstance(close.index, pd.DatetimeIndex):
+        close.index = ensure_utc_naive_index(close.index)
+    missing = [s for s in symbols if s not in close.columns or close[s].isna().all()]
+    if missing:
+        log.warning("download_ccl_composite missing legs %s", missing)
+    ccl = ccl_from_frame(close.drop(columns=[s for s in missing if s in close.columns]))
+    CCL_CACHE.put(key, (time.time(), ccl))
+    return ccl
+
+def download_ccl(start: str, end: str) -> pd.Series:
+    """CCL = YPFD.BA / YPF (Close); con ``CCL_MODE=composite`` usa ``download_ccl_composite``."""
+    if CCL_MODE == "composite":
+        return download_ccl_composite(start, end)
+    try:
+        log.info("download_ccl request %s start=%s end=%s", "YPFD.BA", start, end)
+        df_ars = yf_download(["YPFD.BA"], start=start, end=end, auto_adjust=True, progress=False)
+        log.info(
+            "download_ccl response %s shape=%s index_range=%s→%s",
+            "YPFD.BA",
+            getattr(df_ars, "shape", None),
+            df_ars.index.min() if getattr(df_ars, "index", None) is not None and not df_ars.index.empty else None,
+            df_ars.index.max() if getattr(df_ars, "index", None) is not None and not df_ars.index.empty else None,
+        )
+    except Exception as ex:
+        log.error("download_ccl error downloading %s: %s", "YPFD.BA", ex, exc_info=True)
+        raise
+    try:
+        log.info("download_ccl request %s start=%s end=%s", "YPF", start, end)
+        df_us = yf_download(["YPF"], start=start, end=end, auto_adjust=True, progress=False)
+        log.info(
+            "download_ccl response %s shape=%s index_range=%s→%s",
+            "YPF",
+            getattr(df_us, "shape", None),
+            df_us.index.min() if getattr(df_us, "index", None) is not None and not df_us.index.empty else None,
+            df_us.index.max() if getattr(df_us, "index", None) is not None and not df_us.index.empty else None,
+        )
+    except Exception as ex:
+        log.error("download_ccl error downloading %s: %s", "YPF", ex, exc_info=True)
+        raise
+    # Normalizar índices para evitar problemas de zona horaria
+    for df in (df_ars, df_us):
+        if isinstance(df.index, pd.DatetimeIndex):
+            df.index = ensure_utc_naive_index(df.index)
+    ypf_ars = df_ars["Close"]["YPFD.BA"] if isinstance(df_ars["Close"], pd.DataFrame) else df_ars["Close"]
+    ypf_usd = df_us["Close"]["YPF"]     if isinstance(df_us["Close"],  pd.DataFrame) else df_us["Close"]
+    ccl = ccl_from_legs(ypf_ars, ypf_usd)
+    idx = getattr(ccl, "index", None)
+    index_min = idx.min() if idx is not None and not idx.empty else None
+    index_max = idx.max() if idx is not None and not idx.empty else None
+    log.debug(
+        "download_ccl result size=%s index_range=%s→%s",
+        ccl.size,
+        index_min,
+        index_max,
+    )
+    return ccl
+
+PRICE_CACHE = _LRUCache(maxsize=int(os.getenv("CCL_PRICE_CACHE_SIZE", "8")))
+PRICE_CACHE_TTL = float(os.getenv("CCL_PRICE_CACHE_TTL", "900"))
+
+def get_var(
+    start: str,
+    end: str,
+    *,
+    progress: Optional[Callable[[int, int], None]] = None,
+    chunk_size: Optional[int] = None,
+) -> tuple[pd.Series, str]:
+    """Retornos en USD (vía CCL) entre start y end, ordenados ascendente (%).
+
+    Con ``COMPACT_PRICES`` los precios se bajan a float32 sobre un índice int32
+    de días compartido con el CCL (se usan sólo las ruedas de los tickers).
+    Los tickers que ``TICKER_INDEX`` sabe listados después de ``start`` no se
+    descargan: su retorno punta a punta no existe.
+    """
+    meter = _StageMeter("get_var")
+    tickers, skipped = TICKER_INDEX.select(universe(), start, end, full=True)
+    close, failed = download_close(
+        start, end, tickers=tickers, progress=progress, chunk_size=chunk_size, meter=meter
+    )
+    failed = skipped + failed
+    return returns_from_prices(close, download_ccl(start, end), failed, meter=meter)
+
+def get_close_usd(
+    start: str,
+    end: str,
+    *,
+    tickers: Optional[list[str]] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> tuple[pd.DataFrame, list[str]]:
+    """Matriz de cierres en USD (vía CCL), fechas × tickers, y los fallidos.
+
+    El resultado se comparte entre comandos durante ``PRICE_CACHE_TTL`` segundos
+    (riesgo, correlaciones, períodos y sectores leen la misma matriz).
+    """
+    key = (start, end, tuple(universe() if tickers is None else tickers))
+    cached = PRICE_CACHE.get(key)
+    if cached is not None and time.time() - cached[0] < PRICE_CACHE_TTL:
+        return cached[1]
+    close, failed = download_close(start, end, tickers=tickers, progress=progress)
+    result = (prices_in_usd(close, download_ccl(start, end)), failed)
+    PRICE_CACHE.put(key, (time.time(), result))
+    return result
+
+def download_close(
+    start: str,
+    end: str,
+    *,
+    tickers: Optional[list[str]] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+    chunk_size: Optional[int] = None,
+    meter: Optional[_StageMeter] = None,
+) -> tuple[pd.DataFrame, list[str]]:
+    """Cierres en ARS de ``tickers`` (default ``universe()``) y los que fallaron.
+
+    La descarga masiva va en un solo lote salvo que se pase ``chunk_size``,
+    ``progress`` o haya un deadline activo; en ese caso se baja por lotes y
+    ``progress(hechos, total)`` se invoca tras cada uno. Los fallidos se
+    reintentan de a uno. Si el deadline se agota, los lotes pendientes quedan
+    en ``Deadline.omitted`` y se devuelve lo que ya se bajó. Los inválidos y
+    fuera de rango según ``TICKER_INDEX`` se saltean sin consultar a Yahoo, y
+    el índice se actualiza con lo descargado.
+    """
+    tickers, skipped = TICKER_INDEX.select(list(universe() if tickers is None else tickers), start, end)
+    data: dict[str, pd.Series] = {}
+    failed: list[str] = []
+    empty: list[str] = []
+    meter = meter or _StageMeter("download_close")
+
+    def normalize_index(obj: Union[pd.DataFrame, pd.Series]) -> Union[pd.DataFrame, pd.Series]:
+        if isinstance(obj.index, pd.DatetimeIndex):
+            obj.index = ensure_utc_naive_index(obj.index)
+        return obj
+
+    def mark_failed(ticker: str, reason: str) -> None:
+        if ticker not in failed:
+            log.warning(f"Fallo descargando {ticker}: {reason}")
+            failed.append(ticker)
+
+    total = len(tickers)
+    deadline = current_deadline()
+    if chunk_size is None:
+        chunk_size = PROGRESS_CHUNK_SIZE if progress is not None or deadline else total
+    chunk_size = max(1, chunk_size)
+    for offset in range(0, total, chunk_size):
+        chunk = tickers[offset:offset + chunk_size]
+        if deadline is not None and deadline.expired:
+            log.warning("download_close deadline reached; omitting %d tickers", total - offset)
+            deadline.omit(tickers[offset:])
+            break
+        try:
+            bulk = yf_download(
+                chunk,
+                start=start,
+                end=end,
+                auto_adjust=True,
+                progress=False,
+                threads=False,
+            )
+            idx = getattr(bulk, "index", None)
+            index_min = idx.min() if idx is not None and not getattr(idx, "empty", True) else None
+            index_max = idx.max() if idx is not None and not getattr(idx, "empty", True) else None
+            log.info(
+                "get_var bulk download shape=%s index_range=%s→%s",
+                getattr(bulk, "shape", None),
+                index_min,
+                index_max,
+            )
+            meter.record("bulk", bulk)
+        except (TimeoutError, requests.exceptions.RequestException, Exception) as ex:
+            log.warning("get_var descarga masiva fallida: %s", ex)
+            for ticker in chunk:
+                mark_failed(ticker, str(ex))
+            bulk = None
+
+        close = None
+        if isinstance(bulk, pd.DataFrame) and not bulk.empty:
+            try:
+                close = bulk["Close"]
+            except KeyError:
+                close = None
+        elif isinstance(bulk, pd.Series) and not bulk.empty:
+            close = bulk
+
+        if close is None or (hasattr(close, "empty") and close.empty):
+            for ticker in chunk:
+                mark_failed(ticker, "sin datos en descarga masiva")
+        else:
+            if isinstance(close, pd.Series):
+                name = close.name if isinstance(close.name, str) else chunk[0]
+                close = close.to_frame(name)
+            normalize_index(close)
+            for ticker in chunk:
+                if ticker not in close.columns:
+                    mark_failed(ticker, "sin datos en descarga masiva")
+                    continue
+                ser = close[ticker]
+                if isinstance(ser, pd.DataFrame):
+                    ser = ser.iloc[:, 0]
+                if ser.dropna().empty:
+                    mark_failed(ticker, "serie vacía en descarga masiva")
+                    continue
+                data[ticker] = ser
+        if progress is not None:
+            progress(min(offset + chunk_size, total), total)
+    # Soltar la descarga masiva: sólo se conservan las series por ticker
+    bulk = close = None
+
+    failed = [ticker for ticker in failed if ticker not in data]
+
+    if failed:
+        retry_fail: list[str] = []
+        for t in failed:
+            if deadline is not None and deadline.expired:
+                retry_fail.append(t)
+                continue
+            try:
+                df = yf_download(
+                    [t],
+                    start=start,
+                    end=end,
+                    auto_adjust=True,
+                    progress=False,
+                    timeout=30,
+                )
+            except (TimeoutError, requests.exceptions.RequestException, Exception) as ex:
+                log.warning(f"Reintento fallido para {t}: {ex}")
+                retry_fail.append(t)
+                continue
+
+            if "Close" not in df:
+                retry_fail.append(t)
+                empty.append(t)
+                continue
+
+            ser = df["Close"][t] if isinstance(df["Close"], pd.DataFrame) else df["Close"]
+            normalize_index(ser)
+            if ser.dropna().empty:
+                retry_fail.append(t)
+                empty.append(t)
+                continue
+            data[t] = ser
+        failed = retry_fail
+
+    if not data:
+        if YAHOO_BREAKER.is_open:
+            raise UpstreamUnavailableError(
+                "No se pudieron descargar precios: Yahoo Finance no responde."
+            )
+        if deadline is not None and deadline.expired:
+            raise RuntimeError(
+                f"No se pudieron descargar precios dentro del límite de {deadline.seconds:.0f} s."
+            )
+        raise RuntimeError("No se pudieron descargar precios.")
+
+    close = pd.DataFrame(data)
+    data.clear()
+    TICKER_INDEX.record_prices(close, start, end)
+    # Yahoo respondió por otros tickers: los vacíos no son una caída
+    TICKER_INDEX.record_missing(empty, start, end)
+    return close, skipped + failed
+
+def prices_in_usd(
+    close: pd.DataFrame,
+    ccl: pd.Series,
+    *,
+    meter: Optional[_StageMeter] = None,
+) -> pd.DataFrame:
+    """Divide ``close`` (ARS) por ``ccl`` respetando ``COMPACT_PRICES``."""
+    meter = meter or _StageMeter("prices_in_usd")
+    if COMPACT_PRICES:
+        close = compact_prices(close)
+    elif isinstance(close.index, pd.DatetimeIndex):
+        close.index = ensure_utc_naive_index(close.index)
+    meter.record("close", close)
+
+    if COMPACT_PRICES:
+        ccl = compact_prices(ccl.ffill()).reindex(close.index)
+        meter.record("ccl", ccl)
+        close_usd = close.div(ccl, axis=0)
+    else:
+        ccl = ccl.to_frame().ffill()
+        if isinstance(ccl.index, pd.DatetimeIndex):
+            ccl.index = ensure_utc_naive_index(ccl.index)
+        meter.record("ccl", ccl)
+        close_usd = close.div(ccl.iloc[:, 0], axis=0)
+    meter.record("close_usd", close_usd)
+    return close_usd
+
+def unknown_tickers_message(symbols: list[str]) -> str:
+    return "Tickers desconocidos o sin datos en el rango: " + ", ".join(
+        prettify_symbol(t) for t in symbols
+    )
+
+def omitted_message(failed: list[str]) -> str:
+    if not failed:
+        return ""
+    return "Tickers omitidos por error de descarga: " + ", ".join(prettify_symbol(t) for t in failed)
+
+def deadline_message(deadline: Optional[Deadline]) -> str:
+    if deadline is None or not deadline.omitted:
+        return ""
+    return (
+        f"Tickers omitidos por límite de tiempo ({deadline.seconds:.0f} s): "
+        + ", ".join(prettify_symbol(t) for t in deadline.omitted)
+    )
+
+def returns_from_prices(
+    close: pd.DataFrame,
+    ccl: pd.Series,
+    failed: list[str],
+    *,
+    meter: Optional[_StageMeter] = None,
+) -> tuple[pd.Series, str]:
+    """Pasa ``close`` (ARS) a USD con ``ccl`` y calcula el retorno punta a punta (%)."""
+    meter = meter or _StageMeter("get_var")
+    close_usd = prices_in_usd(close, ccl, meter=meter)
+
+    var = (close_usd.iloc[-1] / close_usd.iloc[0] - 1.0) * 100.0
+    var = var.astype(np.float64)
+    meter.record("var", var)
+    meter.finish()
+    return var.dropna().sort_values(), omitted_message(failed)
+
+# ------------------ CLIENTE ASYNC YAHOO -------------
+class YahooChartClient:
+    """Cliente asyncio del endpoint ``/v8/finance/chart`` de Yahoo.
+
+    Usa un único ``httpx.AsyncClient`` con pool keep-alive (gzip incluido),
+    limita la concurrencia con un semáforo y parsea cada respuesta directo a
+    arrays de NumPy. Respeta ``YAHOO_BREAKER`` igual que ``yf_download``.
+    """
+
+    USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) BYMAcclBot"
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        *,
+        max_connections: int = 8,
+        max_concurrency: Optional[int] = None,
+        timeout: float = 20.0,
+    ):
+        self.base_url = (base_url or YAHOO_CHART_URL).rstrip("/")
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency or max_connections
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _session(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                headers={"User-Agent": self.USER_AGENT, "Accept-Encoding": "gzip"},
+                timeout=self.timeout,
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @staticmethod
+    def parse_chart(payload: dict) -> tuple[np.ndarray, np.ndarray]:
+        """JSON del chart → (días ``datetime64[D]`` locales, cierres ajustados)."""
+        chart = payload.get("chart") or {}
+        if chart.get("error"):
+            raise RuntimeError(f"Yahoo chart error: {chart['error']}")
+        result = (chart.get("result") or [None])[0]
+        if not result or not result.get("timestamp"):
+            return np.array([], dtype="datetime64[D]"), np.array([], dtype=np.float64)
+        offset = int(result.get("meta", {}).get("gmtoffset") or 0)
+        ts = np.asarray(result["timestamp"], dtype=np.int64) + offset
+        days = (ts // 86400).astype("datetime64[D]")
+        indicators = result.get("indicators", {})
+        adj = indicators.get("adjclose") or indicators.get("quote") or [{}]
+        raw = adj[0].get("adjclose", adj[0].get("close", []))
+        closes = np.array(raw, dtype=np.float64)  # None → nan
+        return days, closes
+
+    async def fetch_chart(self, symbol: str, start: str, end: str) -> tuple[np.ndarray, np.ndarray]:
+        if not YAHOO_BREAKER.allow():
+            raise UpstreamUnavailableError(
+                "Yahoo Finance no responde; reintentá en unos minutos."
+            )
+        period1 = int(pd.Timestamp(start).timestamp())
+        period2 = int(pd.Timestamp(end).timestamp())
+        client = self._session()
+        try:
+            async with self._semaphore:
+                resp = await client.get(
+                    f"/v8/finance/chart/{symbol}",
+                    params={
+                        "period1": period1,
+                        "period2": period2,
+                        "interval": "1d",
+                        "events": "div,splits",
+                        "includeAdjustedClose": "true",
+                    },
+                )
+            resp.raise_for_status()
+            days, closes = self.parse_chart(resp.json())
+        except httpx.HTTPStatusError as ex:
+            if ex.response.status_code >= 500 or ex.response.status_code == 429:
+                YAHOO_BREAKER.record_failure()
+            else:
+                YAHOO_BREAKER.record_neutral()
+            raise
+        except Exception:
+            YAHOO_BREAKER.record_failure()
+            raise
+        if closes.size:
+            YAHOO_BREAKER.record_success()
+        else:
+            YAHOO_BREAKER.record_neutral()
+        return days, closes
+
+    async def fetch_close(
+        self,
+        symbols: list[str],
+        start: str,
+        end: str,
+        *,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> tuple[pd.DataFrame, list[str]]:
+        """Cierres ajustados de ``symbols`` (columnas) y la lista de fallidos."""
+        done = 0
+
+        async def fetch_one(sym: str):
+            nonlocal done
+            try:
+                return await self.fetch_chart(sym, start, end)
+            finally:
+                done += 1
+                if progress is not None:
+                    progress(done, len(symbols))
+
+        tasks = [asyncio.ensure_future(fetch_one(sym)) for sym in symbols]
+        deadline = current_deadline()
+        if deadline is not None and tasks:
+            _, pending = await asyncio.wait(tasks, timeout=deadline.remaining())
+            for task in pending:
+                task.cancel()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        series: dict[str, pd.Series] = {}
+        failed: list[str] = []
+        for sym, res in zip(symbols, results):
+            if isinstance(res, asyncio.CancelledError) and deadline is not None:
+                deadline.omit([sym])
+                failed.append(sym)
+                continue
+            if isinstance(res, BaseException):
+                log.warning("YahooChartClient %s failed: %s", sym, res)
+                failed.append(sym)
+                continue
+            days, closes = res
+            if closes.size == 0 or np.isnan(closes).all():
+                failed.append(sym)
+                continue
+            ser = pd.Series(closes, index=pd.DatetimeIndex(days))
+            series[sym] = ser[~ser.index.duplicated(keep="last")]
+        frame = pd.DataFrame(series)
+        log.info(
+            "YahooChartClient fetch_close symbols=%s ok=%s failed=%s",
+            len(symbols),
+            frame.shape[1],
+            len(failed),
+        )
+        return frame, failed
+
+
+YAHOO_CLIENT = YahooChartClient(max_connections=YAHOO_MAX_CONNECTIONS)
+
+
+async def download_ccl_async(start: str, end: str, client: Optional[YahooChartClient] = None) -> pd.Series:
+    """Versión async de ``download_ccl`` sobre ``YahooChartClient``."""
+    client = client or YAHOO_CLIENT
+    legs, failed = await client.fetch_close(ccl_symbols(), start, end)
+    if failed and CCL_MODE != "composite":
+        raise RuntimeError("No se pudo descargar el CCL (YPFD.BA / YPF).")
+    return ccl_from_frame(legs)
+
+
+async def get_var_async(
+    start: str,
+    end: str,
+    client: Optional[YahooChartClient] = None,
+    *,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> tuple[pd.Series, str]:
+    """``get_var`` sin hilos: tickers y patas del CCL en un solo lote async."""
+    client = client or YAHOO_CLIENT
+    tickers, skipped = TICKER_INDEX.select(universe(), start, end, full=True)
+    legs = [t for t in ccl_symbols() if t not in tickers]
+    frame, failed = await client.fetch_close(
+        tickers + legs, start, end, progress=progress
+    )
+    TICKER_INDEX.record_prices(frame, start, end)
+    if CCL_MODE != "composite" and ("YPFD.BA" in failed or "YPF" in failed):
+        raise RuntimeError("No se pudo descargar el CCL (YPFD.BA / YPF).")
+    ccl = ccl_from_frame(frame)
+    close = frame[[t for t in tickers if t in frame.columns]].dropna(how="all")
+    deadline = current_deadline()
+    omitted = deadline.omitted if deadline is not None else []
+    failed = skipped + [t for t in failed if t in tickers and t not in omitted]
+    if close.empty:
+        if YAHOO_BREAKER.is_open:
+            raise UpstreamUnavailableError(
+                "No se pudieron descargar precios: Yahoo Finance no responde."
+            )
+        raise RuntimeError("No se pudieron descargar precios.")
+    return returns_from_prices(close, ccl, failed)
+
+# ------------------ ANÁLISIS VECTORIZADO ------------
+def horizon_start(end: str, horizon: str) -> str:
+    """Fecha inicial ISO de ``horizon`` (``1M``, ``3M``, ``YTD``, ``1Y``…) terminando en ``end``."""
+    end_ts = pd.Timestamp(end)
+    horizon = horizon.strip().upper()
+    if horizon == "YTD":
+        return pd.Timestamp(end_ts.year, 1, 1).date().isoformat()
+    try:
+        n, unit = int(horizon[:-1]), horizon[-1]
+    except ValueError:
+        raise ValueError(f"Horizonte inválido: {horizon}") from None
+    if unit == "W":
+        offset = pd.DateOffset(weeks=n)
+    elif unit == "M":
+        offset = pd.DateOffset(months=n)
+    elif unit == "Y":
+        offset = pd.DateOffset(years=n)
+    else:
+        raise ValueError(f"Horizonte inválido: {horizon}")
+    return (end_ts - offset).date().isoformat()
+
+def returns_over_horizons(close_usd: pd.DataFrame, end: str, horizons: list[str]) -> pd.DataFrame:
+    """Retornos (%) tickers × horizontes en una sola operación matricial.
+
+    Para cada horizonte la base es la primera rueda en o después de su fecha
+    inicial (igual que ``get_var``); el último valor es común a todos.
+    """
+    prices = close_usd.ffill()
+    index = from_day_index(prices.index)
+    starts = np.array([np.datetime64(horizon_start(end, h)) for h in horizons])
+    rows = np.searchsorted(index.values.astype("datetime64[D]"), starts, side="left")
+    rows = np.clip(rows, 0, len(index) - 1)
+    values = prices.to_numpy(dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        matrix = (values[-1][None, :] / values[rows] - 1.0) * 100.0
+    return pd.DataFrame(matrix.T, index=prices.columns, columns=list(horizons))
+
+def get_var_horizons(end: str, horizons: Optional[list[str]] = None) -> tuple[pd.DataFrame, str]:
+    """Retornos para varios horizontes con una única descarga del rango más largo."""
+    horizons = list(horizons or HORIZONS)
+    earliest = min(horizon_start(end, h) for h in horizons)
+    close_usd, failed = get_close_usd(earliest, end)
+    table = returns_over_horizons(close_usd, end, horizons)
+    return table.dropna(how="all"), omitted_message(failed)
+
+TRADING_DAYS = 252
+
+# métrica de /cclriesgo → (columna, etiqueta, orden ascendente del ranking)
+RISK_METRICS = {
+    "vol": ("vol", "Volatilidad anualizada (%)", False),
+    "dd": ("max_dd", "Máximo drawdown (%)", True),
+    "sharpe": ("sharpe", "Sharpe (rf=0, anualizado)", False),
+    "mejor": ("best_day", "Mejor día (%)", False),
+    "peor": ("worst_day", "Peor día (%)", True),
+}
+
+def risk_stats(close_usd: pd.DataFrame) -> pd.DataFrame:
+    """Volatilidad, drawdown máximo, Sharpe y mejor/peor día por ticker.
+
+    Todo sale de una pasada NumPy sobre la matriz fechas × tickers (sin loop por
+    ticker). Los días sin ninguna cotización (fines de semana del CCL) se
+    descartan antes de calcular retornos diarios.
+    """
+    prices = close_usd.dropna(how="all").ffill()
+    values = prices.to_numpy(dtype=np.float64)
+    if values.shape[0] < 2:
+        raise RuntimeError("Se necesitan al menos dos ruedas para medir riesgo.")
+    with np.errstate(divide="ignore", invalid="ignore"), warnings.catch_warnings():
+        # columnas sin datos suficientes quedan en NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        daily = values[1:] / values[:-1] - 1.0
+        mean = np.nanmean(daily, axis=0)
+        std = np.nanstd(daily, axis=0, ddof=1)
+        peak = np.fmax.accumulate(values, axis=0)
+        drawdown = values / peak - 1.0
+        stats = {
+            "vol": std * np.sqrt(TRADING_DAYS) * 100.0,
+            "max_dd": np.nanmin(drawdown, axis=0) * 100.0,
+            "sharpe": np.where(std > 0, mean / std * np.sqrt(TRADING_DAYS), np.nan),
+            "best_day": np.nanmax(daily, axis=0) * 100.0,
+            "worst_day": np.nanmin(daily, axis=0) * 100.0,
+        }
+    return pd.DataFrame(stats, index=prices.columns).dropna(how="all")
+
+def get_risk_stats(start: str, end: str) -> tuple[pd.DataFrame, str]:
+    close_usd, failed = get_close_usd(start, end)
+    return risk_stats(close_usd), omitted_message(failed)
+
+def log_returns(close_usd: pd.DataFrame) -> pd.DataFrame:
+    """Retornos logarítmicos diarios (NaN donde falta alguna de las dos ruedas)."""
+    prices = close_usd.dropna(how="all").astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        logp = np.log(prices.where(prices > 0))
+    return logp.diff().iloc[1:]
+
+def correlation_matrix(returns: np.ndarray, min_periods: int = 5) -> np.ndarray:
+    """Correlación con observaciones pareadas, vectorizada con productos matriciales.
+
+    ``returns`` es fechas × tickers con NaN; cada par usa sólo las fechas en que
+    ambos tienen dato (como ``DataFrame.corr``) pero sin loop sobre pares.
+    """
+    mask = np.isfinite(returns).astype(np.float64)
+    x = np.where(mask > 0, returns, 0.0)
+    n = mask.T @ mask
+    sx = x.T @ mask            # suma de x_i en las fechas compartidas con j
+    sxx = (x * x).T @ mask
+    sxy = x.T @ x
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = sxy - sx * sx.T / n
+        var_i = sxx - sx * sx / n
+        corr = cov / np.sqrt(var_i * var_i.T)
+    corr[n < min_periods] = np.nan
+    np.fill_diagonal(corr, 1.0)
+    return np.clip(corr, -1.0, 1.0)
+
+def cluster_order(corr: np.ndarray) -> list[int]:
+    """Orden de hojas de un clustering jerárquico (average linkage) sobre 1 - corr."""
+    n = corr.shape[0]
+    if n <= 2:
+        return list(range(n))
+    dist = 1.0 - np.nan_to_num(corr, nan=0.0)
+    np.fill_diagonal(dist, np.inf)
+    sizes = np.ones(n)
+    members: list[Optional[list[int]]] = [[i] for i in range(n)]
+    active = np.ones(n, dtype=bool)
+    for _ in range(n - 1):
+        flat = np.argmin(dist)
+        a, b = divmod(int(flat), n)
+        # Lance-Williams (average): d(a∪b, k) = (|a| d(a,k) + |b| d(b,k)) / (|a|+|b|)
+        merged = (sizes[a] * dist[a] + sizes[b] * dist[b]) / (sizes[a] + sizes[b])
+        dist[a, :] = merged
+        dist[:, a] = merged
+        dist[a, a] = np.inf
+        dist[b, :] = np.inf
+        dist[:, b] = np.inf
+        sizes[a] += sizes[b]
+        members[a] = members[a] + members[b]
+        members[b] = None
+        active[b] = False
+    return members[int(np.flatnonzero(active)[0])]
+
+_CORR_CACHE = _LRUCache(maxsize=CORR_CACHE_SIZE)
+
+def get_correlation(
+    start: str, end: str, tickers: Optional[tuple[str, ...]] = None
+) -> tuple[pd.DataFrame, str]:
+    """Matriz de correlación de retornos log en USD, ordenada por clustering.
+
+    Se cachea por ``(start, end, universo)`` durante ``CORR_CACHE_TTL`` segundos
+    porque el costo crece con el cuadrado de la cantidad de tickers.
+    """
+    symbols = tuple(tickers) if tickers else tuple(universe())
+    key = (start, end, symbols)
+    cached = _CORR_CACHE.get(key)
+    if cached is not None and time.time() - cached[0] < CORR_CACHE_TTL:
+        log.info("get_correlation cache hit tickers=%s", len(symbols))
+        return cached[1]
+    close_usd, failed = get_close_usd(start, end, tickers=list(symbols))
+    returns = log_returns(close_usd)
+    corr = correlation_matrix(returns.to_numpy())
+    keep = np.flatnonzero(np.isfinite(corr).sum(axis=1) > 1)
+    corr = corr[np.ix_(keep, keep)]
+    columns = returns.columns[keep]
+    order = cluster_order(corr)
+    labels = columns[order]
+    result = (
+        pd.DataFrame(corr[np.ix_(order, order)], index=labels, columns=labels),
+        omitted_message(failed),
+    )
+    _CORR_CACHE.put(key, (time.time(), result))
+    return result
+
+# /cclperiodos: M = mensual, S = semanal → frecuencia de pandas
+PERIOD_FREQS = {"M": "M", "S": "W"}
+
+def period_returns(close_usd: pd.DataFrame, freq: str = "M") -> pd.DataFrame:
+    """Retornos (%) por período calendario, tickers × períodos.
+
+    Una sola pasada: se toma el log-precio acumulado (``log p_t``, con ffill) en
+    los bordes de cada período y se diferencia; el primer período arranca en la
+    primera rueda del rango.
+    """
+    prices = close_usd.dropna(how="all").astype(np.float64)
+    if prices.shape[0] < 2:
+        raise RuntimeError("Se necesitan al menos dos ruedas en el rango.")
+    index = from_day_index(prices.index)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        logp = np.log(prices.where(prices > 0)).ffill().to_numpy()
+    periods = index.to_period(freq)
+    codes = periods.asi8
+    ends = np.append(np.flatnonzero(codes[1:] != codes[:-1]), len(codes) - 1)
+    bounds = logp[np.concatenate(([0], ends))]
+    with np.errstate(invalid="ignore"):
+        matrix = np.expm1(np.diff(bounds, axis=0)) * 100.0
+    if freq == "M":
+        labels = [p.strftime("%Y-%m") for p in periods[ends]]
+    else:
+        labels = [p.start_time.strftime("%Y-%m-%d") for p in periods[ends]]
+    return pd.DataFrame(matrix.T, index=prices.columns, columns=labels)
+
+def get_period_returns(
+    start: str, end: str, freq: str = "M", tickers: Optional[tuple[str, ...]] = None
+) -> tuple[pd.DataFrame, str]:
+    close_usd, failed = get_close_usd(
+        start, end, tickers=list(tickers) if tickers else None
+    )
+    table = period_returns(close_usd, freq).dropna(how="all")
+    total = np.expm1(np.log1p(table / 100.0).sum(axis=1, min_count=1)) * 100.0
+    return table.loc[total.sort_values(ascending=False).index], omitted_message(failed)
+
+def load_sectors(path: Optional[str] = None) -> tuple[dict[str, list[str]], dict[str, float]]:
+    """Grupos de sectores y acciones en circulación (para ponderar por capitalización).
+
+    Sin archivo se usan ``DEFAULT_SECTORS`` y no hay acciones configuradas, por
+    lo que sólo se calculan índices equiponderados.
+    """
+    path = path or SECTORS_FILE
+    sectors, shares = DEFAULT_SECTORS, {}
+    if path:
+        with open(path, encoding="utf-8") as file_obj:
+            config = json.load(file_obj)
+        sectors = config.get("sectors", sectors)
+        shares = config.get("shares", {})
+    return (
+        {name: [norm_ticker_ba(t) for t in members] for name, members in sectors.items()},
+        {norm_ticker_ba(t): float(v) for t, v in shares.items()},
+    )
+
+def sector_indices(
+    close_usd: pd.DataFrame,
+    sectors: dict[str, list[str]],
+    shares: Optional[dict[str, float]] = None,
+) -> pd.DataFrame:
+    """Índices sectoriales base 100, equiponderados (EW) y por capitalización (CW).
+
+    Ambos se encadenan con los retornos diarios: la matriz de retornos
+    (fechas × tickers) se reduce contra la matriz de pertenencia
+    (tickers × sectores) con un producto matricial, sin loops por sector.
+    Los huecos se rellenan con el último precio, así el movimiento a través
+    de un día sin cotización no se pierde; antes de su primer precio un
+    ticker no pesa.
+    """
+    shares = shares or {}
+    prices = close_usd.dropna(how="all").astype(np.float64).ffill()
+    names = list(sectors)
+    columns = list(prices.columns)
+    membership = np.zeros((len(columns), len(names)))
+    for j, name in enumerate(names):
+        for ticker in sectors[name]:
+            if ticker in prices.columns:
+                membership[columns.index(ticker), j] = 1.0
+    values = prices.to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        daily = values[1:] / values[:-1] - 1.0
+    valid = np.isfinite(daily)
+    daily0 = np.where(valid, daily, 0.0)
+    mask = valid.astype(np.float64)
+
+    def chain(weights: np.ndarray, member: np.ndarray) -> np.ndarray:
+        num = (weights * daily0) @ member
+        den = (weights * mask) @ member
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ret = np.where(den > 0, num / den, 0.0)
+        level = 100.0 * np.vstack([np.ones((1, member.shape[1])), np.cumprod(1.0 + ret, axis=0)])
+        level[:, member.sum(axis=0) == 0] = np.nan
+        return level
+
+    out = {}
+    ew = chain(np.ones_like(daily0), membership)
+    share_vec = np.array([shares.get(t, np.nan) for t in columns])
+    has_shares = np.isfinite(share_vec)
+    caps_prev = np.nan_to_num(values[:-1] * np.where(has_shares, share_vec, 0.0))
+    cw = chain(caps_prev, membership * has_shares[:, None])
+    for j, name in enumerate(names):
+        out[f"{name} EW"] = ew[:, j]
+        if np.isfinite(cw[:, j]).all():
+            out[f"{name} CW"] = cw[:, j]
+    return pd.DataFrame(out, index=prices.index).dropna(axis=1, how="all")
+
+def get_sector_indices(start: str, end: str) -> tuple[pd.DataFrame, str]:
+    """Índices sectoriales sobre la misma matriz de precios del universo (sin descargas extra)."""
+    sectors, shares = load_sectors()
+    close_usd, failed = get_close_usd(start, end)
+    return sector_indices(close_usd, sectors, shares), omitted_message(failed)
+
+# ---------------------- INTRADIARIO ------------------
+CCL_LEGS = ("YPFD.BA", "YPF")
+
+
+class IntradayBuffer:
+    """Ring buffer de barras intradiarias (tiempos × símbolos, float32).
+
+    Guarda sólo la rueda en curso: una barra de otro día vacía el buffer. La
+    última barra se reescribe en cada polling porque sigue abierta.
+    """
+
+    def __init__(self, symbols: list[str], capacity: int):
+        self.symbols = list(symbols)
+        self.capacity = capacity
+        self._times = np.zeros(capacity, dtype=np.int64)  # segundos UTC
+        self._values = np.full((capacity, len(self.symbols)), np.nan, dtype=np.float32)
+        self._start = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._start = self._size = 0
+
+    def _slot(self, i: int) -> int:
+        return (self._start + i) % self.capacity
+
+    def extend(self, close: pd.DataFrame) -> int:
+        """Incorpora las barras de ``close`` posteriores (o igual) a la última; devuelve las nuevas."""
+        if close.empty:
+            return 0
+        index = ensure_utc_naive_index(pd.DatetimeIndex(close.index), copy=False)
+        times = index.values.astype("datetime64[s]").astype(np.int64)
+        values = close.reindex(columns=self.symbols).to_numpy(dtype=np.float32)
+        added = 0
+        with self._lock:
+            if self._size and times[-1] // 86400 != self._times[self._slot(self._size - 1)] // 86400:
+                self._start = self._size = 0
+            last = self._times[self._slot(self._size - 1)] if self._size else np.iinfo(np.int64).min
+            for t, row in zip(times, values):
+                if t < last:
+                    continue
+                if t == last:
+                    slot = self._slot(self._size - 1)
+                else:
+                    if self._size < self.capacity:
+                        self._size += 1
+                    else:
+                        self._start = self._slot(1)
+                    slot = self._slot(self._size - 1)
+                    added += 1
+                self._times[slot] = t
+                self._values[slot] = row
+                last = t
+        return added
+
+    def session_day(self) -> Optional[date]:
+        """Fecha (en ``SUBSCRIPTION_TZ``) de la rueda que hay en el buffer."""
+        with self._lock:
+            if not self._size:
+                return None
+            last = int(self._times[self._slot(self._size - 1)])
+        return datetime.fromtimestamp(last, SUBSCRIPTION_TZ).date()
+
+    def frame(self) -> pd.DataFrame:
+        with self._lock:
+            order = [self._slot(i) for i in range(self._size)]
+            index = pd.DatetimeIndex(self._times[order].astype("datetime64[s]"), name="Datetime")
+            return pd.DataFrame(self._values[order], index=index, columns=self.symbols)
+
+
+def market_open(now: datetime) -> bool:
+    return now.weekday() < 5 and MARKET_HOURS[0] <= now.strftime("%H:%M") < MARKET_HOURS[1]
+
+
+class IntradayPoller:
+    """Un único loop que baja barras del universo y del CCL cada ``poll_seconds``.
+
+    Los comandos intradiarios leen del buffer en memoria: cualquier cantidad
+    de chats cuesta una sola descarga por ciclo. Arranca con el primer pedido;
+    fuera del horario de mercado consulta una sola vez (la última rueda) y, si
+    Yahoo no devuelve nada, reintenta con backoff hasta ``INTRADAY_CLOSED_BACKOFF``.
+    """
+
+    def __init__(self, interval: str, poll_seconds: float, capacity: int,
+                 tickers: Optional[list[str]] = None):
+        self.interval = interval
+        self.poll_seconds = poll_seconds
+        self.symbols = list(dict.fromkeys([*(tickers or TICKERS), *CCL_LEGS, *ccl_symbols()]))
+        self.buffer = IntradayBuffer(self.symbols, capacity)
+        self.baseline: Optional[pd.Series] = None
+        self._baseline_day: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        self._first_poll: Optional[asyncio.Event] = None
+        self._closed_polls = 0
+        self._closed_next = 0.0
+
+    async def ensure_started(self, wait: float = 20.0) -> None:
+        if self._task is None or self._task.done():
+            self._first_poll = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+        try:
+            await asyncio.wait_for(self._first_poll.wait(), wait)
+        except asyncio.TimeoutError:
+            log.warning("IntradayPoller first poll still pending after %.0fs", wait)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                if self.should_poll(datetime.now(SUBSCRIPTION_TZ)):
+                    await self.poll_once()
+            except Exception as ex:
+                log_exception_with_id("intraday poll failed", exc=ex)
+            finally:
+                self._first_poll.set()
+            await asyncio.sleep(self.poll_seconds)
+
+    def should_poll(self, now: datetime) -> bool:
+        """Siempre en horario; cerrado, una vez y luego sólo con backoff si no hay barras."""
+        if market_open(now):
+            self._closed_polls = 0
+            return True
+        if self._closed_polls and (len(self.buffer) or time.monotonic() < self._closed_next):
+            return False
+        self._closed_polls += 1
+        self._closed_next = time.monotonic() + min(
+            self.poll_seconds * 2 ** self._closed_polls, INTRADAY_CLOSED_BACKOFF
+        )
+        return True
+
+    async def poll_once(self) -> int:
+        raw = await run_blocking(
+            yf_download, self.symbols, period="1d", interval=self.interval,
+            auto_adjust=True, progress=False,
+        )
+        close = raw["Close"] if "Close" in raw else raw
+        added = self.buffer.extend(close.dropna(how="all"))
+        await self._refresh_baseline()
+        log.info("intraday poll bars=%d added=%d", len(self.buffer), added)
+        return added
+
+    async def _refresh_baseline(self) -> None:
+        """Cierre en USD de la rueda anterior a la del buffer (una vez por rueda).
+
+        Tras un reinicio con el mercado cerrado el buffer tiene la última rueda,
+        no la de hoy: la base es el cierre previo a esa rueda.
+        """
+        session = self.buffer.session_day() or datetime.now(SUBSCRIPTION_TZ).date()
+        if self._baseline_day == session.isoformat():
+            return
+        start = (session - timedelta(days=10)).isoformat()
+        close_usd, _ = await run_blocking(get_close_usd, start, session.isoformat())
+        close_usd = close_usd[from_day_index(close_usd.index) < pd.Timestamp(session)]
+        self.baseline = close_usd.ffill().iloc[-1].astype(np.float64)
+        self._baseline_day = session.isoformat()
+
+    def _prices(self) -> pd.DataFrame:
+        return self.buffer.frame().astype(np.float64).ffill()
+
+    def live_ccl(self) -> pd.Series:
+        prices = self._prices()
+        if CCL_MODE == "composite":
+            pairs = [p for p in CCL_PAIRS if p[0] in prices.columns and p[1] in prices.columns]
+            return composite_ccl(
+                prices[[p[0] for p in pairs]],
+                prices[[p[1] for p in pairs]],
+                np.array([p[2] for p in pairs]),
+                CCL_AGGREGATE,
+                CCL_TRIM,
+            ).dropna()
+        local, adr = CCL_LEGS
+        return (prices[local] / prices[adr]).dropna()
+
+    def movers(self) -> pd.Series:
+        """Variación (%) en USD vía CCL de la última barra contra el cierre anterior."""
+        prices = self._prices()
+        ccl = self.live_ccl()
+        if prices.empty or ccl.empty or self.baseline is None:
+            return pd.Series(dtype=np.float64)
+        usd_now = prices.iloc[-1].reindex(universe()) / float(ccl.iloc[-1])
+        return ((usd_now / self.baseline.reindex(universe()) - 1.0) * 100.0).dropna().sort_values()
+
+
+INTRADAY = IntradayPoller(INTRADAY_INTERVAL, INTRADAY_POLL_SECONDS, INTRADAY_BUFFER_BARS)
+
+# ---------------------- EXPORTACIÓN ------------------
+def close_usd_range(
+    start: str, end: str, tickers: Optional[tuple[str, ...]] = None
+) -> tuple[pd.DataFrame, list[str]]:
+    """``get_close_usd`` con los tickers como argumento posicional (clave de ``fetch_with_stale``)."""
+    return get_close_usd(start, end, tickers=list(tickers) if tickers else None)
+
+def export_frame(close_usd: pd.DataFrame, failed: list[str],
+                 kind: str = "series") -> tuple[pd.DataFrame, str]:
+    """Tabla a exportar desde la matriz en USD, sin copiar sus datos.
+
+    La matriz es la de ``PRICE_CACHE``: la tabla se arma al pedirla y no se
+    guarda, así un export largo no queda dos veces en memoria.
+    """
+    close_usd = close_usd.dropna(axis=1, how="all").dropna(how="all")
+    if kind == "vars":
+        var = (close_usd.iloc[-1] / close_usd.iloc[0] - 1.0) * 100.0
+        frame = var.astype(np.float64).dropna().sort_values(ascending=False).to_frame("var_pct")
+        frame.index.name = "ticker"
+    else:
+        frame = close_usd.set_axis(from_day_index(close_usd.index).rename("date"), axis=0)
+    return frame, omitted_message(failed)
+
+def get_export_frame(
+    start: str, end: str, kind: str = "series", tickers: Optional[tuple[str, ...]] = None
+) -> tuple[pd.DataFrame, str]:
+    """Tabla a exportar: cierres en USD (fechas × tickers) o retornos del rango."""
+    return export_frame(*close_usd_range(start, end, tickers), kind)
+
+def _iter_row_chunks(frame: pd.DataFrame, chunk_rows: int):
+    for pos in range(0, len(frame), max(1, chunk_rows)):
+        yield frame.iloc[pos:pos + chunk_rows]
+
+def write_export(
+    frame: pd.DataFrame, fmt: str = "csv", *, chunk_rows: Optional[int] = None
+) -> tempfile.SpooledTemporaryFile:
+    """Serializa ``frame`` por bloques de filas a un buffer (gzip CSV o Parquet).
+
+    El texto CSV se arma de a ``chunk_rows`` filas y se comprime al vuelo, así
+    que nunca está completo en memoria; el buffer pasa a disco al superar
+    ``EXPORT_SPOOL_BYTES``. Parquet requiere ``pyarrow`` (un row group por bloque).
+    """
+    chunk_rows = chunk_rows or EXPORT_CHUNK_ROWS
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+    try:
+        if fmt == "parquet":
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError as ex:
+                raise RuntimeError("La exportación a Parquet requiere pyarrow; probá con csv.") from ex
+            writer = None
+            for chunk in _iter_row_chunks(frame, chunk_rows):
+                table = pa.Table.from_pandas(chunk, preserve_index=True)
+                if writer is None:
+                    writer = pq.ParquetWriter(spool, table.schema, compression="zstd")
+                writer.write_table(table)
+            if writer is not None:
+                writer.close()
+        else:
+            with gzip.GzipFile(fileobj=spool, mode="wb", mtime=0) as gz:
+                with io.TextIOWrapper(gz, encoding="utf-8", newline="") as text:
+                    for i, chunk in enumerate(_iter_row_chunks(frame, chunk_rows)):
+                        chunk.to_csv(text, header=i == 0, float_format="%.6g")
+                    if frame.empty:
+                        frame.to_csv(text)
+    except Exception:
+        spool.close()
+        raise
+    log.info(
+        "write_export fmt=%s rows=%d cols=%d bytes=%d rolled=%s",
+        fmt,
+        len(frame),
+        len(frame.columns),
+        spool.tell(),
+        getattr(spool, "_rolled", None),
+    )
+    spool.seek(0)
+    return spool
+
+def export_filename(kind: str, fmt: str, start: str, end: str) -> str:
+    ext = "parquet" if fmt == "parquet" else "csv.gz"
+    return f"ccl_{kind}_{start}_{end}.{ext}"
+
+# ----------------------- GRÁFICOS --------------------
+_RENDER_PROFILE: ContextVar[Optional[str]] = ContextVar("ccl_render_profile", default=None)
+
+
+def render_profile(name: Optional[str] = None) -> dict:
+    """Parámetros del perfil ``name`` (default: el activo o ``RENDER_PROFILE_DEFAULT``)."""
+    name = name or _RENDER_PROFILE.get() or RENDER_PROFILE_DEFAULT
+    return RENDER_PROFILES.get(name) or RENDER_PROFILES["standard"]
+
+
+def profile_for_load(requested: Optional[str], pending: int) -> str:
+    """Perfil a usar con ``pending`` renders en cola: nunca más caro que el tope de carga."""
+    name = requested if requested in RENDER_PROFILES else RENDER_PROFILE_DEFAULT
+    for threshold, cap in RENDER_LOAD_PROFILES:
+        if pending >= threshold and cap in RENDER_PROFILES:
+            if RENDER_PROFILE_ORDER.index(cap) < RENDER_PROFILE_ORDER.index(name):
+                name = cap
+            break
+    return name
+
+
+def _scaled(figsize: tuple[float, float], profile: dict) -> tuple[float, float]:
+    return (figsize[0] * profile["scale"], figsize[1] * profile["scale"])
+
+
+def save_figure(fig, profile: Optional[dict] = None) -> io.BytesIO:
+    """Codifica ``fig`` según el perfil de render; devuelve el buffer al inicio.
+
+    Con ``colors`` el PNG se cuantiza a paleta (mucho más chico para gráficos
+    de pocos colores); ``format`` jpeg/webp usa ``quality``.
+    """
+    profile = profile or render_profile()
+    kwargs = {"dpi": "figure"}
+    if profile["tight"]:
+        kwargs["bbox_inches"] = "tight"
+    fmt = profile["format"]
+    bio = new_buffer()
+    if fmt == "png" and profile["colors"]:
+        raw = io.BytesIO()
+        fig.savefig(raw, format="png", pil_kwargs={"compress_level": 0}, **kwargs)
+        raw.seek(0)
+        with Image.open(raw) as img:
+            img.convert("RGB").quantize(
+                profile["colors"], method=Image.Quantize.FASTOCTREE
+            ).save(bio, format="PNG", compress_level=profile["compress"])
+    elif fmt == "png":
+        fig.savefig(bio, format="png", pil_kwargs={"compress_level": profile["compress"]}, **kwargs)
+    else:
+        fig.savefig(bio, format=fmt, pil_kwargs={"quality": profile["quality"]}, **kwargs)
+    bio.seek(0)
+    return bio
+
+
+def image_suffix(profile: Optional[dict] = None) -> str:
+    """Extensión de archivo para las imágenes que codifica ``profile``."""
+    fmt = (profile or render_profile())["format"]
+    return "jpg" if fmt == "jpeg" else fmt
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Índices elegidos por Largest-Triangle-Three-Buckets.
+
+    Conserva el primer y el último punto y, en cada bucket intermedio, el punto
+    que forma el triángulo de mayor área con el elegido antes y el promedio del
+    bucket siguiente (preserva picos y forma de la curva).
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            nxt = slice(edges[i + 1], edges[i + 2])
+        else:
+            nxt = slice(n - 1, n)
+        avg_x = x[nxt].mean()
+        avg_y = y[nxt].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+def sparkline(values, width: int = 24) -> str:
+    """Curva en caracteres de bloque; se reduce con LTTB a ``width`` puntos."""
+    y = np.asarray(values, dtype=np.float64)
+    y = y[~np.isnan(y)]
+    if y.size == 0:
+        return ""
+    if y.size > width:
+        y = y[lttb_indices(np.arange(y.size, dtype=np.float64), y, width)]
+    low, high = y.min(), y.max()
+    if high == low:
+        return SPARK_CHARS[len(SPARK_CHARS) // 2] * y.size
+    levels = ((y - low) / (high - low) * (len(SPARK_CHARS) - 1)).round().astype(int)
+    return "".join(SPARK_CHARS[i] for i in levels)
+
+def plot_sparkline(series: pd.Series, title: str) -> io.BytesIO:
+    """Miniatura (PNG chico) de la serie en USD para el modo inline."""
+    values = series.dropna()
+    profile = render_profile()
+    fig, ax = plt.subplots(figsize=_scaled((3.2, 1.2), profile), dpi=profile["dpi"] * 2 // 3)
+    try:
+        x = np.arange(len(values))
+        y = values.to_numpy(dtype=np.float64)
+        color = "tab:blue" if len(y) and y[-1] >= y[0] else "tab:red"
+        ax.plot(x, y, color=color, linewidth=1.2)
+        ax.fill_between(x, y, y.min() if len(y) else 0, color=color, alpha=0.12)
+        ax.set_title(title, fontsize=8, loc="left")
+        ax.axis("off")
+        return save_figure(fig, profile)
+    finally:
+        plt.close(fig)
+
+def downsample_series(x: pd.Index, y: pd.Series, n_out: int) -> tuple[pd.Index, np.ndarray]:
+    """Reduce ``(x, y)`` a ``n_out`` puntos con LTTB (descarta NaN antes)."""
+    values = np.asarray(y, dtype=np.float64)
+    mask = ~np.isnan(values)
+    if mask.sum() <= n_out:
+        return x, values
+    xs = x[mask]
+    ys = values[mask]
+    if isinstance(xs, pd.DatetimeIndex):
+        xnum = xs.asi8.astype(np.float64)
+    else:
+        xnum = np.asarray(xs, dtype=np.float64)
+    idx = lttb_indices(xnum, ys, n_out)
+    return xs[idx], ys[idx]
+
+
+def plot_top_bottom(real_returns: pd.Series, top_n: int, bottom_n: int,
+                    start_label: str, end_label: str, normalize_flag: bool,
+                    cmap_pos: str = "Blues", cmap_neg: str = "Reds") -> io.BytesIO:
+    """Colorea con gradiente. Si normalize_flag=True, aclara 'Base 100=ini' en títulos."""
+    profile = render_profile()
+    fig = _draw_top_bottom(real_returns, top_n, bottom_n, start_label, end_label,
+                           normalize_flag, cmap_pos, cmap_neg, profile)
+    try:
+        return save_figure(fig, profile)
+    finally:
+        plt.close(fig)
+
+def _draw_top_bottom(real_returns: pd.Series, top_n: int, bottom_n: int,
+                     start_label: str, end_label: str, normalize_flag: bool,
+                     cmap_pos: str, cmap_neg: str, profile: dict):
+    rr = real_returns.dropna()
+    if rr.empty:
+        raise RuntimeError("No hay datos para el rango seleccionado.")
+    best = rr.nlargest(top_n)
+    worst = rr.nsmallest(bottom_n)
+
+    best_min = float(best.min())
+    best_max = float(best.max())
+    cmap_best = colormaps.get_cmap(cmap_pos)
+    if best_min == best_max:
+        log.info(
+            "plot_top_bottom uniform best returns value=%s; skipping normalization",
+            best_min,
+        )
+        colors_pos = np.tile(cmap_best(0.5), (len(best), 1))
+    else:
+        norm_pos = Normalize(vmin=best_min, vmax=best_max)
+        colors_pos = cmap_best(norm_pos(best.values))
+
+    abs_worst = np.abs(worst)
+    worst_min = float(abs_worst.min())
+    worst_max = float(abs_worst.max())
+    cmap_worst = colormaps.get_cmap(cmap_neg)
+    if worst_min == worst_max:
+        log.info(
+            "plot_top_bottom uniform worst returns magnitude=%s; skipping normalization",
+            worst_min,
+        )
+        colors_neg = np.tile(cmap_worst(0.5), (len(worst), 1))
+    else:
+        norm_neg = Normalize(vmin=worst_min, vmax=worst_max)
+        colors_neg = cmap_worst(norm_neg(abs_worst.values))
+
+    fig = plt.figure(
+        figsize=_scaled((11.5, 8.5), profile), dpi=profile["dpi"], constrained_layout=True
+    )
+    gs = fig.add_gridspec(2, 1, height_ratios=[1, 1], hspace=0.32)
 
     tag = " (Base 100=ini, USD vía CCL)" if normalize_flag else " (USD vía CCL)"
 
-    ax1 = fig.add_subplot(gs[0, 0])
-    x1 = [prettify_symbol(t) for t in best.index]
-    ax1.bar(x1, best.values, color=colors_pos, edgecolor="none")
-    ax1.set_title("Best Performing Tickers" + tag)
-    ax1.set_ylabel("Return (%)")
-    ax1.set_xticks(range(len(x1)))
-    ax1.set_xticklabels(x1, rotation=45, ha="right")
+    ax1 = fig.add_subplot(gs[0, 0])
+    x1 = [prettify_symbol(t) for t in best.index]
+    ax1.bar(x1, best.values, color=colors_pos, edgecolor="none")
+    ax1.set_title("Best Performing Tickers" + tag)
+    ax1.set_ylabel("Return (%)")
+    ax1.set_xticks(range(len(x1)))
+    ax1.set_xticklabels(x1, rotation=45, ha="right")
+
+    ax2 = fig.add_subplot(gs[1, 0])
+    x2 = [prettify_symbol(t) for t in worst.index]
+    ax2.bar(x2, worst.values, color=colors_neg, edgecolor="none")
+    ax2.set_title("Worst Performing Tickers" + tag)
+    ax2.set_ylabel("Return (%)")
+    ax2.set_xticks(range(len(x2)))
+    ax2.set_xticklabels(x2, rotation=45, ha="right")
+
+    if start_label or end_label:
+        fig.suptitle(f"Período: {start_label} → {end_label}", fontsize=10)
+    return fig
+
+def format_top_bottom_text(real_returns: pd.Series, top_n: int, bottom_n: int,
+                           start_label: str, end_label: str, normalize_flag: bool) -> str:
+    """Ranking Top/Bottom como bloque monoespaciado (HTML ``<pre>``) para Telegram."""
+    rr = real_returns.dropna()
+    if rr.empty:
+        raise RuntimeError("No hay datos para el rango seleccionado.")
+    best = rr.nlargest(top_n)
+    worst = rr.nsmallest(bottom_n)
+    tag = "Base 100=ini, USD vía CCL" if normalize_flag else "USD vía CCL"
+    width = max(len(prettify_symbol(t)) for t in best.index.append(worst.index))
+
+    def rows(values: pd.Series) -> list[str]:
+        return [
+            f"{i:>2}. {prettify_symbol(t):<{width}} {v:>+9.2f}%"
+            for i, (t, v) in enumerate(values.items(), start=1)
+        ]
+
+    lines = [f"Top {top_n} / Bottom {bottom_n} ({tag})"]
+    if start_label or end_label:
+        lines.append(f"Período: {start_label} → {end_label}")
+    lines += ["", "▲ Mejores", *rows(best), "", "▼ Peores", *rows(worst)]
+    return "<pre>" + html.escape("\n".join(lines)) + "</pre>"
+
+def _capped_dpi(figsize: tuple[float, float], dpi: float) -> float:
+    """Baja ``dpi`` para que ancho + alto no pase de ``PHOTO_MAX_PIXELS``."""
+    return min(dpi, PHOTO_MAX_PIXELS / (figsize[0] + figsize[1]))
+
+
+def plot_heatmap(table: pd.DataFrame, title: str, *, cmap: str = "RdBu",
+                 center: Optional[float] = 0.0, fmt: str = "{:+.1f}",
+                 colorbar_label: str = "Return (%)", square: bool = False) -> io.BytesIO:
+    """Heatmap filas × columnas con valores anotados (si la grilla es chica).
+
+    ``square`` usa celdas cuadradas (matrices de correlación). Si hay más de
+    ``HEATMAP_MAX_COLS`` columnas se transpone, y el dpi se recorta para que
+    la imagen entre en el límite de Telegram.
+    """
+    if table.empty:
+        raise RuntimeError("No hay datos para el rango seleccionado.")
+    if not square and table.shape[1] > HEATMAP_MAX_COLS and table.shape[1] > table.shape[0]:
+        table = table.T
+    values = table.to_numpy(dtype=np.float64)
+    finite = values[np.isfinite(values)]
+    if finite.size == 0:
+        raise RuntimeError("No hay datos para el rango seleccionado.")
+    if center is not None:
+        span = float(np.max(np.abs(finite - center))) or 1.0
+        vmin, vmax = center - span, center + span
+    else:
+        vmin, vmax = float(finite.min()), float(finite.max())
+    n_rows, n_cols = values.shape
+    annotate = n_rows * n_cols <= 400
+    if square:
+        side = max(6.0, (0.45 if annotate else 0.22) * max(n_rows, n_cols) + 3.0)
+        figsize = (side + 1.5, side)
+    else:
+        figsize = (
+            max(6.0, (0.9 if annotate else 0.3) * n_cols + 3.0),
+            max(3.0, 0.28 * n_rows + 1.5),
+        )
+    profile = render_profile()
+    figsize = _scaled(figsize, profile)
+    fig = plt.figure(
+        figsize=figsize,
+        dpi=_capped_dpi(figsize, profile["dpi"]),
+        constrained_layout=True,
+    )
+    try:
+        ax = fig.add_subplot(1, 1, 1)
+        im = ax.imshow(
+            np.ma.masked_invalid(values), cmap=cmap, vmin=vmin, vmax=vmax,
+            aspect="equal" if square else "auto",
+        )
+        rotate = n_cols > 8
+        ax.set_xticks(range(n_cols))
+        ax.set_xticklabels(
+            [prettify_symbol(str(c)) for c in table.columns],
+            rotation=45 if rotate else 0,
+            ha="right" if rotate else "center",
+        )
+        ax.set_yticks(range(n_rows))
+        ax.set_yticklabels([prettify_symbol(str(r)) for r in table.index])
+        if annotate:
+            for i in range(n_rows):
+                for j in range(n_cols):
+                    if np.isfinite(values[i, j]):
+                        ax.text(
+                            j, i, fmt.format(values[i, j]),
+                            ha="center", va="center", fontsize=7,
+                        )
+        ax.set_title(title)
+        fig.colorbar(im, ax=ax, label=colorbar_label, shrink=0.8 if square else 1.0)
+        return save_figure(fig, profile)
+    finally:
+        plt.close(fig)
+
+def plot_horizons(table: pd.DataFrame, end_label: str, top_n: Optional[int] = None) -> io.BytesIO:
+    """Heatmap tickers × horizontes ordenado por el horizonte más largo."""
+    longest = min(table.columns, key=lambda h: horizon_start(end_label, h))
+    ordered = table.sort_values(longest, ascending=False)
+    if top_n is not None and 2 * top_n < len(ordered):
+        ordered = pd.concat([ordered.head(top_n), ordered.tail(top_n)])
+    return plot_heatmap(ordered, f"Retornos USD vía CCL por horizonte (hasta {end_label})")
+
+def plot_ranked_metric(values: pd.Series, title: str, xlabel: str, top_n: int,
+                       ascending: bool = False) -> io.BytesIO:
+    """Barras horizontales de los ``top_n`` primeros según ``values``."""
+    ranked = values.dropna().sort_values(ascending=ascending).head(top_n)
+    if ranked.empty:
+        raise RuntimeError("No hay datos para el rango seleccionado.")
+    pos = colormaps.get_cmap("Blues")(0.7)
+    neg = colormaps.get_cmap("Reds")(0.7)
+    colors = [pos if v >= 0 else neg for v in ranked.values]
+    profile = render_profile()
+    fig = plt.figure(
+        figsize=_scaled((9, max(3.0, 0.3 * len(ranked) + 1.5)), profile),
+        dpi=profile["dpi"],
+        constrained_layout=True,
+    )
+    try:
+        ax = fig.add_subplot(1, 1, 1)
+        labels = [prettify_symbol(t) for t in ranked.index]
+        ax.barh(labels[::-1], ranked.values[::-1], color=colors[::-1], edgecolor="none")
+        ax.set_xlabel(xlabel)
+        ax.set_title(title)
+        ax.grid(True, axis="x", alpha=0.25)
+        return save_figure(fig, profile)
+    finally:
+        plt.close(fig)
+
+def plot_sector_indices(indices: pd.DataFrame, start_label: str, end_label: str) -> io.BytesIO:
+    """Curvas base 100 por sector: EW en línea llena y CW punteada, mismo color."""
+    if indices.empty:
+        raise RuntimeError("No hay datos para el rango seleccionado.")
+    x = from_day_index(indices.index)
+    profile = render_profile()
+    fig, ax = plt.subplots(figsize=_scaled((10, 5), profile), dpi=profile["dpi"])
+    try:
+        colors = {}
+        for col in indices.columns:
+            sector, kind = col.rsplit(" ", 1)
+            color = colors.setdefault(sector, f"C{len(colors) % 10}")
+            ax.plot(
+                x,
+                indices[col],
+                color=color,
+                linestyle="-" if kind == "EW" else "--",
+                label=col,
+            )
+        ax.axhline(100.0, color="grey", linewidth=0.8, alpha=0.5)
+        ax.set_ylabel("Índice (100=ini)")
+        ax.set_xlabel("Fecha")
+        ax.set_title(f"Índices sectoriales USD vía CCL · {start_label} → {end_label}")
+        ax.grid(True, alpha=0.25)
+        ax.legend()
+        return save_figure(fig, profile)
+    finally:
+        plt.close(fig)
+
+def _point_budget(width_inches: float, dpi: int) -> int:
+    return max(3, int(width_inches * dpi * PLOT_POINTS_PER_PIXEL))
+
+
+def _draw_overlay(plot_df: pd.DataFrame, ylabel: str, title_tag: str, downsample: bool,
+                  figsize=(10, 5), dpi: int = 150):
+    """Todas las series superpuestas en un único eje."""
+    fig, ax = plt.subplots(figsize=figsize, dpi=dpi)
+    x = from_day_index(plot_df.index)
+    budget = _point_budget(figsize[0], dpi)
+    if downsample and len(x) > budget:
+        log.info(
+            "plot_tickers_usd downsampling rows=%d budget=%d", len(x), budget
+        )
+    for col in plot_df.columns:
+        if downsample and len(x) > budget:
+            xs, ys = downsample_series(x, plot_df[col], budget)
+            ax.plot(xs, ys, label=prettify_symbol(col))
+        else:
+            ax.plot(x, plot_df[col], label=prettify_symbol(col))
+
+    ax.set_ylabel(ylabel)
+    ax.set_xlabel("Fecha")
+    ax.set_title(
+        f"{', '.join(prettify_symbol(t) for t in plot_df.columns)}{title_tag} vía CCL"
+    )
+    ax.grid(True, alpha=0.25)
+    ax.legend()
+    return fig
+
+
+def _draw_small_multiples(plot_df: pd.DataFrame, ylabel: str, title_tag: str,
+                          downsample: bool, *, sharey: bool = False,
+                          width: float = 12.0, dpi: int = 150):
+    """Grilla de paneles (uno por ticker) en una sola figura.
+
+    Cada panel dibuja un único ``LineCollection`` con su propia serie, así
+    con ``sharey=False`` cada eje se escala a su ticker y el costo crece
+    lineal con ``n``. Las series se reducen al ancho en píxeles de un panel.
+    """
+    n = len(plot_df.columns)
+    ncols = min(SMALL_MULTIPLES_MAX_COLS, int(np.ceil(np.sqrt(n))))
+    nrows = int(np.ceil(n / ncols))
+    fig, axes = plt.subplots(
+        nrows,
+        ncols,
+        figsize=(width, 1.9 * nrows + 0.8),
+        dpi=dpi,
+        sharex=True,
+        sharey=sharey,
+        squeeze=False,
+    )
+    x = from_day_index(plot_df.index)
+    budget = _point_budget(width / ncols, dpi)
+    lines = []
+    for col in plot_df.columns:
+        if downsample and len(x) > budget:
+            xs, ys = downsample_series(x, plot_df[col], budget)
+        else:
+            xs, ys = x, plot_df[col].to_numpy(dtype=np.float64)
+        lines.append(np.column_stack([mdates.date2num(xs), ys]))
+
+    flat_axes = axes.ravel()
+    for i, col in enumerate(plot_df.columns):
+        ax = flat_axes[i]
+        ax.add_collection(LineCollection([lines[i]], colors=[f"C{i % 10}"], linewidths=1.2))
+        ax.autoscale_view()
+        ax.set_title(prettify_symbol(col), fontsize=8, pad=2)
+        ax.grid(True, alpha=0.25)
+        ax.tick_params(labelsize=6)
+    for ax in flat_axes[n:]:
+        ax.set_visible(False)
+    locator = mdates.AutoDateLocator(maxticks=4)
+    flat_axes[0].xaxis.set_major_locator(locator)
+    flat_axes[0].xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+    fig.supylabel(ylabel, fontsize=9)
+    fig.suptitle(f"{n} tickers{title_tag} vía CCL", fontsize=10)
+    fig.tight_layout()
+    return fig
+
+
+def plot_tickers_usd(
+    tickers: list[str],
+    start: str,
+    end: str,
+    normalize_flag: bool,
+    downsample: Optional[bool] = None,
+) -> io.BytesIO:
+    """Grafica múltiples tickers en USD (vía CCL).
+
+    Cada serie se normaliza a 100 en la fecha inicial si ``normalize_flag`` es True;
+    caso contrario se muestran valores absolutos en USD. Las series más largas que
+    el ancho del PNG se reducen con LTTB salvo ``downsample=False``
+    (``None`` usa ``PLOT_DOWNSAMPLE``). Con más de ``SMALL_MULTIPLES_THRESHOLD``
+    tickers se arma una grilla de paneles en lugar de superponer todo. Los
+    tickers que ``TICKER_INDEX`` da por inválidos o fuera de rango no se piden.
+    """
+    meter = _StageMeter("plot_tickers_usd")
+    plot_df, tickers_ba = tickers_usd_frame(tickers, start, end, normalize_flag, meter=meter)
+    return render_tickers_usd(
+        plot_df, tickers_ba, start, end, normalize_flag, downsample, meter=meter
+    )
+
+
+def tickers_usd_frame(
+    tickers: list[str],
+    start: str,
+    end: str,
+    normalize_flag: bool,
+    *,
+    meter: Optional[_StageMeter] = None,
+) -> tuple[pd.DataFrame, list[str]]:
+    """Descarga y pasa a USD (o base 100) lo que grafica ``plot_tickers_usd``.
+
+    Devuelve ``(plot_df, tickers_ba)``; es la parte con red, fuera de la cola
+    de render.
+    """
+    tickers_ba, skipped = TICKER_INDEX.select(
+        [norm_ticker_ba(t) for t in tickers], start, end
+    )
+    if not tickers_ba:
+        raise RuntimeError(unknown_tickers_message(skipped))
+    meter = meter or _StageMeter("plot_tickers_usd")
+    log.info(
+        "plot_tickers_usd request tickers=%s start=%s end=%s",
+        tickers_ba,
+        start,
+        end,
+    )
+    try:
+        raw = yf_download(
+            tickers_ba, start=start, end=end, auto_adjust=True, progress=False
+        )
+    except Exception as ex:
+        error_id = log_exception_with_id(
+            "plot_tickers_usd download failed",
+            exc=ex,
+            tickers=tickers_ba,
+            start=start,
+            end=end,
+            normalize=normalize_flag,
+        )
+        pretty = ", ".join(prettify_symbol(t) for t in tickers_ba)
+        raise RuntimeError(
+            "No se pudieron descargar datos. "
+            f"Revisá los logs con error_id={error_id} para {pretty}."
+        ) from ex
+    log.info(
+        "plot_tickers_usd yf.download shape=%s", getattr(raw, "shape", None)
+    )
+    meter.record("raw", raw)
+    px = raw["Close"]
+    raw = None
+    if isinstance(px, pd.Series):
+        close = px.to_frame(tickers_ba[0])
+    else:
+        close = px
+    if isinstance(close.index, pd.DatetimeIndex):
+        TICKER_INDEX.record_prices(close, start, end)
+    empty = [t for t in tickers_ba if t not in close.columns or close[t].isna().all()]
+    if COMPACT_PRICES:
+        close = compact_prices(close)
+    elif isinstance(close.index, pd.DatetimeIndex):
+        close.index = ensure_utc_naive_index(close.index)
+    log.info("plot_tickers_usd close shape=%s", getattr(close, "shape", None))
+    meter.record("close", close)
+
+    ccl = download_ccl(start, end)
+    # Con el CCL descargado Yahoo está respondiendo: lo vacío es del ticker
+    TICKER_INDEX.record_missing(empty, start, end)
+    if COMPACT_PRICES:
+        ccl = compact_prices(ccl.ffill()).reindex(close.index)
+    elif isinstance(ccl.index, pd.DatetimeIndex):
+        ccl.index = ensure_utc_naive_index(ccl.index)
+    log.info("plot_tickers_usd ccl shape=%s", getattr(ccl, "shape", None))
+    meter.record("ccl", ccl)
+    usd = (
+        close.div(ccl, axis=0)
+        .dropna(axis=1, how="all")
+        .dropna(how="all")
+    )
+    missing = usd.columns[usd.isna().any()]
+    if not missing.empty:
+        log.warning("plot_tickers_usd missing data for %s", list(missing))
+    log.info("plot_tickers_usd usd shape=%s", usd.shape)
+    meter.record("usd", usd)
+
+    log.info(
+        "plot_tickers_usd: normalize=%s, usd_shape=%s",
+        normalize_flag,
+        usd.shape,
+    )
+
+    if usd.empty:
+        log.info(
+            "plot_tickers_usd empty usd for tickers=%s (ba=%s) start=%s end=%s",
+            tickers,
+            tickers_ba,
+            start,
+            end,
+        )
+        raise RuntimeError("Sin datos para ese rango.")
+
+    if normalize_flag:
+        log.info("plot_tickers_usd applying normalization")
+        base = usd.iloc[0]
+        log.debug("plot_tickers_usd base initial=%s", base.to_dict())
+        invalid = base[(base == 0) | base.isna()]
+        if not invalid.empty:
+            bad_cols = [prettify_symbol(c) for c in invalid.index]
+            log.info("plot_tickers_usd filtering invalid base tickers=%s", bad_cols)
+            log.debug(
+                "plot_tickers_usd invalid base values=%s", invalid.to_dict()
+            )
+            log.warning(
+                "plot_tickers_usd invalid base values for %s", bad_cols
+            )
+            base = usd.replace(0, np.nan).apply(
+                lambda col: col.dropna().iloc[0] if not col.dropna().empty else np.nan
+            )
+            still_bad = base[base.isna()]
+            if not still_bad.empty:
+                bad = [prettify_symbol(c) for c in still_bad.index]
+                log.error(
+                    "plot_tickers_usd no valid values after cleanup for %s", bad
+                )
+                raise RuntimeError(
+                    "No se encontraron valores válidos para normalizar: "
+                    + ", ".join(bad)
+                )
+        log.debug("plot_tickers_usd base finalized=%s", base.to_dict())
+        plot_df = usd.divide(base, axis=1) * 100.0
+    else:
+        log.info("plot_tickers_usd normalization not applied")
+        plot_df = usd
+    meter.record("plot_df", plot_df)
+    return plot_df, tickers_ba
+
+
+def render_tickers_usd(
+    plot_df: pd.DataFrame,
+    tickers_ba: list[str],
+    start: str,
+    end: str,
+    normalize_flag: bool,
+    downsample: Optional[bool] = None,
+    *,
+    meter: Optional[_StageMeter] = None,
+    profile_name: Optional[str] = None,
+) -> io.BytesIO:
+    """Dibuja y codifica ``plot_df`` (de ``tickers_usd_frame``); sin red.
+
+    ``profile_name`` fija el perfil de render (default: el activo).
+    """
+    if downsample is None:
+        downsample = PLOT_DOWNSAMPLE
+    meter = meter or _StageMeter("plot_tickers_usd")
+    if normalize_flag:
+        ylabel, title_tag = "Índice (100=ini)", " – Normalizado (100=ini)"
+    else:
+        ylabel, title_tag = "USD", " – USD"
+    fig = None
+    profile = render_profile(profile_name)
+    try:
+        if len(plot_df.columns) > SMALL_MULTIPLES_THRESHOLD:
+            fig = _draw_small_multiples(
+                plot_df, ylabel, title_tag, downsample, sharey=normalize_flag,
+                width=12.0 * profile["scale"], dpi=profile["dpi"],
+            )
+        else:
+            fig = _draw_overlay(
+                plot_df, ylabel, title_tag, downsample,
+                figsize=_scaled((10, 5), profile), dpi=profile["dpi"],
+            )
+        bio = save_figure(fig, profile)
+        log.info(
+            "plot_tickers_usd plot_df columns=%s index_range=%s→%s rows=%d",
+            list(plot_df.columns),
+            plot_df.index.min() if not plot_df.index.empty else None,
+            plot_df.index.max() if not plot_df.index.empty else None,
+            len(plot_df.index),
+        )
+        log.info("plot_tickers_usd figure generated")
+    except Exception as ex:
+        error_id = log_exception_with_id(
+            "plot_tickers_usd plotting failed",
+            exc=ex,
+            tickers=tickers_ba,
+            start=start,
+            end=end,
+            normalize=normalize_flag,
+            columns=list(plot_df.columns),
+        )
+        pretty = ", ".join(prettify_symbol(t) for t in tickers_ba)
+        raise RuntimeError(
+            "No se pudo generar el gráfico. "
+            f"Revisá los logs con error_id={error_id} para {pretty}."
+        ) from ex
+    finally:
+        if fig is not None:
+            plt.close(fig)
+            log.info("plot_tickers_usd figure closed")
+    meter.record("image", bio)
+    meter.finish()
+    bio.seek(0)
+    return bio
+
+# ------------------ WATCHDOG DE MEMORIA --------------
+_MB = 1024 * 1024
+
+
+class MemoryWatchdog:
+    """Muestrea RSS, figuras abiertas, buffers vivos y caches cada ``interval`` s.
+
+    Avisa (log + chats admin) cuando el RSS crece ``growth_mb`` sobre la línea
+    base, hay figuras de matplotlib sin cerrar o demasiados ``BytesIO`` vivos.
+    Al pasar ``limit_mb`` dispara una sola vez ``on_limit`` (soft restart).
+    """
+
+    def __init__(self, interval: float, growth_mb: float, limit_mb: float = 0.0,
+                 on_limit: Optional[Callable[[], None]] = None):
+        self.interval = interval
+        self.growth_mb = growth_mb
+        self.limit_mb = limit_mb
+        self.on_limit = on_limit
+        self.samples: deque = deque(maxlen=288)
+        self.baseline_rss: Optional[int] = None
+        self.restart_fired = False
+        self._last_alert_rss: Optional[int] = None
+        self._notify: Optional[Callable] = None
+        self._task: Optional[asyncio.Task] = None
+        self._trace_baseline: Optional[tracemalloc.Snapshot] = None
+
+    def sample(self) -> dict:
+        return {
+            "time": time.time(),
+            "rss": rss_bytes(),
+            "figures": len(plt.get_fignums()),
+            "buffers": len(_LIVE_BUFFERS),
+            "caches": {
+                "last_good": len(LAST_GOOD),
+                "prices": len(PRICE_CACHE),
+                "ccl": len(CCL_CACHE),
+                "corr": len(_CORR_CACHE),
+            },
+        }
+
+    def check(self) -> list[str]:
+        """Toma una muestra y devuelve las alertas (ya logueadas) que generó."""
+        snap = self.sample()
+        self.samples.append(snap)
+        rss = snap["rss"]
+        if self.baseline_rss is None:
+            self.baseline_rss = rss
+        alerts = []
+        reference = self._last_alert_rss or self.baseline_rss
+        if rss - reference > self.growth_mb * _MB:
+            self._last_alert_rss = rss
+            alerts.append(
+                f"RSS {rss / _MB:.0f} MB (+{(rss - self.baseline_rss) / _MB:.0f} MB desde el inicio)"
+            )
+        if snap["figures"] > RENDER_CONCURRENCY:
+            alerts.append(f"{snap['figures']} figuras de matplotlib abiertas")
+        if snap["buffers"] > WATCHDOG_BUFFER_ALERT:
+            alerts.append(f"{snap['buffers']} buffers BytesIO vivos")
+        for alert in alerts:
+            log.warning("MemoryWatchdog %s", alert)
+        if self.limit_mb and rss > self.limit_mb * _MB and not self.restart_fired:
+            self.restart_fired = True
+            log.error("MemoryWatchdog limit reached rss=%.0fMB; soft restart", rss / _MB)
+            alerts.append(f"RSS sobre el límite de {self.limit_mb:.0f} MB: soft restart")
+            if self.on_limit is not None:
+                self.on_limit()
+        return alerts
+
+    def report(self) -> str:
+        snap = self.samples[-1] if self.samples else self.sample()
+        lines = [
+            f"RSS: {snap['rss'] / _MB:.1f} MB"
+            + (f" (inicio {self.baseline_rss / _MB:.1f} MB)" if self.baseline_rss else ""),
+            f"Figuras abiertas: {snap['figures']} · buffers vivos: {snap['buffers']}",
+            "Caches: " + ", ".join(f"{k}={v}" for k, v in snap["caches"].items()),
+            f"tracemalloc: {'activo' if tracemalloc.is_tracing() else 'inactivo'}",
+        ]
+        return "\n".join(lines)
+
+    def trace_top(self, limit: int = 15) -> str:
+        """Arranca tracemalloc o, si ya corre, lista los mayores crecimientos desde entonces."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+            self._trace_baseline = tracemalloc.take_snapshot()
+            return "tracemalloc activado; repetí el comando para ver los mayores asignadores."
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            (tracemalloc.Filter(False, tracemalloc.__file__),)
+        )
+        if self._trace_baseline is not None:
+            stats = snapshot.compare_to(self._trace_baseline, "lineno")[:limit]
+        else:
+            stats = snapshot.statistics("lineno")[:limit]
+        return "\n".join(str(stat) for stat in stats) or "Sin asignaciones registradas."
+
+    def trace_stop(self) -> None:
+        tracemalloc.stop()
+        self._trace_baseline = None
+
+    def start(self, notify: Optional[Callable] = None) -> None:
+        self._notify = notify
+        if self.interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                alerts = self.check()
+                if alerts and self._notify is not None:
+                    await self._notify("Watchdog de memoria:\n" + "\n".join(alerts))
+            except Exception as ex:
+                log_exception_with_id("memory watchdog check failed", exc=ex)
+            await asyncio.sleep(self.interval)
+
+
+def soft_restart() -> None:
+    """Suelta caches y figuras y fuerza un ``gc``; el corte del proceso lo decide ``main``."""
+    for cache in (LAST_GOOD, PRICE_CACHE, CCL_CACHE, _CORR_CACHE):
+        cache.clear()
+    plt.close("all")
+    collected = gc.collect()
+    log.warning("soft_restart done collected=%d rss=%.0fMB", collected, rss_bytes() / _MB)
+
+
+WATCHDOG = MemoryWatchdog(WATCHDOG_INTERVAL, WATCHDOG_GROWTH_MB, WATCHDOG_LIMIT_MB, soft_restart)
+
+# ----------------------- HANDLERS --------------------
+class RenderQueue:
+    """Limita los renders concurrentes y expone cuántos hay pendientes.
+
+    Cada render corre con el perfil pedido por el chat, recortado por
+    ``RENDER_LOAD_PROFILES`` según la cola al momento de encolarlo.
+    """
+
+    def __init__(self, concurrency: int, limit: int):
+        self.concurrency = max(1, concurrency)
+        self.limit = limit
+        self.pending = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def saturated(self) -> bool:
+        return self.pending >= self.limit
+
+    async def run(self, func, *args):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        name = profile_for_load(_RENDER_PROFILE.get(), self.pending)
+        self.pending += 1
+        token = _RENDER_PROFILE.set(name)
+        try:
+            async with self._semaphore:
+                return await asyncio.to_thread(profile_call, func, *args)
+        finally:
+            _RENDER_PROFILE.reset(token)
+            self.pending -= 1
+
+
+RENDER_QUEUE = RenderQueue(RENDER_CONCURRENCY, RENDER_QUEUE_LIMIT)
+
+
+async def _edit_text(placeholder, text: str, **kwargs) -> bool:
+    """Edita un mensaje ya enviado; devuelve False si no se pudo."""
+    edit = getattr(placeholder, "edit_text", None)
+    if edit is None:
+        return False
+    try:
+        await SEND_QUEUE.submit(getattr(placeholder, "chat_id", None), edit, text, **kwargs)
+        return True
+    except Exception as ex:
+        log.debug("edit_text failed: %s", ex)
+        return False
+
+
+class ProgressReporter:
+    """Refleja ``progress(hechos, total)`` en el mensaje placeholder.
+
+    El callback puede llamarse desde un hilo: sólo guarda el último valor, y
+    una tarea del event loop edita el mensaje como mucho cada ``interval`` s.
+    """
+
+    def __init__(self, placeholder, template: str, interval: float = PROGRESS_EDIT_INTERVAL):
+        self.placeholder = placeholder
+        self.template = template
+        self.interval = interval
+        self.latest: Optional[tuple[int, int]] = None
+        self._shown: Optional[tuple[int, int]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __call__(self, done: int, total: int) -> None:
+        self.latest = (done, total)
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def flush(self) -> None:
+        latest = self.latest
+        if latest is None or latest == self._shown:
+            return
+        self._shown = latest
+        await _edit_text(self.placeholder, self.template.format(done=latest[0], total=latest[1]))
+
+    def __enter__(self):
+        if self.placeholder is not None:
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+        return self
+
+    def __exit__(self, *exc):
+        if self._task is not None:
+            self._task.cancel()
+        return False
+
+async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat = None
+    message = None
+    try:
+        chat = update.effective_chat
+        message = update.effective_message
+        if chat is None:
+            log.warning("cmd_start invoked without effective_chat")
+            return
+        if message is None:
+            log.warning(
+                "cmd_start invoked without effective_message chat_id=%s",
+                getattr(chat, "id", None),
+            )
+
+        chat_id = chat.id
+        s, e = get_dates(chat_id)
+        norm = get_normalize(chat_id)
+        msg = (
+            "Comandos: /ini YYYY-MM-DD | /fin YYYY-MM-DD | /cclvars N M [txt] | /cclplot "
+            "TICKER1 [TICKER2 ...] | /cclhorizontes [N] | /cclriesgo [métrica] [N] | "
+            "/cclcorr [TICKERS] | /cclperiodos [M|S] [TICKERS] | /cclsectores | "
+            "/cclexport [csv|parquet] [series|vars] [TICKERS] | "
+            "/cclsuscribir HH:MM [ventana] [N] [M] | /cclvivo | /cclmovers [N] | "
+            "/calidad [fast|standard|hq] | /normalize\n"
+        )
+        msg += f"Rango actual: inicio={s or '⟂'} | fin={e or '⟂'} | normalize={norm}"
+        await _reply_text(chat, message, context, msg)
+    except Exception as ex:  # pragma: no cover - unexpected
+        log_exception_with_id(
+            "cmd_start unexpected error",
+            exc=ex,
+            chat_id=getattr(chat, "id", None),
+        )
+
+async def cmd_ini(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat = None
+    message = None
+    try:
+        chat = update.effective_chat
+        message = update.effective_message
+        if chat is None:
+            log.warning("cmd_ini invoked without effective_chat")
+            return
+        if message is None:
+            log.warning(
+                "cmd_ini invoked without effective_message chat_id=%s",
+                getattr(chat, "id", None),
+            )
+
+        chat_id = chat.id
+        if not context.args:
+            await _reply_text(chat, message, context, "Formato: /ini YYYY-MM-DD")
+            return
+
+        try:
+            d = parse_date(context.args[0])
+            set_date(chat_id, "start", d)
+            log.info("cmd_ini saved chat_id=%s start=%s", chat_id, d)
+            await _reply_text(chat, message, context, f"Fecha inicial guardada: {d}")
+        except ValueError:
+            await _reply_text(
+                chat,
+                message,
+                context,
+                "Fecha inválida. Formato: YYYY-MM-DD",
+            )
+        except Exception as ex:
+            error_id = log_exception_with_id(
+                "cmd_ini unexpected error",
+                exc=ex,
+                chat_id=chat_id,
+                command="/ini",
+                args=context.args,
+            )
+            await _reply_text(
+                chat,
+                message,
+                context,
+                f"Ocurrió un error al guardar la fecha inicial: {ex} (error_id={error_id})",
+            )
+    except Exception as ex:  # pragma: no cover - unexpected
+        log_exception_with_id(
+            "cmd_ini outer error",
+            exc=ex,
+            chat_id=getattr(chat, "id", None),
+            command="/ini",
+            args=getattr(context, "args", None),
+        )
+
+async def cmd_fin(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat = None
+    message = None
+    try:
+        chat = update.effective_chat
+        message = update.effective_message
+        if chat is None:
+            log.warning("cmd_fin invoked without effective_chat")
+            return
+        if message is None:
+            log.warning(
+                "cmd_fin invoked without effective_message chat_id=%s",
+                getattr(chat, "id", None),
+            )
 
-    ax2 = fig.add_subplot(gs[1, 0])
-    x2 = [prettify_symbol(t) for t in worst.index]
-    ax2.bar(x2, worst.values, color=colors_neg, edgecolor="none")
-    ax2.set_title("Worst Performing Tickers" + tag)
-    ax2.set_ylabel("Return (%)")
-    ax2.set_xticks(range(len(x2)))
-    ax2.set_xticklabels(x2, rotation=45, ha="right")
+        chat_id = chat.id
+        if not context.args:
+            await _reply_text(chat, message, context, "Formato: /fin YYYY-MM-DD")
+            return
 
-    if start_label or end_label:
-        fig.suptitle(f"Período: {start_label} → {end_label}", fontsize=10)
-    bio = io.BytesIO()
-    fig.savefig(bio, format="png", bbox_inches="tight")
-    plt.close(fig)
-    bio.seek(0)
-    return bio
+        try:
+            d = parse_date(context.args[0])
+            set_date(chat_id, "end", d)
+            log.info("cmd_fin saved chat_id=%s end=%s", chat_id, d)
+            await _reply_text(chat, message, context, f"Fecha final guardada: {d}")
+        except ValueError:
+            await _reply_text(
+                chat,
+                message,
+                context,
+                "Fecha inválida. Formato: YYYY-MM-DD",
+            )
+        except Exception as ex:
+            error_id = log_exception_with_id(
+                "cmd_fin unexpected error",
+                exc=ex,
+                chat_id=chat_id,
+                command="/fin",
+                args=context.args,
+            )
+            await _reply_text(
+                chat,
+                message,
+                context,
+                f"Ocurrió un error al guardar la fecha final: {ex} (error_id={error_id})",
+            )
+    except Exception as ex:  # pragma: no cover - unexpected
+        log_exception_with_id(
+            "cmd_fin outer error",
+            exc=ex,
+            chat_id=getattr(chat, "id", None),
+            command="/fin",
+            args=getattr(context, "args", None),
+        )
+
+async def cmd_normalize(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat = None
+    message = None
+    try:
+        chat = update.effective_chat
+        message = update.effective_message
+        if chat is None:
+            log.warning("cmd_normalize invoked without effective_chat")
+            return
+        if message is None:
+            log.warning(
+                "cmd_normalize invoked without effective_message chat_id=%s",
+                getattr(chat, "id", None),
+            )
+
+        chat_id = chat.id
+        try:
+            new_val = toggle_normalize(chat_id)
+        except Exception as ex:
+            error_id = log_exception_with_id(
+                "cmd_normalize toggle error",
+                exc=ex,
+                chat_id=chat_id,
+            )
+            await _reply_text(
+                chat,
+                message,
+                context,
+                f"Error al actualizar la configuración de normalización: {ex} (error_id={error_id})",
+            )
+            return
+        log.info("cmd_normalize chat_id=%s new_val=%s", chat_id, new_val)
+        if new_val:
+            txt = (
+                "Normalización: ON\n"
+                "Desde ahora TODOS los gráficos se devuelven normalizados con base **100** en la fecha inicial.\n"
+                "- /cclplot: línea índice (100=ini).\n"
+                "- /cclvars: rendimientos relativos; el gráfico aclara Base 100=ini."
+            )
+        else:
+            txt = (
+                "Normalización: OFF\n"
+                "Desde ahora los gráficos NO se normalizan.\n"
+                "- /cclplot: precio en USD (vía CCL) absoluto.\n"
+                "- /cclvars: rendimientos relativos en % (sin base 100 en el título)."
+            )
+        log.debug("cmd_normalize response chat_id=%s text=%r", chat_id, txt)
+        await _reply_text(chat, message, context, txt, disable_web_page_preview=True)
+    except Exception as ex:  # pragma: no cover - unexpected
+        log_exception_with_id(
+            "cmd_normalize unexpected error",
+            exc=ex,
+            chat_id=getattr(chat, "id", None),
+        )
+
+async def cmd_cclvars(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat = None
+    message = None
+    chat_id = None
+    top_n = None
+    bot_n = None
+    s = None
+    e = None
+    normalize_flag = None
+    error_context = {}
+    try:
+        chat = update.effective_chat
+        message = update.effective_message
+        if chat is None:
+            log.warning("cmd_cclvars invoked without effective_chat")
+            return
+        if message is None:
+            log.warning(
+                "cmd_cclvars invoked without effective_message chat_id=%s",
+                getattr(chat, "id", None),
+            )
+
+        args = getattr(context, "args", None) or []
+        text_only = len(args) == 3 and args[2].lower() in TEXT_ONLY_FLAGS
+        if len(args) != 2 and not text_only:
+            await _reply_text(
+                chat,
+                message,
+                context,
+                "Uso: /cclvars <top_n> <bottom_n> [txt] (ej: /cclvars 15 20)",
+            )
+            return
+
+        try:
+            top_n = int(args[0])
+            bot_n = int(args[1])
+        except ValueError:
+            await _reply_text(
+                chat,
+                message,
+                context,
+                "Los dos parámetros deben ser enteros.",
+            )
+            return
+
+        if top_n is not None:
+            error_context["top_n"] = top_n
+        if bot_n is not None:
+            error_context["bottom_n"] = bot_n
+
+        chat_id = chat.id
+        if chat_id is not None:
+            error_context["chat_id"] = chat_id
+
+        try:
+            s, e = get_dates(chat_id)
+            if s is not None:
+                error_context["start"] = s
+            if e is not None:
+                error_context["end"] = e
+            if not s or not e:
+                await _reply_text(
+                    chat,
+                    message,
+                    context,
+                    "Definí primero el rango con /ini y /fin.",
+                )
+                return
+
+            normalize_flag = get_normalize(chat_id)
+            if normalize_flag is not None:
+                error_context["normalize"] = normalize_flag
+
+            header = f"Calculando Top {top_n} / Bottom {bot_n} para {s} → {e} …"
+            placeholder = await _reply_text(chat, message, context, header)
+            compute = get_var_async if YAHOO_ASYNC_CLIENT else get_var
+            with ProgressReporter(placeholder, header + " {done}/{total} tickers") as reporter:
+                (series, msg), age = await fetch_with_stale(
+                    "get_var", compute, s, e, progress=reporter
+                )
+            msg = "\n".join(m for m in (msg, deadline_message(current_deadline())) if m)
+            if series.dropna().empty:
+                await _reply_text(chat, message, context, "Sin datos para ese rango.")
+                if msg:
+                    await _reply_text(chat, message, context, msg)
+                return
+            degraded = not text_only and RENDER_QUEUE.saturated
+            if degraded:
+                log.info(
+                    "cmd_cclvars render queue saturated pending=%s; text fallback",
+                    RENDER_QUEUE.pending,
+                )
+            # Fase 1: ranking en texto apenas hay retornos (reemplaza al placeholder)
+            txt = format_top_bottom_text(series, top_n, bot_n, s, e, normalize_flag)
+            if degraded:
+                txt += "\nModo texto: hay mucha demanda de gráficos."
+            if age is not None:
+                txt += f"\n{html.escape(stale_note(age))}"
+            if not await _edit_text(placeholder, txt, parse_mode="HTML"):
+                await _reply_text(chat, message, context, txt, parse_mode="HTML")
+            if msg:
+                await _reply_text(chat, message, context, msg)
+            if text_only or degraded:
+                return
+            # Fase 2: el gráfico llega después
+            try:
+                img = await within_deadline(RENDER_QUEUE.run(
+                    plot_top_bottom, series, top_n, bot_n, s, e, normalize_flag
+                ))
+            except TimeoutError:
+                log.warning("cmd_cclvars render skipped: deadline reached chat_id=%s", chat_id)
+                await _reply_text(chat, message, context, "Gráfico omitido: se agotó el tiempo del comando.")
+                return
+            await _reply_photo(
+                chat,
+                message,
+                context,
+                img,
+                caption=f"Top/Bottom {s} → {e}"
+                + (f"\n{stale_note(age)}" if age is not None else ""),
+            )
+            if msg:
+                await _reply_text(chat, message, context, msg)
+        except RuntimeError as ex:
+            msg = str(ex)
+            if "error_id=" not in msg:
+                error_id = log_exception_with_id(
+                    "cmd_cclvars runtime error",
+                    exc=ex,
+                    **error_context,
+                )
+                msg = f"{msg} (error_id={error_id})"
+            await _reply_text(chat, message, context, msg)
+        except Exception as ex:
+            error_id = log_exception_with_id(
+                "cmd_cclvars unexpected error",
+                exc=ex,
+                **error_context,
+            )
+            await _reply_text(
+                chat,
+                message,
+                context,
+                f"Error al generar gráfico: {ex} (error_id={error_id})",
+            )
+    except Exception as ex:  # pragma: no cover - unexpected
+        log_exception_with_id(
+            "cmd_cclvars outer error",
+            exc=ex,
+            chat_id=getattr(chat, "id", None),
+            args=getattr(context, "args", None),
+        )
 
-def plot_tickers_usd(tickers: list[str], start: str, end: str, normalize_flag: bool) -> io.BytesIO:
-    """Grafica múltiples tickers en USD (vía CCL).
+async def _render_tickers_usd(tickers, start, end, normalize_flag, profile_name=None):
+    """Descarga en un hilo común; sólo el dibujo ocupa un lugar de ``RENDER_QUEUE``.
 
-    Cada serie se normaliza a 100 en la fecha inicial si ``normalize_flag`` es True;
-    caso contrario se muestran valores absolutos en USD.
+    ``profile_name`` va en los argumentos para que la clave de ``LAST_GOOD``
+    distinga los bytes de cada perfil (dpi y formato).
     """
-    tickers_ba = [norm_ticker_ba(t) for t in tickers]
-    log.info(
-        "plot_tickers_usd request tickers=%s start=%s end=%s",
-        tickers_ba,
-        start,
-        end,
+    meter = _StageMeter("plot_tickers_usd")
+    plot_df, tickers_ba = await run_blocking(
+        tickers_usd_frame, tickers, start, end, normalize_flag, meter=meter
     )
-    try:
-        raw = yf.download(
-            tickers_ba, start=start, end=end, auto_adjust=True, progress=False
-        )
-    except Exception as ex:
-        error_id = log_exception_with_id(
-            "plot_tickers_usd download failed",
-            exc=ex,
-            tickers=tickers_ba,
-            start=start,
-            end=end,
-            normalize=normalize_flag,
+    return await RENDER_QUEUE.run(
+        functools.partial(
+            render_tickers_usd, plot_df, tickers_ba, start, end, normalize_flag,
+            meter=meter, profile_name=profile_name,
         )
-        pretty = ", ".join(prettify_symbol(t) for t in tickers_ba)
-        raise RuntimeError(
-            "No se pudieron descargar datos. "
-            f"Revisá los logs con error_id={error_id} para {pretty}."
-        ) from ex
-    log.info(
-        "plot_tickers_usd yf.download shape=%s", getattr(raw, "shape", None)
     )
-    px = raw["Close"]
-    if isinstance(px, pd.Series):
-        close = px.to_frame(tickers_ba[0])
+
+def _chat_and_message(update: Update, command: str):
+    chat = update.effective_chat
+    message = update.effective_message
+    if chat is None:
+        log.warning("%s invoked without effective_chat", command)
+    elif message is None:
+        log.warning(
+            "%s invoked without effective_message chat_id=%s",
+            command,
+            getattr(chat, "id", None),
+        )
+    return chat, message
+
+async def _report_command_error(chat, message, context, command: str, ex: Exception,
+                                *, prefix: str, **error_context) -> None:
+    """Responde un error con ``error_id``: RuntimeError tal cual, el resto con ``prefix``."""
+    if isinstance(ex, RuntimeError):
+        msg = str(ex)
+        if "error_id=" not in msg:
+            error_id = log_exception_with_id(f"{command} runtime error", exc=ex, **error_context)
+            msg = f"{msg} (error_id={error_id})"
     else:
-        close = px
-    if isinstance(close.index, pd.DatetimeIndex):
-        close.index = ensure_utc_naive_index(close.index)
-    log.info("plot_tickers_usd close shape=%s", getattr(close, "shape", None))
+        error_id = log_exception_with_id(f"{command} unexpected error", exc=ex, **error_context)
+        msg = f"{prefix}: {ex} (error_id={error_id})"
+    await _reply_text(chat, message, context, msg)
 
-    ccl = download_ccl(start, end)
-    if isinstance(ccl.index, pd.DatetimeIndex):
-        ccl.index = ensure_utc_naive_index(ccl.index)
-    log.info("plot_tickers_usd ccl shape=%s", getattr(ccl, "shape", None))
-    usd = (
-        close.div(ccl, axis=0)
-        .dropna(axis=1, how="all")
-        .dropna(how="all")
-    )
-    missing = usd.columns[usd.isna().any()]
-    if not missing.empty:
-        log.warning("plot_tickers_usd missing data for %s", list(missing))
-    log.info("plot_tickers_usd usd shape=%s", usd.shape)
+def _parse_optional_int(args: list[str]) -> Optional[int]:
+    """Primer argumento entero positivo (o None si no hay); ValueError si es inválido."""
+    if not args:
+        return None
+    value = int(args[0])
+    if value <= 0:
+        raise ValueError(args[0])
+    return value
 
-    log.info(
-        "plot_tickers_usd: normalize=%s, usd_shape=%s",
-        normalize_flag,
-        usd.shape,
+async def _send_profile_report(session: ProfileSession, context) -> None:
+    global PROFILE_SESSION
+    if PROFILE_SESSION is session:
+        PROFILE_SESSION = None
+    report = session.report()
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    await _reply_document(
+        SimpleNamespace(id=session.owner_chat_id),
+        None,
+        context,
+        report,
+        filename=f"profile_{stamp}.txt",
+        caption=f"Perfil de {len(session.commands)} comando(s).",
     )
 
-    if usd.empty:
-        log.info(
-            "plot_tickers_usd empty usd for tickers=%s (ba=%s) start=%s end=%s",
-            tickers,
-            tickers_ba,
-            start,
-            end,
-        )
-        raise RuntimeError("Sin datos para ese rango.")
+def with_deadline(command: str, handler):
+    """Activa el presupuesto de ``COMMAND_DEADLINES[command]`` durante el handler."""
+    seconds = COMMAND_DEADLINES.get(command, 0)
+    if seconds <= 0:
+        return handler
 
-    if normalize_flag:
-        log.info("plot_tickers_usd applying normalization")
-        base = usd.iloc[0]
-        log.debug("plot_tickers_usd base initial=%s", base.to_dict())
-        invalid = base[(base == 0) | base.isna()]
-        if not invalid.empty:
-            bad_cols = [prettify_symbol(c) for c in invalid.index]
-            log.info("plot_tickers_usd filtering invalid base tickers=%s", bad_cols)
-            log.debug(
-                "plot_tickers_usd invalid base values=%s", invalid.to_dict()
-            )
-            log.warning(
-                "plot_tickers_usd invalid base values for %s", bad_cols
-            )
-            base = usd.replace(0, np.nan).apply(
-                lambda col: col.dropna().iloc[0] if not col.dropna().empty else np.nan
-            )
-            still_bad = base[base.isna()]
-            if not still_bad.empty:
-                bad = [prettify_symbol(c) for c in still_bad.index]
-                log.error(
-                    "plot_tickers_usd no valid values after cleanup for %s", bad
-                )
-                raise RuntimeError(
-                    "No se encontraron valores válidos para normalizar: "
-                    + ", ".join(bad)
-                )
-        log.debug("plot_tickers_usd base finalized=%s", base.to_dict())
-        plot_df = usd.divide(base, axis=1) * 100.0
-        ylabel = "Índice (100=ini)"
-        title_tag = " – Normalizado (100=ini)"
-    else:
-        log.info("plot_tickers_usd normalization not applied")
-        plot_df = usd
-        ylabel = "USD"
-        title_tag = " – USD"
+    @functools.wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        token = _DEADLINE.set(Deadline(seconds))
+        try:
+            return await handler(update, context)
+        finally:
+            _DEADLINE.reset(token)
 
-    fig = None
-    bio = io.BytesIO()
-    try:
-        fig, ax = plt.subplots(figsize=(10, 5), dpi=150)
-        for col in plot_df.columns:
-            ax.plot(plot_df.index, plot_df[col], label=prettify_symbol(col))
+    return wrapper
 
-        ax.set_ylabel(ylabel)
-        ax.set_xlabel("Fecha")
-        ax.set_title(
-            f"{', '.join(prettify_symbol(t) for t in plot_df.columns)}{title_tag} vía CCL"
-        )
-        ax.grid(True, alpha=0.25)
-        ax.legend()
+def with_render_profile(handler):
+    """Activa el perfil de render elegido por el chat (``/calidad``) durante el handler."""
 
-        fig.savefig(bio, format="png", bbox_inches="tight")
-        log.info(
-            "plot_tickers_usd plot_df columns=%s index_range=%s→%s rows=%d",
-            list(plot_df.columns),
-            plot_df.index.min() if not plot_df.index.empty else None,
-            plot_df.index.max() if not plot_df.index.empty else None,
-            len(plot_df.index),
-        )
-        log.info("plot_tickers_usd figure generated")
-    except Exception as ex:
-        error_id = log_exception_with_id(
-            "plot_tickers_usd plotting failed",
-            exc=ex,
-            tickers=tickers_ba,
-            start=start,
-            end=end,
-            normalize=normalize_flag,
-            columns=list(plot_df.columns),
-        )
-        pretty = ", ".join(prettify_symbol(t) for t in tickers_ba)
-        raise RuntimeError(
-            "No se pudo generar el gráfico. "
-            f"Revisá los logs con error_id={error_id} para {pretty}."
-        ) from ex
-    finally:
-        if fig is not None:
-            plt.close(fig)
-            log.info("plot_tickers_usd figure closed")
-    bio.seek(0)
-    return bio
+    @functools.wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        chat = getattr(update, "effective_chat", None)
+        try:
+            name = get_render_choice(chat.id) if chat is not None else None
+        except Exception as ex:
+            log.warning("render profile lookup failed: %s", ex)
+            name = None
+        if name is None:
+            return await handler(update, context)
+        token = _RENDER_PROFILE.set(name)
+        try:
+            return await handler(update, context)
+        finally:
+            _RENDER_PROFILE.reset(token)
 
-# ----------------------- HANDLERS --------------------
-async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    return wrapper
+
+def profiled(command: str, handler):
+    """Envuelve un handler para que cuente como ejecución de la sesión de /profile activa."""
+
+    @functools.wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        session = PROFILE_SESSION
+        if session is None or not session.claim():
+            return await handler(update, context)
+        token = _PROFILE.set(session)
+        started = time.perf_counter()
+        try:
+            return await handler(update, context)
+        finally:
+            _PROFILE.reset(token)
+            if session.release(command, time.perf_counter() - started):
+                try:
+                    await _send_profile_report(session, context)
+                except Exception as ex:
+                    log_exception_with_id("profile report failed", exc=ex)
+
+    return wrapper
+
+async def cmd_cclplot(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat = None
     message = None
     try:
         chat = update.effective_chat
         message = update.effective_message
         if chat is None:
-            log.warning("cmd_start invoked without effective_chat")
+            log.warning("cmd_cclplot invoked without effective_chat")
             return
         if message is None:
             log.warning(
-                "cmd_start invoked without effective_message chat_id=%s",
+                "cmd_cclplot invoked without effective_message chat_id=%s",
                 getattr(chat, "id", None),
             )
 
+        if len(context.args) < 1:
+            await _reply_text(chat, message, context, "Uso: /cclplot <TICKER1> [TICKER2 …]")
+            return
+
         chat_id = chat.id
         s, e = get_dates(chat_id)
-        norm = get_normalize(chat_id)
-        msg = (
-            "Comandos: /ini YYYY-MM-DD | /fin YYYY-MM-DD | /cclvars N M | /cclplot "
-            "TICKER1 [TICKER2 ...] | /normalize\n"
+        if not s or not e:
+            await _reply_text(
+                chat,
+                message,
+                context,
+                "Definí primero el rango con /ini y /fin.",
+            )
+            return
+
+        tickers = context.args
+        tickers_norm = [norm_ticker_ba(t).upper() for t in tickers]
+        invalid = TICKER_INDEX.invalid(tickers_norm)
+        if invalid:
+            log.info("cmd_cclplot rejecting known invalid tickers chat_id=%s tickers=%s", chat_id, invalid)
+            await _reply_text(chat, message, context, unknown_tickers_message(invalid))
+            tickers = [t for t, n in zip(tickers, tickers_norm) if n not in invalid]
+            tickers_norm = [n for n in tickers_norm if n not in invalid]
+            if not tickers:
+                return
+        tickers_str = ", ".join(tickers_norm)
+        normalize_flag = get_normalize(chat_id)
+        ctx_info = (
+            f"chat_id={chat_id} tickers={tickers_norm} start={s} end={e} "
+            f"normalize={normalize_flag}"
         )
-        msg += f"Rango actual: inicio={s or '⟂'} | fin={e or '⟂'} | normalize={norm}"
-        await _reply_text(chat, message, context, msg)
+        log.info(f"cmd_cclplot start {ctx_info}")
+        await _reply_text(
+            chat,
+            message,
+            context,
+            f"Graficando {tickers_str} para {s} → {e} …",
+        )
+        try:
+            log.info(f"cmd_cclplot to_thread start {ctx_info}")
+            # Perfil resuelto (chat + carga) antes de armar la clave del cache stale
+            profile_name = profile_for_load(_RENDER_PROFILE.get(), RENDER_QUEUE.pending)
+            img, age = await within_deadline(fetch_with_stale(
+                "plot_tickers_usd", _render_tickers_usd, tickers, s, e, normalize_flag, profile_name
+            ))
+            size = img.getbuffer().nbytes if hasattr(img, "getbuffer") else None
+            if size is not None:
+                log.info(f"cmd_cclplot to_thread done {ctx_info} size={size}")
+            else:
+                log.info(f"cmd_cclplot to_thread done {ctx_info}")
+            await _reply_photo(
+                chat,
+                message,
+                context,
+                img,
+                caption=f"{tickers_str} – {s} → {e}"
+                + (f"\n{stale_note(age)}" if age is not None else ""),
+            )
+            log.info(f"cmd_cclplot response sent {ctx_info}")
+        except TimeoutError:
+            log.warning(f"cmd_cclplot deadline reached {ctx_info}")
+            seconds = getattr(current_deadline(), "seconds", None)
+            limit = f" dentro del límite de {seconds:.0f} s" if seconds else " a tiempo"
+            await _reply_text(
+                chat,
+                message,
+                context,
+                f"No se pudo graficar {tickers_str}{limit}; probá con menos tickers o más tarde.",
+            )
+        except RuntimeError as ex:
+            msg = str(ex)
+            if "error_id=" not in msg:
+                error_id = log_exception_with_id(
+                    "cmd_cclplot runtime error",
+                    exc=ex,
+                    chat_id=chat_id,
+                    tickers=tickers_norm,
+                    start=s,
+                    end=e,
+                    normalize=normalize_flag,
+                )
+                msg = f"{msg} (error_id={error_id})"
+            await _reply_text(chat, message, context, msg)
+        except Exception as ex:
+            error_id = log_exception_with_id(
+                "cmd_cclplot unexpected error",
+                exc=ex,
+                chat_id=chat_id,
+                tickers=tickers_norm,
+                start=s,
+                end=e,
+                normalize=normalize_flag,
+            )
+            await _reply_text(
+                chat,
+                message,
+                context,
+                f"Error al graficar {tickers_str}: {ex} (error_id={error_id})",
+            )
     except Exception as ex:  # pragma: no cover - unexpected
         log_exception_with_id(
-            "cmd_start unexpected error",
+            "cmd_cclplot outer error",
             exc=ex,
             chat_id=getattr(chat, "id", None),
+            args=getattr(context, "args", None),
         )
 
-async def cmd_ini(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def cmd_cclhorizontes(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat = None
     message = None
+    error_context = {}
     try:
-        chat = update.effective_chat
-        message = update.effective_message
+        chat, message = _chat_and_message(update, "cmd_cclhorizontes")
         if chat is None:
-            log.warning("cmd_ini invoked without effective_chat")
             return
-        if message is None:
-            log.warning(
-                "cmd_ini invoked without effective_message chat_id=%s",
-                getattr(chat, "id", None),
-            )
-
-        chat_id = chat.id
-        if not context.args:
-            await _reply_text(chat, message, context, "Formato: /ini YYYY-MM-DD")
+        args = getattr(context, "args", None) or []
+        try:
+            top_n = _parse_optional_int(args)
+        except ValueError:
+            await _reply_text(chat, message, context, "Uso: /cclhorizontes [N] (ej: /cclhorizontes 10)")
             return
 
+        chat_id = chat.id
+        error_context.update(chat_id=chat_id, top_n=top_n)
         try:
-            d = parse_date(context.args[0])
-            set_date(chat_id, "start", d)
-            log.info("cmd_ini saved chat_id=%s start=%s", chat_id, d)
-            await _reply_text(chat, message, context, f"Fecha inicial guardada: {d}")
-        except ValueError:
+            _, e = get_dates(chat_id)
+            if not e:
+                await _reply_text(chat, message, context, "Definí primero la fecha final con /fin.")
+                return
+            error_context["end"] = e
             await _reply_text(
                 chat,
                 message,
                 context,
-                "Fecha inválida. Formato: YYYY-MM-DD",
-            )
-        except Exception as ex:
-            error_id = log_exception_with_id(
-                "cmd_ini unexpected error",
-                exc=ex,
-                chat_id=chat_id,
-                command="/ini",
-                args=context.args,
+                f"Calculando {', '.join(HORIZONS)} hasta {e} …",
             )
-            await _reply_text(
+            (table, msg), age = await fetch_with_stale("horizons", get_var_horizons, e)
+            if table.empty:
+                await _reply_text(chat, message, context, "Sin datos para ese rango.")
+                return
+            img = await RENDER_QUEUE.run(plot_horizons, table, e, top_n)
+            await _reply_photo(
                 chat,
                 message,
                 context,
-                f"Ocurrió un error al guardar la fecha inicial: {ex} (error_id={error_id})",
+                img,
+                caption=f"Horizontes {', '.join(table.columns)} → {e}"
+                + (f"\n{stale_note(age)}" if age is not None else ""),
+            )
+            if msg:
+                await _reply_text(chat, message, context, msg)
+        except Exception as ex:
+            await _report_command_error(
+                chat, message, context, "cmd_cclhorizontes", ex,
+                prefix="Error al calcular horizontes", **error_context,
             )
     except Exception as ex:  # pragma: no cover - unexpected
         log_exception_with_id(
-            "cmd_ini outer error",
+            "cmd_cclhorizontes outer error",
             exc=ex,
             chat_id=getattr(chat, "id", None),
-            command="/ini",
             args=getattr(context, "args", None),
         )
 
-async def cmd_fin(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def cmd_cclriesgo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat = None
     message = None
+    error_context = {}
+    usage = "Uso: /cclriesgo [vol|dd|sharpe|mejor|peor] [N] (ej: /cclriesgo vol 20)"
     try:
-        chat = update.effective_chat
-        message = update.effective_message
+        chat, message = _chat_and_message(update, "cmd_cclriesgo")
         if chat is None:
-            log.warning("cmd_fin invoked without effective_chat")
             return
-        if message is None:
-            log.warning(
-                "cmd_fin invoked without effective_message chat_id=%s",
-                getattr(chat, "id", None),
-            )
-
-        chat_id = chat.id
-        if not context.args:
-            await _reply_text(chat, message, context, "Formato: /fin YYYY-MM-DD")
+        args = list(getattr(context, "args", None) or [])
+        metric = "sharpe"
+        if args and args[0].lower() in RISK_METRICS:
+            metric = args.pop(0).lower()
+        try:
+            top_n = _parse_optional_int(args) or 15
+        except ValueError:
+            await _reply_text(chat, message, context, usage)
             return
 
+        chat_id = chat.id
+        error_context.update(chat_id=chat_id, metric=metric, top_n=top_n)
         try:
-            d = parse_date(context.args[0])
-            set_date(chat_id, "end", d)
-            log.info("cmd_fin saved chat_id=%s end=%s", chat_id, d)
-            await _reply_text(chat, message, context, f"Fecha final guardada: {d}")
-        except ValueError:
-            await _reply_text(
+            s, e = get_dates(chat_id)
+            if not s or not e:
+                await _reply_text(chat, message, context, "Definí primero el rango con /ini y /fin.")
+                return
+            error_context.update(start=s, end=e)
+            column, label, ascending = RISK_METRICS[metric]
+            await _reply_text(chat, message, context, f"Calculando {label} para {s} → {e} …")
+            (stats, msg), age = await fetch_with_stale("risk", get_risk_stats, s, e)
+            img = await RENDER_QUEUE.run(
+                plot_ranked_metric,
+                stats[column],
+                f"{label} · USD vía CCL · {s} → {e}",
+                label,
+                top_n,
+                ascending,
+            )
+            await _reply_photo(
                 chat,
                 message,
                 context,
-                "Fecha inválida. Formato: YYYY-MM-DD",
+                img,
+                caption=f"{label} {s} → {e}"
+                + (f"\n{stale_note(age)}" if age is not None else ""),
             )
+            if msg:
+                await _reply_text(chat, message, context, msg)
         except Exception as ex:
-            error_id = log_exception_with_id(
-                "cmd_fin unexpected error",
-                exc=ex,
-                chat_id=chat_id,
-                command="/fin",
-                args=context.args,
-            )
-            await _reply_text(
-                chat,
-                message,
-                context,
-                f"Ocurrió un error al guardar la fecha final: {ex} (error_id={error_id})",
+            await _report_command_error(
+                chat, message, context, "cmd_cclriesgo", ex,
+                prefix="Error al calcular riesgo", **error_context,
             )
     except Exception as ex:  # pragma: no cover - unexpected
         log_exception_with_id(
-            "cmd_fin outer error",
+            "cmd_cclriesgo outer error",
             exc=ex,
             chat_id=getattr(chat, "id", None),
-            command="/fin",
             args=getattr(context, "args", None),
         )
 
-async def cmd_normalize(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def cmd_cclcorr(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat = None
     message = None
+    error_context = {}
     try:
-        chat = update.effective_chat
-        message = update.effective_message
+        chat, message = _chat_and_message(update, "cmd_cclcorr")
         if chat is None:
-            log.warning("cmd_normalize invoked without effective_chat")
             return
-        if message is None:
-            log.warning(
-                "cmd_normalize invoked without effective_message chat_id=%s",
-                getattr(chat, "id", None),
-            )
+        args = list(getattr(context, "args", None) or [])
+        tickers = tuple(dict.fromkeys(norm_ticker_ba(t) for t in args)) or None
+        if tickers is not None and len(tickers) < 2:
+            await _reply_text(chat, message, context, "Uso: /cclcorr [TICKER1 TICKER2 …] (al menos dos)")
+            return
 
         chat_id = chat.id
+        error_context.update(chat_id=chat_id, tickers=tickers)
         try:
-            new_val = toggle_normalize(chat_id)
-        except Exception as ex:
-            error_id = log_exception_with_id(
-                "cmd_normalize toggle error",
-                exc=ex,
-                chat_id=chat_id,
+            s, e = get_dates(chat_id)
+            if not s or not e:
+                await _reply_text(chat, message, context, "Definí primero el rango con /ini y /fin.")
+                return
+            error_context.update(start=s, end=e)
+            await _reply_text(chat, message, context, f"Calculando correlaciones para {s} → {e} …")
+            (corr, msg), age = await fetch_with_stale("corr", get_correlation, s, e, tickers)
+            img = await RENDER_QUEUE.run(
+                functools.partial(
+                    plot_heatmap,
+                    corr,
+                    f"Correlación de retornos log USD vía CCL · {s} → {e}",
+                    cmap="RdBu_r",
+                    fmt="{:.2f}",
+                    colorbar_label="Correlación",
+                    square=True,
+                )
             )
-            await _reply_text(
+            await _reply_photo(
                 chat,
                 message,
                 context,
-                f"Error al actualizar la configuración de normalización: {ex} (error_id={error_id})",
-            )
-            return
-        log.info("cmd_normalize chat_id=%s new_val=%s", chat_id, new_val)
-        if new_val:
-            txt = (
-                "Normalización: ON\n"
-                "Desde ahora TODOS los gráficos se devuelven normalizados con base **100** en la fecha inicial.\n"
-                "- /cclplot: línea índice (100=ini).\n"
-                "- /cclvars: rendimientos relativos; el gráfico aclara Base 100=ini."
+                img,
+                caption=f"Correlaciones {s} → {e} ({len(corr)} tickers)"
+                + (f"\n{stale_note(age)}" if age is not None else ""),
             )
-        else:
-            txt = (
-                "Normalización: OFF\n"
-                "Desde ahora los gráficos NO se normalizan.\n"
-                "- /cclplot: precio en USD (vía CCL) absoluto.\n"
-                "- /cclvars: rendimientos relativos en % (sin base 100 en el título)."
+            if msg:
+                await _reply_text(chat, message, context, msg)
+        except Exception as ex:
+            await _report_command_error(
+                chat, message, context, "cmd_cclcorr", ex,
+                prefix="Error al calcular correlaciones", **error_context,
             )
-        log.debug("cmd_normalize response chat_id=%s text=%r", chat_id, txt)
-        await _reply_text(chat, message, context, txt, disable_web_page_preview=True)
     except Exception as ex:  # pragma: no cover - unexpected
         log_exception_with_id(
-            "cmd_normalize unexpected error",
+            "cmd_cclcorr outer error",
             exc=ex,
             chat_id=getattr(chat, "id", None),
+            args=getattr(context, "args", None),
         )
 
-async def cmd_cclvars(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def cmd_cclperiodos(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat = None
     message = None
-    chat_id = None
-    top_n = None
-    bot_n = None
-    s = None
-    e = None
-    normalize_flag = None
     error_context = {}
     try:
-        chat = update.effective_chat
-        message = update.effective_message
+        chat, message = _chat_and_message(update, "cmd_cclperiodos")
         if chat is None:
-            log.warning("cmd_cclvars invoked without effective_chat")
             return
-        if message is None:
-            log.warning(
-                "cmd_cclvars invoked without effective_message chat_id=%s",
-                getattr(chat, "id", None),
-            )
+        args = list(getattr(context, "args", None) or [])
+        freq_key = "M"
+        if args and args[0].upper() in PERIOD_FREQS:
+            freq_key = args.pop(0).upper()
+        tickers = tuple(dict.fromkeys(norm_ticker_ba(t) for t in args)) or None
 
-        args = getattr(context, "args", None) or []
-        if len(args) != 2:
-            await _reply_text(
+        chat_id = chat.id
+        error_context.update(chat_id=chat_id, freq=freq_key, tickers=tickers)
+        try:
+            s, e = get_dates(chat_id)
+            if not s or not e:
+                await _reply_text(chat, message, context, "Definí primero el rango con /ini y /fin.")
+                return
+            error_context.update(start=s, end=e)
+            label = "mensuales" if freq_key == "M" else "semanales"
+            await _reply_text(chat, message, context, f"Calculando retornos {label} para {s} → {e} …")
+            (table, msg), age = await fetch_with_stale(
+                "periods", get_period_returns, s, e, PERIOD_FREQS[freq_key], tickers
+            )
+            img = await RENDER_QUEUE.run(
+                plot_heatmap,
+                table,
+                f"Retornos {label} USD vía CCL · {s} → {e}",
+            )
+            await _reply_photo(
                 chat,
                 message,
                 context,
-                "Uso: /cclvars <top_n> <bottom_n> (ej: /cclvars 15 20)",
+                img,
+                caption=f"Retornos {label} {s} → {e}"
+                + (f"\n{stale_note(age)}" if age is not None else ""),
             )
-            return
+            if msg:
+                await _reply_text(chat, message, context, msg)
+        except Exception as ex:
+            await _report_command_error(
+                chat, message, context, "cmd_cclperiodos", ex,
+                prefix="Error al calcular retornos por período", **error_context,
+            )
+    except Exception as ex:  # pragma: no cover - unexpected
+        log_exception_with_id(
+            "cmd_cclperiodos outer error",
+            exc=ex,
+            chat_id=getattr(chat, "id", None),
+            args=getattr(context, "args", None),
+        )
 
+async def cmd_cclsectores(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat = None
+    message = None
+    error_context = {}
+    try:
+        chat, message = _chat_and_message(update, "cmd_cclsectores")
+        if chat is None:
+            return
+        chat_id = chat.id
+        error_context["chat_id"] = chat_id
         try:
-            top_n = int(args[0])
-            bot_n = int(args[1])
-        except ValueError:
-            await _reply_text(
+            s, e = get_dates(chat_id)
+            if not s or not e:
+                await _reply_text(chat, message, context, "Definí primero el rango con /ini y /fin.")
+                return
+            error_context.update(start=s, end=e)
+            await _reply_text(chat, message, context, f"Calculando índices sectoriales para {s} → {e} …")
+            (indices, msg), age = await fetch_with_stale("sectors", get_sector_indices, s, e)
+            img = await RENDER_QUEUE.run(plot_sector_indices, indices, s, e)
+            await _reply_photo(
                 chat,
                 message,
                 context,
-                "Los dos parámetros deben ser enteros.",
+                img,
+                caption=f"Sectores {s} → {e}"
+                + (f"\n{stale_note(age)}" if age is not None else ""),
             )
-            return
+            if msg:
+                await _reply_text(chat, message, context, msg)
+        except Exception as ex:
+            await _report_command_error(
+                chat, message, context, "cmd_cclsectores", ex,
+                prefix="Error al calcular sectores", **error_context,
+            )
+    except Exception as ex:  # pragma: no cover - unexpected
+        log_exception_with_id(
+            "cmd_cclsectores outer error",
+            exc=ex,
+            chat_id=getattr(chat, "id", None),
+        )
 
-        if top_n is not None:
-            error_context["top_n"] = top_n
-        if bot_n is not None:
-            error_context["bottom_n"] = bot_n
+async def cmd_cclexport(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat = None
+    message = None
+    error_context = {}
+    try:
+        chat, message = _chat_and_message(update, "cmd_cclexport")
+        if chat is None:
+            return
+        args = list(getattr(context, "args", None) or [])
+        fmt, kind = "csv", "series"
+        while args and args[0].lower() in EXPORT_FORMATS + EXPORT_KINDS:
+            word = args.pop(0).lower()
+            if word in EXPORT_FORMATS:
+                fmt = word
+            else:
+                kind = word
+        tickers = tuple(dict.fromkeys(norm_ticker_ba(t) for t in args)) or None
 
         chat_id = chat.id
-        if chat_id is not None:
-            error_context["chat_id"] = chat_id
-
+        error_context.update(chat_id=chat_id, fmt=fmt, kind=kind, tickers=tickers)
         try:
             s, e = get_dates(chat_id)
-            if s is not None:
-                error_context["start"] = s
-            if e is not None:
-                error_context["end"] = e
             if not s or not e:
-                await _reply_text(
+                await _reply_text(chat, message, context, "Definí primero el rango con /ini y /fin.")
+                return
+            error_context.update(start=s, end=e)
+            await _reply_text(chat, message, context, f"Exportando {kind} ({fmt}) para {s} → {e} …")
+            # Sólo la matriz (compartida con PRICE_CACHE) pasa por LAST_GOOD
+            (close_usd, failed), age = await fetch_with_stale("prices", close_usd_range, s, e, tickers)
+            frame, msg = await run_blocking(export_frame, close_usd, failed, kind)
+            doc = await run_blocking(write_export, frame, fmt)
+            try:
+                await _reply_document(
                     chat,
                     message,
                     context,
-                    "Definí primero el rango con /ini y /fin.",
+                    doc,
+                    filename=export_filename(kind, fmt, s, e),
+                    caption=f"{len(frame)} filas × {len(frame.columns)} columnas · USD vía CCL"
+                    + (f"\n{stale_note(age)}" if age is not None else ""),
                 )
-                return
+            finally:
+                doc.close()
+            if msg:
+                await _reply_text(chat, message, context, msg)
+        except Exception as ex:
+            await _report_command_error(
+                chat, message, context, "cmd_cclexport", ex,
+                prefix="Error al exportar", **error_context,
+            )
+    except Exception as ex:  # pragma: no cover - unexpected
+        log_exception_with_id(
+            "cmd_cclexport outer error",
+            exc=ex,
+            chat_id=getattr(chat, "id", None),
+            args=getattr(context, "args", None),
+        )
 
-            normalize_flag = get_normalize(chat_id)
-            if normalize_flag is not None:
-                error_context["normalize"] = normalize_flag
+def _intraday_as_of(ccl: pd.Series) -> str:
+    stamp = pd.Timestamp(ccl.index[-1]).tz_localize("UTC").tz_convert(SUBSCRIPTION_TZ)
+    return stamp.strftime("%Y-%m-%d %H:%M")
 
-            await _reply_text(
-                chat,
-                message,
-                context,
-                f"Calculando Top {top_n} / Bottom {bot_n} para {s} → {e} …",
-            )
-            series, msg = await asyncio.to_thread(get_var, s, e)
-            if series.dropna().empty:
-                await _reply_text(chat, message, context, "Sin datos para ese rango.")
-                if msg:
-                    await _reply_text(chat, message, context, msg)
+async def cmd_cclvivo(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat = None
+    message = None
+    try:
+        chat, message = _chat_and_message(update, "cmd_cclvivo")
+        if chat is None:
+            return
+        try:
+            await INTRADAY.ensure_started()
+            ccl = INTRADAY.live_ccl()
+            if ccl.empty:
+                await _reply_text(chat, message, context, "Sin datos intradiarios todavía.")
                 return
-            img = await asyncio.to_thread(
-                plot_top_bottom, series, top_n, bot_n, s, e, normalize_flag
+            last = float(ccl.iloc[-1])
+            source = (
+                f"compuesto, {len(CCL_PAIRS)} pares" if CCL_MODE == "composite"
+                else f"{CCL_LEGS[0]} / {CCL_LEGS[1]}"
             )
-            await _reply_photo(
-                chat,
-                message,
-                context,
-                img,
-                caption=f"Top/Bottom {s} → {e}",
+            lines = [f"CCL implícito ({source}): {last:,.2f}"]
+            lines.append(f"Rango de la rueda: {ccl.min():,.2f} – {ccl.max():,.2f} · apertura {ccl.iloc[0]:,.2f}")
+            lines.append(f"Último dato: {_intraday_as_of(ccl)}")
+            if not market_open(datetime.now(SUBSCRIPTION_TZ)):
+                lines.append("Mercado cerrado.")
+            await _reply_text(chat, message, context, "\n".join(lines))
+        except Exception as ex:
+            await _report_command_error(
+                chat, message, context, "cmd_cclvivo", ex,
+                prefix="Error al obtener el CCL intradiario", chat_id=chat.id,
             )
-            if msg:
-                await _reply_text(chat, message, context, msg)
-        except RuntimeError as ex:
-            msg = str(ex)
-            if "error_id=" not in msg:
-                error_id = log_exception_with_id(
-                    "cmd_cclvars runtime error",
-                    exc=ex,
-                    **error_context,
-                )
-                msg = f"{msg} (error_id={error_id})"
-            await _reply_text(chat, message, context, msg)
+    except Exception as ex:  # pragma: no cover - unexpected
+        log_exception_with_id(
+            "cmd_cclvivo outer error",
+            exc=ex,
+            chat_id=getattr(chat, "id", None),
+        )
+
+async def cmd_cclmovers(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat = None
+    message = None
+    try:
+        chat, message = _chat_and_message(update, "cmd_cclmovers")
+        if chat is None:
+            return
+        args = list(getattr(context, "args", None) or [])
+        try:
+            top_n = _parse_optional_int(args) or 10
+        except ValueError:
+            await _reply_text(chat, message, context, "Uso: /cclmovers [N] (ej: /cclmovers 5)")
+            return
+        try:
+            await INTRADAY.ensure_started()
+            moves = INTRADAY.movers()
+            if moves.empty:
+                await _reply_text(chat, message, context, "Sin datos intradiarios todavía.")
+                return
+            as_of = _intraday_as_of(INTRADAY.live_ccl())
+            txt = format_top_bottom_text(moves, top_n, top_n, "cierre anterior", as_of, False)
+            await _reply_text(chat, message, context, txt, parse_mode="HTML")
         except Exception as ex:
-            error_id = log_exception_with_id(
-                "cmd_cclvars unexpected error",
-                exc=ex,
-                **error_context,
-            )
-            await _reply_text(
-                chat,
-                message,
-                context,
-                f"Error al generar gráfico: {ex} (error_id={error_id})",
+            await _report_command_error(
+                chat, message, context, "cmd_cclmovers", ex,
+                prefix="Error al calcular movers", chat_id=chat.id,
             )
     except Exception as ex:  # pragma: no cover - unexpected
         log_exception_with_id(
-            "cmd_cclvars outer error",
+            "cmd_cclmovers outer error",
             exc=ex,
             chat_id=getattr(chat, "id", None),
             args=getattr(context, "args", None),
         )
 
-async def cmd_cclplot(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Inline query: responde sólo desde ``INLINE_INDEX`` (nunca descarga)."""
+    query = update.inline_query
+    if query is None:
+        return
+    try:
+        results = INLINE_INDEX.results(query.query or "", getattr(context, "bot", None))
+        await query.answer(results, cache_time=INLINE_CACHE_TIME if results else 5)
+    except Exception as ex:
+        log_exception_with_id("inline_query error", exc=ex, query=getattr(query, "query", None))
+
+async def cmd_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    global PROFILE_SESSION
     chat = None
     message = None
     try:
-        chat = update.effective_chat
-        message = update.effective_message
+        chat, message = _chat_and_message(update, "cmd_profile")
         if chat is None:
-            log.warning("cmd_cclplot invoked without effective_chat")
             return
-        if message is None:
-            log.warning(
-                "cmd_cclplot invoked without effective_message chat_id=%s",
-                getattr(chat, "id", None),
+        if chat.id not in ADMIN_CHAT_IDS:
+            log.warning("cmd_profile denied chat_id=%s", chat.id)
+            await _reply_text(chat, message, context, "Comando restringido.")
+            return
+        args = list(getattr(context, "args", None) or [])
+        if args and args[0].lower() == "off":
+            session = PROFILE_SESSION
+            if session is None:
+                await _reply_text(chat, message, context, "No hay perfilado activo.")
+                return
+            await _send_profile_report(session, context)
+            return
+        try:
+            runs = int(args[0]) if args else 5
+        except ValueError:
+            await _reply_text(chat, message, context, "Uso: /profile [N|off] (ej: /profile 10)")
+            return
+        runs = max(1, min(runs, PROFILE_MAX_RUNS))
+        if PROFILE_SESSION is not None and not PROFILE_SESSION.closed:
+            await _reply_text(
+                chat, message, context,
+                f"Ya hay un perfilado activo ({PROFILE_SESSION.remaining} restantes). Usá /profile off.",
             )
-
-        if len(context.args) < 1:
-            await _reply_text(chat, message, context, "Uso: /cclplot <TICKER1> [TICKER2 …]")
             return
+        PROFILE_SESSION = ProfileSession(chat.id, runs)
+        log.info("cmd_profile armed chat_id=%s runs=%d", chat.id, runs)
+        await _reply_text(
+            chat, message, context,
+            f"Perfilando los próximos {runs} comandos; el reporte llega a este chat.",
+        )
+    except Exception as ex:  # pragma: no cover - unexpected
+        log_exception_with_id(
+            "cmd_profile outer error",
+            exc=ex,
+            chat_id=getattr(chat, "id", None),
+            args=getattr(context, "args", None),
+        )
 
+async def cmd_cclsuscribir(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat = None
+    message = None
+    usage = "Uso: /cclsuscribir HH:MM [ventana] [top_n] [bottom_n] | off (ej: /cclsuscribir 18:30 1M 10 10)"
+    try:
+        chat, message = _chat_and_message(update, "cmd_cclsuscribir")
+        if chat is None:
+            return
         chat_id = chat.id
-        s, e = get_dates(chat_id)
-        if not s or not e:
+        args = list(getattr(context, "args", None) or [])
+        try:
+            if not args:
+                sub = get_subscription(chat_id)
+                if not sub:
+                    await _reply_text(chat, message, context, f"Sin suscripción.\n{usage}")
+                else:
+                    await _reply_text(
+                        chat, message, context,
+                        f"Suscripción: Top {sub['top']} / Bottom {sub['bottom']} de {sub['window']} "
+                        f"a las {sub['time']} (días hábiles).",
+                    )
+                return
+            if args[0].lower() == "off":
+                set_subscription(chat_id, None)
+                await _reply_text(chat, message, context, "Suscripción cancelada.")
+                return
+            try:
+                at = parse_time_of_day(args[0])
+                window = args[1].upper() if len(args) > 1 else "1M"
+                horizon_start(datetime.now(SUBSCRIPTION_TZ).date().isoformat(), window)
+                top_n = int(args[2]) if len(args) > 2 else 10
+                bot_n = int(args[3]) if len(args) > 3 else top_n
+            except ValueError:
+                await _reply_text(chat, message, context, usage)
+                return
+            set_subscription(chat_id, {"time": at, "window": window, "top": top_n, "bottom": bot_n})
+            log.info("cmd_cclsuscribir chat_id=%s time=%s window=%s", chat_id, at, window)
             await _reply_text(
-                chat,
-                message,
-                context,
-                "Definí primero el rango con /ini y /fin.",
+                chat, message, context,
+                f"Suscripción guardada: Top {top_n} / Bottom {bot_n} de {window} "
+                f"todos los días hábiles a las {at} ({SUBSCRIPTION_TZ.key}).",
             )
-            return
-
-        tickers = context.args
-        tickers_norm = [norm_ticker_ba(t).upper() for t in tickers]
-        tickers_str = ", ".join(tickers_norm)
-        normalize_flag = get_normalize(chat_id)
-        ctx_info = (
-            f"chat_id={chat_id} tickers={tickers_norm} start={s} end={e} "
-            f"normalize={normalize_flag}"
+        except Exception as ex:
+            await _report_command_error(
+                chat, message, context, "cmd_cclsuscribir", ex,
+                prefix="Error al guardar la suscripción", chat_id=chat_id,
+            )
+    except Exception as ex:  # pragma: no cover - unexpected
+        log_exception_with_id(
+            "cmd_cclsuscribir outer error",
+            exc=ex,
+            chat_id=getattr(chat, "id", None),
+            args=getattr(context, "args", None),
         )
-        log.info(f"cmd_cclplot start {ctx_info}")
-        await _reply_text(
-            chat,
-            message,
-            context,
-            f"Graficando {tickers_str} para {s} → {e} …",
+
+async def cmd_memoria(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat = None
+    message = None
+    try:
+        chat, message = _chat_and_message(update, "cmd_memoria")
+        if chat is None:
+            return
+        if chat.id not in ADMIN_CHAT_IDS:
+            log.warning("cmd_memoria denied chat_id=%s", chat.id)
+            await _reply_text(chat, message, context, "Comando restringido.")
+            return
+        args = [a.lower() for a in (getattr(context, "args", None) or [])]
+        if args[:1] == ["trace"]:
+            text = await run_blocking(WATCHDOG.trace_top)
+        elif args[:1] == ["off"]:
+            WATCHDOG.trace_stop()
+            text = "tracemalloc desactivado."
+        else:
+            WATCHDOG.check()
+            text = WATCHDOG.report()
+        await _reply_text(chat, message, context, "<pre>" + html.escape(text) + "</pre>", parse_mode="HTML")
+    except Exception as ex:  # pragma: no cover - unexpected
+        log_exception_with_id(
+            "cmd_memoria outer error",
+            exc=ex,
+            chat_id=getattr(chat, "id", None),
+            args=getattr(context, "args", None),
         )
+
+async def cmd_calidad(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat = None
+    message = None
+    try:
+        chat, message = _chat_and_message(update, "cmd_calidad")
+        if chat is None:
+            return
+        args = [a.lower() for a in (getattr(context, "args", None) or [])]
+        names = " | ".join(RENDER_PROFILES)
         try:
-            log.info(f"cmd_cclplot to_thread start {ctx_info}")
-            img = await asyncio.to_thread(plot_tickers_usd, tickers, s, e, normalize_flag)
-            size = img.getbuffer().nbytes if hasattr(img, "getbuffer") else None
-            if size is not None:
-                log.info(f"cmd_cclplot to_thread done {ctx_info} size={size}")
-            else:
-                log.info(f"cmd_cclplot to_thread done {ctx_info}")
-            await _reply_photo(
-                chat,
-                message,
-                context,
-                img,
-                caption=f"{tickers_str} – {s} → {e}",
-            )
-            log.info(f"cmd_cclplot response sent {ctx_info}")
-        except RuntimeError as ex:
-            msg = str(ex)
-            if "error_id=" not in msg:
-                error_id = log_exception_with_id(
-                    "cmd_cclplot runtime error",
-                    exc=ex,
-                    chat_id=chat_id,
-                    tickers=tickers_norm,
-                    start=s,
-                    end=e,
-                    normalize=normalize_flag,
+            if not args:
+                current = get_render_choice(chat.id)
+                text = (
+                    f"Calidad de gráficos: {current or RENDER_PROFILE_DEFAULT}"
+                    + ("" if current else " (default)")
+                    + f"\nUso: /calidad [{names} | default]"
                 )
-                msg = f"{msg} (error_id={error_id})"
-            await _reply_text(chat, message, context, msg)
+            elif args[0] == "default":
+                set_render_choice(chat.id, None)
+                text = f"Calidad de gráficos: {RENDER_PROFILE_DEFAULT} (default)"
+            elif args[0] in RENDER_PROFILES:
+                set_render_choice(chat.id, args[0])
+                text = f"Calidad de gráficos: {args[0]}"
+                if RENDER_LOAD_PROFILES:
+                    text += "\nCon mucha carga se puede bajar temporalmente."
+            else:
+                text = f"Uso: /calidad [{names} | default]"
         except Exception as ex:
-            error_id = log_exception_with_id(
-                "cmd_cclplot unexpected error",
-                exc=ex,
-                chat_id=chat_id,
-                tickers=tickers_norm,
-                start=s,
-                end=e,
-                normalize=normalize_flag,
-            )
-            await _reply_text(
-                chat,
-                message,
-                context,
-                f"Error al graficar {tickers_str}: {ex} (error_id={error_id})",
+            await _report_command_error(
+                chat, message, context, "cmd_calidad", ex,
+                prefix="Error al actualizar la calidad", chat_id=chat.id,
             )
+            return
+        await _reply_text(chat, message, context, text)
     except Exception as ex:  # pragma: no cover - unexpected
         log_exception_with_id(
-            "cmd_cclplot outer error",
+            "cmd_calidad outer error",
             exc=ex,
             chat_id=getattr(chat, "id", None),
             args=getattr(context, "args", None),
         )
 
+# ------------------ SUSCRIPCIONES --------------------
+def due_subscriptions(state: dict, now: datetime) -> dict[tuple, list[int]]:
+    """Chats cuyo envío de hoy está pendiente, agrupados por spec idéntico.
+
+    El spec es ``(ventana, top, bottom, normalize)``: todo lo que cambia el
+    gráfico. Los fines de semana no hay envíos.
+    """
+    if now.weekday() >= 5:
+        return {}
+    today, hhmm = now.date().isoformat(), now.strftime("%H:%M")
+    groups: dict[tuple, list[int]] = {}
+    for key, chat_state in state.items():
+        sub = chat_state.get("subscription") if isinstance(chat_state, dict) else None
+        if not sub or sub.get("last_sent") == today or sub.get("time", "99:99") > hhmm:
+            continue
+        try:
+            chat_id = int(key)
+        except ValueError:
+            continue
+        spec = (sub["window"], int(sub["top"]), int(sub["bottom"]), bool(chat_state.get("normalize", False)))
+        groups.setdefault(spec, []).append(chat_id)
+    return groups
+
+
+class SubscriptionScheduler:
+    """Revisa las suscripciones cada ``tick`` segundos y entrega los reportes.
+
+    Cada grupo de spec idéntico renderiza una sola vez (y ``get_var`` se calcula
+    una vez por ventana); el primer envío sube el PNG y el resto reutiliza el
+    ``file_id`` de Telegram. Un grupo que falla no se reintenta en cada tick
+    sino con backoff (``SUBSCRIPTION_RETRY_SECONDS`` … ``SUBSCRIPTION_RETRY_MAX``).
+    """
+
+    def __init__(self, tick: float, fanout: int):
+        self.tick = tick
+        self.fanout = max(1, fanout)
+        self._bot = None
+        self._task: Optional[asyncio.Task] = None
+        self._failures: dict[tuple, tuple[str, int, float]] = {}  # spec → (día, fallas, reintento)
+
+    def start(self, bot) -> None:
+        self._bot = bot
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.run_due()
+            except Exception as ex:
+                log_exception_with_id("subscription scheduler tick failed", exc=ex)
+            await asyncio.sleep(self.tick)
+
+    async def run_due(self, now: Optional[datetime] = None) -> int:
+        now = now or datetime.now(SUBSCRIPTION_TZ)
+        groups = due_subscriptions(await run_blocking(load_state), now)
+        today = now.date().isoformat()
+        delivered = 0
+        returns: dict[str, tuple] = {}
+        for spec, chat_ids in groups.items():
+            if self.backing_off(spec, today):
+                continue
+            delivered += await self.deliver(spec, chat_ids, today, returns)
+        return delivered
+
+    def backing_off(self, spec: tuple, today: str) -> bool:
+        failure = self._failures.get(spec)
+        if failure is None or failure[0] != today:
+            return False
+        return time.monotonic() < failure[2]
+
+    def _record_failure(self, spec: tuple, today: str) -> None:
+        day, count, _ = self._failures.get(spec, (today, 0, 0.0))
+        count = count + 1 if day == today else 1
+        delay = min(SUBSCRIPTION_RETRY_SECONDS * 2 ** (count - 1), SUBSCRIPTION_RETRY_MAX)
+        self._failures[spec] = (today, count, time.monotonic() + delay)
+        log.warning("subscription spec=%s failed %d time(s); retry in %.0fs", spec, count, delay)
+
+    async def deliver(self, spec: tuple, chat_ids: list[int], today: str,
+                      returns: Optional[dict] = None) -> int:
+        """Renderiza ``spec`` una vez y lo envía a ``chat_ids``.
+
+        ``returns`` comparte el ``get_var`` de cada ventana entre grupos que sólo
+        difieren en top/bottom o normalize; también la falla, así una ventana
+        rota no se recalcula para cada grupo del mismo tick.
+        """
+        window, top_n, bot_n, normalize_flag = spec
+        start = horizon_start(today, window)
+        end = (datetime.fromisoformat(today) + timedelta(days=1)).date().isoformat()
+        returns = {} if returns is None else returns
+        try:
+            if window not in returns:
+                try:
+                    returns[window] = await fetch_with_stale("get_var", get_var, start, end)
+                except Exception as ex:
+                    returns[window] = ex
+                    raise
+            if isinstance(returns[window], Exception):
+                raise RuntimeError(f"get_var {window} falló en este ciclo") from returns[window]
+            (series, msg), age = returns[window]
+            img = await RENDER_QUEUE.run(
+                plot_top_bottom, series, top_n, bot_n, start, today, normalize_flag
+            )
+        except Exception as ex:
+            log_exception_with_id(
+                "subscription render failed", exc=ex, spec=spec, chats=len(chat_ids)
+            )
+            self._record_failure(spec, today)
+            return 0
+        self._failures.pop(spec, None)
+        caption = f"Top/Bottom {window} · {start} → {today}"
+        if age is not None:
+            caption += f"\n{stale_note(age)}"
+        if msg:
+            caption += f"\n{msg}"
+        log.info("subscription group spec=%s chats=%d", spec, len(chat_ids))
+
+        pending = list(chat_ids)
+        file_id = None
+        delivered = 0
+        # El PNG se sube hasta que un envío devuelve file_id; el resto lo reutiliza.
+        while pending and file_id is None:
+            chat_id = pending.pop(0)
+            img.seek(0)
+            sent = await self._send(chat_id, img, caption)
+            if sent is not None:
+                delivered += 1
+                photos = getattr(sent, "photo", None) or []
+                file_id = photos[-1].file_id if photos else None
+
+        semaphore = asyncio.Semaphore(self.fanout)
+
+        async def send_cached(chat_id: int):
+            async with semaphore:
+                return await self._send(chat_id, file_id, caption)
+
+        results = await asyncio.gather(*(send_cached(c) for c in pending))
+        delivered += sum(r is not None for r in results)
+        await run_blocking(mark_subscriptions_sent, chat_ids, today)
+        return delivered
+
+    async def _send(self, chat_id: int, photo, caption: str):
+        try:
+            return await SEND_QUEUE.submit(
+                chat_id, self._bot.send_photo, chat_id, photo,
+                caption=caption, priority=PRIORITY_BULK,
+            )
+        except Exception as ex:
+            log.warning("subscription send failed chat_id=%s: %s", chat_id, ex)
+            return None
+
+
+SUBSCRIPTIONS = SubscriptionScheduler(SUBSCRIPTION_TICK, SUBSCRIPTION_FANOUT)
+
+# ---------------------- MODO INLINE -------------------
+class InlineIndex:
+    """Datos precalculados por ticker para responder inline queries sin descargar.
+
+    Un refresco en segundo plano (cada ``refresh_seconds``) arma, desde la
+    matriz de precios en USD del último año, el último valor, los retornos de
+    ``INLINE_HORIZONS`` y un sparkline por ticker. Con ``INLINE_THUMB_CHAT`` sube
+    además una miniatura por ticker a ese chat y guarda su ``file_id``, que sólo
+    vale para el bot que la subió. ``tickers`` (default ``universe()``) cubre a
+    todos los bots del proceso; cada uno busca dentro del suyo.
+    """
+
+    def __init__(self, refresh_seconds: float, thumb_chat: Optional[str] = None):
+        self.refresh_seconds = refresh_seconds
+        self.thumb_chat = thumb_chat
+        self.tickers: Optional[list[str]] = None
+        self.entries: dict[str, dict] = {}
+        self.as_of: Optional[str] = None
+        self._thumbs: dict[str, tuple[str, str]] = {}  # ticker → (fecha, file_id)
+        self._bot = None
+        self._task: Optional[asyncio.Task] = None
+        self._refreshed_for: Optional[date] = None
+
+    def build(self, close_usd: pd.DataFrame) -> dict[str, dict]:
+        prices = close_usd.copy()
+        prices.index = from_day_index(prices.index)
+        prices = prices.dropna(axis=1, how="all")
+        if prices.empty:
+            return {}
+        end = prices.index[-1].date().isoformat()
+        table = returns_over_horizons(prices, end, INLINE_HORIZONS)
+        recent = prices.iloc[-60:]
+        entries = {}
+        for ticker in prices.columns:
+            series = prices[ticker].dropna()
+            if series.empty:
+                continue
+            entries[ticker] = {
+                "last": float(series.iloc[-1]),
+                "date": series.index[-1].date().isoformat(),
+                "returns": table.loc[ticker].to_dict(),
+                "spark": sparkline(recent[ticker]),
+                "recent": recent[ticker],
+            }
+        return entries
+
+    @staticmethod
+    def last_session(now: datetime) -> date:
+        """Última rueda cerrada a ``now`` (sin feriados: a lo sumo un refresco de más)."""
+        day = now.date()
+        if now.weekday() < 5 and now.strftime("%H:%M") >= MARKET_HOURS[1]:
+            return day
+        day -= timedelta(days=1)
+        while day.weekday() >= 5:
+            day -= timedelta(days=1)
+        return day
+
+    def needs_refresh(self, now: datetime) -> bool:
+        """En rueda y hasta ``INLINE_SETTLE_UNTIL``; fuera de eso, una vez por rueda cerrada."""
+        if not self.entries or market_open(now):
+            return True
+        if now.weekday() < 5 and MARKET_HOURS[1] <= now.strftime("%H:%M") < INLINE_SETTLE_UNTIL:
+            return True
+        return self._refreshed_for != self.last_session(now)
+
+    async def refresh(self) -> None:
+        now = datetime.now(SUBSCRIPTION_TZ)
+        today = now.date()
+        start = (today - timedelta(days=400)).isoformat()
+        end = (today + timedelta(days=1)).isoformat()
+        close_usd, _ = await run_blocking(get_close_usd, start, end, tickers=self.tickers)
+        entries = await run_blocking(self.build, close_usd)
+        if entries:
+            self.entries = entries
+            self.as_of = max(e["date"] for e in entries.values())
+            self._refreshed_for = self.last_session(now)
+        log.info("InlineIndex refreshed tickers=%d as_of=%s", len(self.entries), self.as_of)
+        if self.thumb_chat and self._bot is not None:
+            await self._upload_thumbs()
+
+    async def _upload_thumbs(self) -> None:
+        for ticker, entry in list(self.entries.items()):
+            cached = self._thumbs.get(ticker)
+            if cached is not None and cached[0] == entry["date"]:
+                continue
+            img = await RENDER_QUEUE.run(plot_sparkline, entry["recent"], prettify_symbol(ticker))
+            try:
+                sent = await SEND_QUEUE.submit(
+                    self.thumb_chat, self._bot.send_photo, self.thumb_chat, img,
+                    disable_notification=True, priority=PRIORITY_BULK,
+                )
+            except Exception as ex:
+                log.warning("InlineIndex thumb upload failed %s: %s", ticker, ex)
+                continue
+            photos = getattr(sent, "photo", None) or []
+            if photos:
+                self._thumbs[ticker] = (entry["date"], photos[-1].file_id)
+
+    def search(self, query: str, limit: int = INLINE_MAX_RESULTS) -> list[str]:
+        """Tickers cuyo símbolo empieza con ``query`` (o los primeros si está vacío)."""
+        words = [w.upper().removesuffix(".BA") for w in query.split()]
+        bot = current_bot()
+        allowed = set(bot.tickers) if bot is not None and bot.tickers else None
+        tickers = sorted(t for t in self.entries if allowed is None or t in allowed)
+        if not words:
+            return tickers[:limit]
+        exact = [norm_ticker_ba(w) for w in words if norm_ticker_ba(w) in tickers]
+        prefix = [t for t in tickers if any(prettify_symbol(t).startswith(w) for w in words)]
+        return list(dict.fromkeys(exact + prefix))[:limit]
+
+    def describe(self, ticker: str) -> tuple[str, str]:
+        """(descripción corta, texto del mensaje) de un ticker."""
+        entry = self.entries[ticker]
+        returns = " · ".join(
+            f"{h} {v:+.1f}%" for h, v in entry["returns"].items() if np.isfinite(v)
+        )
+        short = f"USD {entry['last']:,.2f} · {returns}"
+        text = (
+            f"{prettify_symbol(ticker)} · USD {entry['last']:,.2f} (vía CCL)\n"
+            f"{returns}\n{entry['spark']}\nDatos al {entry['date']}"
+        )
+        return short, text
+
+    def results(self, query: str, bot=None) -> list:
+        out = []
+        for ticker in self.search(query):
+            short, text = self.describe(ticker)
+            thumb = self._thumbs.get(ticker)
+            if thumb is not None and (bot is None or bot is self._bot):
+                out.append(InlineQueryResultCachedPhoto(
+                    id=f"{ticker}:{self.as_of}", photo_file_id=thumb[1], caption=text,
+                ))
+            else:
+                out.append(InlineQueryResultArticle(
+                    id=f"{ticker}:{self.as_of}",
+                    title=f"{prettify_symbol(ticker)}  {self.entries[ticker]['spark']}",
+                    description=short,
+                    input_message_content=InputTextMessageContent(text),
+                ))
+        return out
+
+    def start(self, bot) -> None:
+        self._bot = bot
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                if self.needs_refresh(datetime.now(SUBSCRIPTION_TZ)):
+                    await self.refresh()
+            except Exception as ex:
+                log_exception_with_id("inline index refresh failed", exc=ex)
+            await asyncio.sleep(self.refresh_seconds)
+
+
+INLINE_INDEX = InlineIndex(INLINE_REFRESH_SECONDS, INLINE_THUMB_CHAT)
+
+# ---------------------- BATCH (CLI) ------------------
+def returns_in_range(close_usd: pd.DataFrame, start: str, end: str) -> pd.Series:
+    """Retorno punta a punta (%) dentro de ``[start, end)``, igual que ``get_var``.
+
+    Las filas sin ningún precio (fines de semana y feriados del índice diario
+    del CCL) se descartan antes de tomar la primera y la última rueda.
+    """
+    index = from_day_index(close_usd.index)
+    mask = np.asarray((index >= pd.Timestamp(start)) & (index < pd.Timestamp(end)))
+    window = close_usd.iloc[mask].dropna(how="all")
+    if window.empty:
+        return pd.Series(dtype=np.float64)
+    var = (window.iloc[-1] / window.iloc[0] - 1.0) * 100.0
+    return var.astype(np.float64).dropna().sort_values()
+
+def parse_range(text: str) -> tuple[str, str]:
+    """``YYYY-MM-DD:YYYY-MM-DD`` → (inicio, fin) ISO."""
+    start, sep, end = text.partition(":")
+    if not sep:
+        raise ValueError(f"Rango inválido: {text} (usar INICIO:FIN)")
+    start, end = parse_date(start.strip()), parse_date(end.strip())
+    if start >= end:
+        raise ValueError(f"Rango inválido: {text} (inicio >= fin)")
+    return start, end
+
+def rolling_ranges(window: str, since: str, until: str, every: str = "W-FRI") -> list[tuple[str, str]]:
+    """Ventanas de largo ``window`` (``1M``, ``3M``, ``1Y``…) que terminan en cada fecha de ``every``."""
+    ends = pd.date_range(since, until, freq=every)
+    return [(horizon_start(str(end.date()), window), end.date().isoformat()) for end in ends]
+
+def _batch_job(job: tuple) -> dict:
+    """Un rango del batch: escribe el CSV (y el gráfico) y devuelve su resumen."""
+    start, end, close_usd, out_dir, profile, top_n, bottom_n = job
+    var = returns_in_range(close_usd, start, end)
+    if var.empty:
+        log.warning("run_batch range %s→%s has no returns", start, end)
+    out_dir = Path(out_dir)
+    csv_path = out_dir / f"vars_{start}_{end}.csv"
+    var.rename("var_pct").rename_axis("ticker").to_csv(csv_path, float_format="%.4f")
+    row = {"start": start, "end": end, "tickers": len(var), "csv": csv_path.name}
+    if not var.empty:
+        row.update(best=var.index[-1], best_pct=var.iloc[-1], worst=var.index[0], worst_pct=var.iloc[0])
+    if profile is not None and not var.empty:
+        fig = _draw_top_bottom(var, top_n, bottom_n, start, end, False, "Blues", "Reds", profile)
+        try:
+            chart_path = out_dir / f"vars_{start}_{end}.{image_suffix(profile)}"
+            chart_path.write_bytes(save_figure(fig, profile).getvalue())
+        finally:
+            plt.close(fig)
+        row["chart"] = chart_path.name
+    return row
+
+def run_batch(
+    ranges: list[tuple[str, str]],
+    out_dir: Union[str, Path],
+    *,
+    charts: bool = False,
+    workers: Optional[int] = None,
+    top_n: int = 15,
+    bottom_n: int = 15,
+    tickers: Optional[list[str]] = None,
+    render: Optional[str] = None,
+) -> pd.DataFrame:
+    """Calcula ``get_var`` para muchos rangos con una sola descarga de precios.
+
+    Se baja la unión de los rangos una vez y cada rango se resuelve en un
+    ``ProcessPoolExecutor`` sobre su porción de la matriz (``workers=1`` corre
+    en el proceso actual). Deja ``summary.csv`` junto a los resultados; con
+    ``charts`` los gráficos usan el perfil ``render`` y su extensión.
+    """
+    if not ranges:
+        raise ValueError("No hay rangos para procesar.")
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    earliest = min(start for start, _ in ranges)
+    latest = max(end for _, end in ranges)
+    log.info("run_batch ranges=%d union=%s→%s workers=%s", len(ranges), earliest, latest, workers)
+    close_usd, failed = get_close_usd(earliest, latest, tickers=tickers)
+    if failed:
+        log.warning("run_batch %s", omitted_message(failed))
+
+    index = from_day_index(close_usd.index)
+    profile = render_profile(render) if charts else None
+    jobs = []
+    for start, end in ranges:
+        mask = np.asarray((index >= pd.Timestamp(start)) & (index < pd.Timestamp(end)))
+        window = close_usd.iloc[mask].dropna(how="all")
+        jobs.append((start, end, window, str(out_dir), profile, top_n, bottom_n))
+
+    if workers == 1 or len(jobs) == 1:
+        rows = [_batch_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rows = list(pool.map(_batch_job, jobs))
+    summary = pd.DataFrame(rows)
+    summary.to_csv(out_dir / "summary.csv", index=False, float_format="%.4f")
+    log.info("run_batch done ranges=%d out=%s", len(rows), out_dir)
+    return summary
+
+def bench_render(profiles: Optional[list[str]] = None, *, tickers: int = 12, days: int = 750,
+                 repeat: int = 3, seed: int = 0,
+                 out_dir: Optional[Union[str, Path]] = None) -> pd.DataFrame:
+    """Mide cada perfil de render sobre datos sintéticos (sin red).
+
+    Por perfil y gráfico (ranking de /cclvars, /cclplot superpuesto y en
+    grilla) reporta la mediana de ``draw_ms`` (armar la figura), ``encode_ms``
+    (``save_figure``: rasterizado, bbox ajustado y compresión) y los bytes.
+    Con ``out_dir`` guarda cada imagen como ``{gráfico}_{perfil}.{ext}``.
+    """
+    if out_dir is not None:
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range("2022-01-03", periods=days)
+    prices = pd.DataFrame(
+        100.0 * np.exp(np.cumsum(rng.normal(0.0, 0.02, (days, tickers)), axis=0)),
+        index=index,
+        columns=[f"T{i:02d}.BA" for i in range(tickers)],
+    )
+    returns = (prices.iloc[-1] / prices.iloc[0] - 1.0) * 100.0
+    overlay = prices.iloc[:, :min(tickers, SMALL_MULTIPLES_THRESHOLD)]
+    charts = {
+        "cclvars": lambda p: _draw_top_bottom(
+            returns, 10, 10, "2022-01-03", "2024-12-31", False, "Blues", "Reds", p
+        ),
+        "cclplot": lambda p: _draw_overlay(
+            overlay, "USD", " – USD", PLOT_DOWNSAMPLE,
+            figsize=_scaled((10, 5), p), dpi=p["dpi"],
+        ),
+        "cclplot-grid": lambda p: _draw_small_multiples(
+            prices, "USD", " – USD", PLOT_DOWNSAMPLE, width=12.0 * p["scale"], dpi=p["dpi"]
+        ),
+    }
+    rows = []
+    for name in profiles or list(RENDER_PROFILES):
+        profile = render_profile(name)
+        for chart, draw in charts.items():
+            draw_ms, encode_ms, image = [], [], None
+            for _ in range(max(1, repeat)):
+                started = time.perf_counter()
+                fig = draw(profile)
+                drawn = time.perf_counter()
+                try:
+                    image = save_figure(fig, profile)
+                finally:
+                    plt.close(fig)
+                draw_ms.append((drawn - started) * 1000.0)
+                encode_ms.append((time.perf_counter() - drawn) * 1000.0)
+            if out_dir is not None:
+                (out_dir / f"{chart}_{name}.{image_suffix(profile)}").write_bytes(image.getvalue())
+            rows.append({
+                "profile": name,
+                "chart": chart,
+                "format": profile["format"],
+                "draw_ms": float(np.median(draw_ms)),
+                "encode_ms": float(np.median(encode_ms)),
+                "bytes": image.getbuffer().nbytes,
+            })
+    return pd.DataFrame(rows)
+
+def cli(argv: Optional[list[str]] = None) -> None:
+    """Punto de entrada: sin argumentos (o ``bot``) levanta el bot; ``batch`` corre sin Telegram."""
+    parser = argparse.ArgumentParser(prog="bymacclbot.py")
+    sub = parser.add_subparsers(dest="command")
+    bot = sub.add_parser("bot", help="Levanta el bot de Telegram (default).")
+    bot.add_argument("--bots", default=BOTS_FILE,
+                     help="JSON con varios bots para un mismo proceso (default: CCL_BOTS_FILE).")
+    batch = sub.add_parser("batch", help="Rankings en USD vía CCL para muchos rangos.")
+    batch.add_argument("--range", dest="ranges", action="append", default=[], type=parse_range,
+                       metavar="INICIO:FIN", help="Rango YYYY-MM-DD:YYYY-MM-DD (repetible).")
+    batch.add_argument("--ranges-file", help="Archivo con un rango INICIO:FIN por línea.")
+    batch.add_argument("--rolling", metavar="VENTANA", help="Ventana móvil (1W, 1M, 3M, 1Y…).")
+    batch.add_argument("--since", help="Primera fecha final de la ventana móvil.")
+    batch.add_argument("--until", default=datetime.now().date().isoformat(),
+                       help="Última fecha final de la ventana móvil (default hoy).")
+    batch.add_argument("--every", default="W-FRI", help="Frecuencia pandas de las fechas finales (default W-FRI).")
+    batch.add_argument("--out", default="batch_out", help="Directorio de salida.")
+    batch.add_argument("--charts", action="store_true", help="Guardar también el gráfico de cada rango.")
+    batch.add_argument("--profile", choices=list(RENDER_PROFILES), default=None,
+                       help="Perfil de render de los gráficos (default: CCL_RENDER_PROFILE).")
+    batch.add_argument("--workers", type=int, default=None, help="Procesos del pool (default: CPUs).")
+    batch.add_argument("--top", type=int, default=15)
+    batch.add_argument("--bottom", type=int, default=15)
+    batch.add_argument("--tickers", nargs="+", help="Universo (default: TICKERS).")
+    bench = sub.add_parser("bench-render", help="Tiempo de encode y bytes por perfil de render.")
+    bench.add_argument("--profiles", nargs="+", choices=list(RENDER_PROFILES),
+                       help="Perfiles a medir (default: todos).")
+    bench.add_argument("--repeat", type=int, default=3)
+    bench.add_argument("--tickers", type=int, default=12, help="Series sintéticas (default 12).")
+    bench.add_argument("--out", default=None, help="Directorio donde guardar las imágenes generadas.")
+    args = parser.parse_args(argv)
+
+    if args.command == "bench-render":
+        report = bench_render(args.profiles, tickers=args.tickers, repeat=args.repeat, out_dir=args.out)
+        print(report.to_string(index=False, float_format=lambda v: f"{v:.1f}"))
+        return
+    if args.command != "batch":
+        main(getattr(args, "bots", BOTS_FILE))
+        return
+    ranges = list(args.ranges)
+    if args.ranges_file:
+        with open(args.ranges_file, encoding="utf-8") as file_obj:
+            ranges += [parse_range(line) for line in file_obj if line.strip() and not line.startswith("#")]
+    if args.rolling:
+        if not args.since:
+            parser.error("--rolling requiere --since")
+        ranges += rolling_ranges(args.rolling, args.since, args.until, args.every)
+    if not ranges:
+        parser.error("indicá al menos un --range, --ranges-file o --rolling")
+    tickers = [norm_ticker_ba(t) for t in args.tickers] if args.tickers else None
+    summary = run_batch(
+        ranges, args.out, charts=args.charts, workers=args.workers,
+        top_n=args.top, bottom_n=args.bottom, tickers=tickers, render=args.profile,
+    )
+    print(summary.to_string(index=False))
+
 # ------------------------- MAIN ---------------------
-def main():
+async def _notify_admins(app: Application, text: str) -> None:
+    for chat_id in ADMIN_CHAT_IDS:
+        try:
+            await SEND_QUEUE.submit(
+                chat_id, app.bot.send_message, chat_id, text, priority=PRIORITY_BULK
+            )
+        except Exception as ex:
+            log.warning("admin notify failed chat_id=%s: %s", chat_id, ex)
+
+async def _start_shared(app: Application) -> None:
+    """Arranca lo que comparten todos los bots del proceso."""
+    SEND_QUEUE.start()
+    WATCHDOG.start(functools.partial(_notify_admins, app))
+    INLINE_INDEX.start(app.bot)
+    TICKER_INDEX.start()
+
+async def _stop_shared() -> None:
+    await WATCHDOG.stop()
+    await INLINE_INDEX.stop()
+    await INTRADAY.stop()
+    await TICKER_INDEX.stop()
+    await SEND_QUEUE.stop()
+    await YAHOO_CLIENT.aclose()
+
+async def _post_init(app: Application) -> None:
+    await _start_shared(app)
+    SUBSCRIPTIONS.start(app.bot)
+
+async def _post_shutdown(app: Application) -> None:
+    await SUBSCRIPTIONS.stop()
+    await _stop_shared()
+
+def build_app(token: str, profile: Optional[BotProfile] = None) -> Application:
+    """Application con todos los handlers; con ``profile`` corren con ese bot activo."""
+    builder = Application.builder().token(token)
+    if profile is None:
+        builder = builder.post_init(_post_init).post_shutdown(_post_shutdown)
+    app = builder.build()
+
+    def add_command(name, handler):
+        app.add_handler(CommandHandler(
+            name,
+            with_bot(profile, with_render_profile(profiled(name, with_deadline(name, handler)))),
+        ))
+
+    add_command("start",     cmd_start)
+    add_command("ini",       cmd_ini)
+    add_command("fin",       cmd_fin)
+    add_command("normalize", cmd_normalize)
+    add_command("cclvars",   cmd_cclvars)
+    add_command("cclplot",   cmd_cclplot)
+    add_command("cclhorizontes", cmd_cclhorizontes)
+    add_command("cclriesgo", cmd_cclriesgo)
+    add_command("cclcorr", cmd_cclcorr)
+    add_command("cclperiodos", cmd_cclperiodos)
+    add_command("cclsectores", cmd_cclsectores)
+    add_command("cclexport", cmd_cclexport)
+    add_command("cclsuscribir", cmd_cclsuscribir)
+    add_command("cclvivo", cmd_cclvivo)
+    add_command("cclmovers", cmd_cclmovers)
+    add_command("calidad", cmd_calidad)
+    app.add_handler(CommandHandler("profile", with_bot(profile, cmd_profile)))
+    app.add_handler(CommandHandler("memoria", with_bot(profile, cmd_memoria)))
+    app.add_handler(InlineQueryHandler(with_bot(profile, inline_query)))
+    return app
+
+async def run_bots(profiles: list[BotProfile]) -> None:
+    """Varios bots en un loop: handlers y estado propios, datos y render compartidos.
+
+    Descargas, caches, colas de render/envío, índice inline e intradiario son
+    uno solo (la cola de envío lleva tasas y pausas por bot); el intradiario y el índice inline cubren la unión de universos.
+    Las alertas y miniaturas inline salen por el primer bot.
+    """
+    global INTRADAY
+    tickers = list(dict.fromkeys(t for p in profiles for t in (p.tickers or TICKERS)))
+    INTRADAY = IntradayPoller(
+        INTRADAY_INTERVAL, INTRADAY_POLL_SECONDS, INTRADAY_BUFFER_BARS, tickers=tickers
+    )
+    INLINE_INDEX.tickers = tickers
+    apps = [build_app(p.token, p) for p in profiles]
+    stop = asyncio.Event()
+    if WATCHDOG_EXIT_ON_LIMIT:
+        def restart_process() -> None:
+            soft_restart()
+            stop.set()  # el supervisor (systemd/Docker) relanza el proceso
+
+        WATCHDOG.on_limit = restart_process
+    loop = asyncio.get_running_loop()
+    for sig in ("SIGINT", "SIGTERM"):
+        try:
+            loop.add_signal_handler(getattr(signal, sig), stop.set)
+        except (NotImplementedError, AttributeError):
+            pass
+
+    schedulers: list[SubscriptionScheduler] = []
+    started: list[Application] = []
+    try:
+        for profile, app in zip(profiles, apps):
+            await app.initialize()
+            if not started:
+                await _start_shared(app)
+            await app.start()
+            await app.updater.start_polling()
+            started.append(app)
+            scheduler = SubscriptionScheduler(SUBSCRIPTION_TICK, SUBSCRIPTION_FANOUT)
+            token = _BOT.set(profile)
+            try:
+                scheduler.start(app.bot)  # la tarea hereda el bot activo
+            finally:
+                _BOT.reset(token)
+            schedulers.append(scheduler)
+            log.info("Bot %s listo (%d tickers).", profile.name, len(profile.tickers or TICKERS))
+        await stop.wait()
+    finally:
+        for scheduler in schedulers:
+            await scheduler.stop()
+        for app in reversed(started):
+            await app.updater.stop()
+            await app.stop()
+            await app.shutdown()
+        if started:
+            await _stop_shared()
+
+def main(bots_file: Optional[str] = BOTS_FILE):
+    if bots_file:
+        profiles = load_bots(bots_file)
+        if not profiles:
+            raise SystemExit(f"{bots_file} no define ningún bot.")
+        asyncio.run(run_bots(profiles))
+        return
     if not TOKEN or TOKEN.startswith("REEMPLAZA_"):
         raise SystemExit("Definí TELEGRAM_BOT_TOKEN en el entorno o en TOKEN.")
-    app = Application.builder().token(TOKEN).build()
+    app = build_app(TOKEN)
+    if WATCHDOG_EXIT_ON_LIMIT:
+        def restart_process() -> None:
+            soft_restart()
+            app.stop_running()  # el supervisor (systemd/Docker) relanza el proceso
 
-    app.add_handler(CommandHandler("start",     cmd_start))
-    app.add_handler(CommandHandler("ini",       cmd_ini))
-    app.add_handler(CommandHandler("fin",       cmd_fin))
-    app.add_handler(CommandHandler("normalize", cmd_normalize))
-    app.add_handler(CommandHandler("cclvars",   cmd_cclvars))
-    app.add_handler(CommandHandler("cclplot",   cmd_cclplot))
+        WATCHDOG.on_limit = restart_process
 
     log.info("Bot listo.")
     app.run_polling(close_loop=False)
 
 if __name__ == "__main__":
-    main()
+    cli()
 
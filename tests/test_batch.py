@@ -0,0 +1,87 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+import bymacclbot
+
+
+class BatchTests(unittest.TestCase):
+    def setUp(self):
+        bymacclbot.PRICE_CACHE.clear()
+        dates = pd.date_range("2024-01-01", periods=120)
+        self.prices = pd.DataFrame(
+            {
+                "GGAL.BA": np.linspace(10.0, 22.0, 120),
+                "BMA.BA": np.linspace(20.0, 14.0, 120),
+            },
+            index=dates,
+        )
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.out = Path(tmp.name)
+
+    def _run(self, ranges, **kwargs):
+        with patch.object(bymacclbot, "download_close", return_value=(self.prices, [])) as mock_close, \
+            patch.object(bymacclbot, "download_ccl", return_value=pd.Series(1.0, index=self.prices.index)), \
+            patch.object(bymacclbot, "TICKERS", list(self.prices.columns)):
+            summary = bymacclbot.run_batch(ranges, self.out, **kwargs)
+        return summary, mock_close
+
+    def test_ranges_share_one_download_and_match_get_var(self):
+        ranges = [("2024-01-01", "2024-02-01"), ("2024-02-01", "2024-04-01")]
+
+        summary, mock_close = self._run(ranges, workers=2, charts=True, top_n=1, bottom_n=1)
+
+        mock_close.assert_called_once()
+        self.assertEqual(mock_close.call_args.args, ("2024-01-01", "2024-04-01"))
+        self.assertEqual(list(summary["start"]), ["2024-01-01", "2024-02-01"])
+        first = pd.read_csv(self.out / "vars_2024-01-01_2024-02-01.csv", index_col="ticker")
+        window = self.prices.loc["2024-01-01":"2024-01-31"]
+        expected = (window.iloc[-1] / window.iloc[0] - 1.0) * 100.0
+        np.testing.assert_allclose(first["var_pct"], expected.sort_values(), atol=1e-4)
+        self.assertTrue((self.out / "vars_2024-02-01_2024-04-01.png").read_bytes().startswith(b"\x89PNG"))
+        self.assertTrue((self.out / "summary.csv").exists())
+
+    def test_weekend_boundaries_on_daily_ccl_index_match_get_var(self):
+        days = pd.bdate_range("2024-01-01", "2024-03-01")
+        self.prices = pd.DataFrame(
+            {"GGAL.BA": np.linspace(10.0, 22.0, len(days)), "BMA.BA": np.linspace(20.0, 14.0, len(days))},
+            index=days,
+        )
+        legs = pd.Series(np.linspace(1000.0, 1100.0, len(days)), index=days)
+
+        def download_ccl(start, end):
+            # Como ``ccl_from_legs``: índice diario entre la primera y última rueda
+            return legs.loc[start:pd.Timestamp(end) - pd.Timedelta(days=1)].asfreq("D").ffill()
+
+        # Un rango más amplio hace que los otros caigan dentro del índice diario
+        ranges = [("2024-01-06", "2024-02-01"), ("2024-01-08", "2024-02-05"), ("2024-01-02", "2024-03-01")]
+        with patch.object(bymacclbot, "download_close", return_value=(self.prices, [])), \
+            patch.object(bymacclbot, "download_ccl", side_effect=download_ccl), \
+            patch.object(bymacclbot, "TICKER_INDEX", bymacclbot.TickerIndex()), \
+            patch.object(bymacclbot, "TICKERS", list(self.prices.columns)):
+            summary = bymacclbot.run_batch(ranges, self.out, workers=1)
+            for start, end in ranges:
+                window = self.prices.loc[start:pd.Timestamp(end) - pd.Timedelta(days=1)]
+                with patch.object(bymacclbot, "download_close", return_value=(window, [])):
+                    expected, _ = bymacclbot.get_var(start, end)
+                got = pd.read_csv(self.out / f"vars_{start}_{end}.csv", index_col="ticker")["var_pct"]
+                self.assertEqual(len(got), 2)
+                np.testing.assert_allclose(got, expected, atol=1e-4)
+        self.assertEqual(list(summary["tickers"]), [2, 2, 2])
+
+    def test_rolling_ranges_and_range_parsing(self):
+        ranges = bymacclbot.rolling_ranges("1M", "2024-03-01", "2024-03-31", every="W-FRI")
+        self.assertEqual(ranges[0], ("2024-02-01", "2024-03-01"))
+        self.assertEqual(len(ranges), 5)
+        self.assertEqual(bymacclbot.parse_range("2024-01-01:2024-06-30"), ("2024-01-01", "2024-06-30"))
+        with self.assertRaises(ValueError):
+            bymacclbot.parse_range("2024-06-30:2024-01-01")
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
@@ -0,0 +1,84 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+import pandas as pd
+
+import bymacclbot
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class CircuitBreakerTests(unittest.TestCase):
+    def test_opens_after_threshold_and_allows_single_trial(self):
+        clock = FakeClock()
+        breaker = bymacclbot.CircuitBreaker(
+            "test", failure_threshold=2, reset_timeout=30.0, clock=clock
+        )
+
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertTrue(breaker.is_open)
+        self.assertFalse(breaker.allow())
+
+        clock.now = 31.0
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+        self.assertTrue(breaker.allow())
+
+    def test_yf_download_fails_fast_when_open(self):
+        breaker = bymacclbot.CircuitBreaker("test", failure_threshold=1)
+        with patch.object(bymacclbot, "YAHOO_BREAKER", breaker), \
+            patch.object(bymacclbot.yf, "download", side_effect=TimeoutError("slow")) as mock_dl:
+            with self.assertRaises(TimeoutError):
+                bymacclbot.yf_download(["YPF"])
+            with self.assertRaises(bymacclbot.UpstreamUnavailableError):
+                bymacclbot.yf_download(["YPF"])
+
+        self.assertEqual(mock_dl.call_count, 1)
+
+
+class FetchWithStaleTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        bymacclbot.LAST_GOOD.clear()
+
+    async def test_serves_last_good_data_and_refreshes_once_when_open(self):
+        breaker = bymacclbot.CircuitBreaker("test", failure_threshold=1, reset_timeout=0.0)
+        good = (pd.Series([1.0], index=["ALUA.BA"]), "")
+        calls = []
+
+        def compute(start, end):
+            calls.append((start, end))
+            if len(calls) == 1:
+                return good
+            raise bymacclbot.UpstreamUnavailableError("caído")
+
+        with patch.object(bymacclbot, "YAHOO_BREAKER", breaker), \
+            patch.object(bymacclbot, "STALE_REFRESH_ATTEMPTS", 1):
+            value, age = await bymacclbot.fetch_with_stale("get_var", compute, "a", "b")
+            self.assertIs(value, good)
+            self.assertIsNone(age)
+
+            value, age = await bymacclbot.fetch_with_stale("get_var", compute, "a", "b")
+            self.assertIs(value, good)
+            self.assertIsNotNone(age)
+            self.assertIn(("get_var", "a", "b"), bymacclbot._REFRESHING)
+
+            await bymacclbot.fetch_with_stale("get_var", compute, "a", "b")
+            await asyncio.gather(*bymacclbot._BACKGROUND_TASKS)
+
+        self.assertNotIn(("get_var", "a", "b"), bymacclbot._REFRESHING)
+        self.assertIn("datos de hace", bymacclbot.stale_note(age))
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
@@ -1,7 +1,11 @@
+import asyncio
+import threading
 import unittest
 from types import SimpleNamespace
 from unittest.mock import AsyncMock, patch
 
+import pandas as pd
+
 import bymacclbot
 
 
@@ -131,7 +135,7 @@ class CommandHandlersTests(unittest.IsolatedAsyncioTestCase):
         await bymacclbot.cmd_cclvars(update, context)
 
         message.reply_text.assert_awaited_once_with(
-            "Uso: /cclvars <top_n> <bottom_n> (ej: /cclvars 15 20)"
+            "Uso: /cclvars <top_n> <bottom_n> [txt] (ej: /cclvars 15 20)"
         )
 
     async def test_cmd_cclvars_logs_and_reports_error_when_get_dates_fails(self):
@@ -160,6 +164,168 @@ class CommandHandlersTests(unittest.IsolatedAsyncioTestCase):
             "Error al generar gráfico: boom (error_id=cafebabe)"
         )
 
+    async def test_cmd_cclvars_text_flag_replies_with_ranking_without_render(self):
+        chat_id = 303
+        placeholder = SimpleNamespace(edit_text=AsyncMock())
+        message = SimpleNamespace(
+            reply_text=AsyncMock(return_value=placeholder), reply_photo=AsyncMock()
+        )
+        update = SimpleNamespace(
+            effective_chat=SimpleNamespace(id=chat_id),
+            effective_message=message,
+        )
+        context = SimpleNamespace(args=["1", "1", "txt"])
+        series = pd.Series([-5.0, 2.5, 10.0], index=["BMA.BA", "ALUA.BA", "GGAL.BA"])
+
+        with patch("bymacclbot.get_dates", return_value=("2024-01-01", "2024-02-01")), \
+            patch("bymacclbot.get_normalize", return_value=False), \
+            patch("bymacclbot.get_var", return_value=(series, "")), \
+            patch("bymacclbot.plot_top_bottom") as mock_plot:
+            await bymacclbot.cmd_cclvars(update, context)
+
+        mock_plot.assert_not_called()
+        message.reply_photo.assert_not_called()
+        message.reply_text.assert_awaited_once()
+        text, = placeholder.edit_text.await_args.args
+        self.assertEqual(placeholder.edit_text.await_args.kwargs, {"parse_mode": "HTML"})
+        self.assertIn("GGAL", text)
+        self.assertIn("+10.00%", text)
+        self.assertIn("-5.00%", text)
+        self.assertNotIn("ALUA", text)
+
+    async def test_cmd_cclvars_degrades_to_text_when_render_queue_saturated(self):
+        placeholder = SimpleNamespace(edit_text=AsyncMock())
+        message = SimpleNamespace(
+            reply_text=AsyncMock(return_value=placeholder), reply_photo=AsyncMock()
+        )
+        update = SimpleNamespace(
+            effective_chat=SimpleNamespace(id=404),
+            effective_message=message,
+        )
+        context = SimpleNamespace(args=["2", "2"])
+        series = pd.Series([-1.0, 1.0], index=["BMA.BA", "GGAL.BA"])
+        queue = bymacclbot.RenderQueue(concurrency=1, limit=0)
+
+        with patch("bymacclbot.get_dates", return_value=("2024-03-01", "2024-04-01")), \
+            patch("bymacclbot.get_normalize", return_value=False), \
+            patch("bymacclbot.get_var", return_value=(series, "")), \
+            patch("bymacclbot.RENDER_QUEUE", queue), \
+            patch("bymacclbot.plot_top_bottom") as mock_plot:
+            await bymacclbot.cmd_cclvars(update, context)
+
+        mock_plot.assert_not_called()
+        message.reply_photo.assert_not_called()
+        self.assertIn("Modo texto", placeholder.edit_text.await_args.args[0])
+
+    async def test_cmd_cclvars_posts_ranking_before_chart(self):
+        events = []
+        placeholder = SimpleNamespace(
+            edit_text=AsyncMock(side_effect=lambda *a, **k: events.append("ranking"))
+        )
+        message = SimpleNamespace(
+            reply_text=AsyncMock(return_value=placeholder),
+            reply_photo=AsyncMock(side_effect=lambda *a, **k: events.append("chart")),
+        )
+        update = SimpleNamespace(
+            effective_chat=SimpleNamespace(id=505),
+            effective_message=message,
+        )
+        context = SimpleNamespace(args=["1", "1"])
+        series = pd.Series([-1.0, 1.0], index=["BMA.BA", "GGAL.BA"])
+        progress_calls = []
+
+        def fake_get_var(start, end, progress=None):
+            progress_calls.append(progress)
+            return series, ""
+
+        with patch("bymacclbot.get_dates", return_value=("2024-05-01", "2024-06-01")), \
+            patch("bymacclbot.get_normalize", return_value=False), \
+            patch("bymacclbot.get_var", side_effect=fake_get_var), \
+            patch("bymacclbot.plot_top_bottom", return_value=b"png"):
+            await bymacclbot.cmd_cclvars(update, context)
+
+        self.assertEqual(events, ["ranking", "chart"])
+        self.assertIsInstance(progress_calls[0], bymacclbot.ProgressReporter)
+
+    async def test_progress_reporter_edits_placeholder_with_latest_count(self):
+        placeholder = SimpleNamespace(edit_text=AsyncMock())
+        reporter = bymacclbot.ProgressReporter(placeholder, "Calculando {done}/{total}")
+
+        reporter(10, 60)
+        reporter(20, 60)
+        await reporter.flush()
+        await reporter.flush()
+
+        placeholder.edit_text.assert_awaited_once_with("Calculando 20/60")
+
+    async def test_profile_rejects_non_admin_chats(self):
+        message = SimpleNamespace(reply_text=AsyncMock())
+        update = SimpleNamespace(effective_chat=SimpleNamespace(id=5), effective_message=message)
+
+        with patch("bymacclbot.ADMIN_CHAT_IDS", {1}), patch("bymacclbot.PROFILE_SESSION", None):
+            await bymacclbot.cmd_profile(update, SimpleNamespace(args=["3"]))
+            self.assertIsNone(bymacclbot.PROFILE_SESSION)
+
+        message.reply_text.assert_awaited_once_with("Comando restringido.")
+
+    async def test_profile_captures_next_commands_and_sends_report(self):
+        admin = SimpleNamespace(reply_text=AsyncMock())
+        bot = SimpleNamespace(send_document=AsyncMock())
+
+        def busy(n):
+            return sum(i * i for i in range(n))
+
+        async def handler(update, context):
+            await bymacclbot.run_blocking(busy, 10_000)
+
+        wrapped = bymacclbot.profiled("cclvars", handler)
+        update = SimpleNamespace(effective_chat=SimpleNamespace(id=1), effective_message=admin)
+        with patch("bymacclbot.ADMIN_CHAT_IDS", {1}), patch("bymacclbot.PROFILE_SESSION", None):
+            await bymacclbot.cmd_profile(update, SimpleNamespace(args=["2"], bot=bot))
+            for _ in range(3):
+                await wrapped(update, SimpleNamespace(bot=bot))
+            self.assertIsNone(bymacclbot.PROFILE_SESSION)
+
+        bot.send_document.assert_awaited_once()
+        chat_id, report = bot.send_document.await_args.args
+        self.assertEqual(chat_id, 1)
+        text = report.getvalue().decode()
+        self.assertIn("Comandos perfilados: 2/2", text)
+        self.assertIn("Llamadas bloqueantes perfiladas: 2", text)
+        self.assertIn("busy", text)
+
+    async def test_concurrent_profiled_calls_run_even_if_not_profiled(self):
+        session = bymacclbot.ProfileSession(1, 1)
+        inside = threading.Event()
+        release = threading.Event()
+
+        def slow():
+            inside.set()
+            release.wait(5)
+            return "slow"
+
+        def fast():
+            return "fast"
+
+        def call(func):
+            token = bymacclbot._PROFILE.set(session)
+            try:
+                return bymacclbot.profile_call(func)
+            finally:
+                bymacclbot._PROFILE.reset(token)
+
+        first = asyncio.create_task(asyncio.to_thread(call, slow))
+        await asyncio.to_thread(inside.wait, 5)
+        self.assertEqual(await asyncio.to_thread(call, fast), "fast")
+        release.set()
+        self.assertEqual(await first, "slow")
+        self.assertEqual((session.calls, session.skipped), (1, 1))
+
+        with patch.object(bymacclbot.cProfile.Profile, "enable", side_effect=ValueError("busy")):
+            self.assertEqual(call(fast), "fast")
+        self.assertEqual(session.skipped, 2)
+        self.assertIn("sin perfilar: 2", session.report().getvalue().decode())
+
 
 if __name__ == "__main__":  # pragma: no cover
     unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+import bymacclbot
+
+
+class CompactPricesTests(unittest.TestCase):
+    def test_day_index_roundtrip_and_no_defensive_copy(self):
+        dates = pd.date_range("2024-01-01", periods=3)
+
+        days = bymacclbot.to_day_index(dates)
+        self.assertEqual(days.dtype, np.int32)
+        self.assertTrue(bymacclbot.from_day_index(days).equals(dates))
+        self.assertIs(bymacclbot.ensure_utc_naive_index(dates, copy=False), dates)
+
+    def test_get_var_compact_matches_default_and_reports_stages(self):
+        tickers = ["ALUA.BA", "BMA.BA"]
+        dates = pd.date_range("2024-01-01", periods=3, tz="America/Buenos_Aires")
+        columns = pd.MultiIndex.from_product([["Close"], tickers])
+        bulk = pd.DataFrame(
+            [[100.0, 200.0], [110.0, 190.0], [120.0, 195.0]],
+            index=dates,
+            columns=columns,
+        )
+        ccl_series = pd.Series(
+            [100.0, 105.0, 110.0],
+            index=dates.tz_convert("UTC").tz_localize(None),
+            name="CCL",
+        )
+
+        def run(compact):
+            with patch.object(bymacclbot, "TICKERS", tickers), \
+                patch.object(bymacclbot, "COMPACT_PRICES", compact), \
+                patch.object(bymacclbot, "MEMORY_REPORT", True), \
+                patch.object(bymacclbot.yf, "download", return_value=bulk.copy()), \
+                patch.object(
+                    bymacclbot, "download_ccl", side_effect=lambda s, e: ccl_series.copy()
+                ):
+                result, _ = bymacclbot.get_var("2024-01-01", "2024-01-04")
+            return result, dict(bymacclbot.LAST_MEMORY_REPORT["get_var"])
+
+        default, default_report = run(False)
+        compact, compact_report = run(True)
+
+        self.assertEqual(compact.dtype, np.float64)
+        self.assertEqual(list(compact.index), list(default.index))
+        np.testing.assert_allclose(compact.values, default.values, rtol=1e-5)
+        for stage in ("bulk", "close", "ccl", "close_usd", "var"):
+            self.assertIn(stage, compact_report)
+        self.assertLess(compact_report["close"], default_report["close"])
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
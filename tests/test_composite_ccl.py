@@ -0,0 +1,59 @@
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+import bymacclbot
+
+
+class CompositeCclTests(unittest.TestCase):
+    def setUp(self):
+        bymacclbot.CCL_CACHE.clear()
+        self.dates = pd.date_range("2024-01-01", periods=3)
+        # CCL implícito por par: 1000 / 1010 / 990, salvo un print roto de YPF el día 2
+        self.close = pd.DataFrame(
+            {
+                "YPFD.BA": [20000.0, 20000.0, 20000.0],
+                "YPF": [20.0, 2.0, 20.0],
+                "GGAL.BA": [3030.0, 3030.0, 3030.0],
+                "GGAL": [30.0, 30.0, np.nan],
+                "BMA.BA": [4950.0, 4950.0, 4950.0],
+                "BMA": [50.0, 50.0, 50.0],
+            },
+            index=self.dates,
+        )
+        self.pairs = [("YPFD.BA", "YPF", 1.0), ("GGAL.BA", "GGAL", 10.0), ("BMA.BA", "BMA", 10.0)]
+
+    def _split(self, pairs):
+        local = self.close[[p[0] for p in pairs]]
+        adr = self.close[[p[1] for p in pairs]]
+        return local, adr, np.array([p[2] for p in pairs])
+
+    def test_median_ignores_single_bad_print(self):
+        out = bymacclbot.composite_ccl(*self._split(self.pairs), method="median")
+        np.testing.assert_allclose(out, [1000.0, 1010.0, 995.0])
+
+    def test_trimmed_mean_drops_extremes(self):
+        out = bymacclbot.composite_ccl(*self._split(self.pairs), method="trimmed", trim=0.34)
+        np.testing.assert_allclose(out, [1000.0, 1010.0, 995.0])
+        out = bymacclbot.composite_ccl(*self._split(self.pairs), method="trimmed", trim=0.0)
+        np.testing.assert_allclose(out.iloc[0], 1000.0)
+
+    def test_download_ccl_composite_is_one_cached_batch(self):
+        raw = pd.concat({"Close": self.close}, axis=1)
+        with patch.object(bymacclbot, "CCL_MODE", "composite"), \
+            patch.object(bymacclbot, "CCL_PAIRS", self.pairs), \
+            patch.object(bymacclbot, "CCL_AGGREGATE", "median"), \
+            patch.object(bymacclbot.yf, "download", return_value=raw) as mock_download:
+            first = bymacclbot.download_ccl("2024-01-01", "2024-01-04")
+            second = bymacclbot.download_ccl("2024-01-01", "2024-01-04")
+
+        mock_download.assert_called_once()
+        self.assertEqual(sorted(mock_download.call_args.args[0]), sorted(self.close.columns))
+        self.assertIs(first, second)
+        np.testing.assert_allclose(first, [1000.0, 1010.0, 995.0])
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
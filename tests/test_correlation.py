@@ -0,0 +1,77 @@
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+import bymacclbot
+
+
+class CorrelationTests(unittest.TestCase):
+    def setUp(self):
+        bymacclbot._CORR_CACHE.clear()
+
+    def test_correlation_matrix_matches_pairwise_pandas(self):
+        rng = np.random.default_rng(3)
+        returns = pd.DataFrame(rng.normal(size=(80, 4)), columns=list("abcd"))
+        returns.iloc[:30, 1] = np.nan
+        returns.iloc[50:55, 2] = np.nan
+
+        corr = bymacclbot.correlation_matrix(returns.to_numpy())
+
+        np.testing.assert_allclose(corr, returns.corr().to_numpy(), atol=1e-12)
+
+    def test_cluster_order_groups_correlated_tickers(self):
+        rng = np.random.default_rng(11)
+        base_a = rng.normal(size=200)
+        base_b = rng.normal(size=200)
+        noise = lambda: rng.normal(scale=0.1, size=200)
+        returns = np.column_stack(
+            [base_a + noise(), base_b + noise(), base_a + noise(), base_b + noise()]
+        )
+
+        order = bymacclbot.cluster_order(bymacclbot.correlation_matrix(returns))
+
+        self.assertEqual(sorted(order), [0, 1, 2, 3])
+        pos = {ticker: i for i, ticker in enumerate(order)}
+        self.assertEqual(abs(pos[0] - pos[2]), 1)
+        self.assertEqual(abs(pos[1] - pos[3]), 1)
+
+    def test_get_correlation_is_cached_by_range_and_universe(self):
+        rng = np.random.default_rng(5)
+        dates = pd.date_range("2024-01-01", periods=40)
+        prices = pd.DataFrame(
+            np.exp(np.cumsum(rng.normal(0, 0.01, size=(40, 3)), axis=0)),
+            index=dates,
+            columns=["ALUA.BA", "BMA.BA", "GGAL.BA"],
+        )
+
+        with patch.object(
+            bymacclbot, "get_close_usd", return_value=(prices, [])
+        ) as mock_close:
+            first, _ = bymacclbot.get_correlation("2024-01-01", "2024-02-10")
+            second, _ = bymacclbot.get_correlation("2024-01-01", "2024-02-10")
+            bymacclbot.get_correlation("2024-01-01", "2024-02-10", ("ALUA.BA", "BMA.BA"))
+
+        self.assertIs(first, second)
+        self.assertEqual(mock_close.call_count, 2)
+        self.assertEqual(sorted(first.index), ["ALUA.BA", "BMA.BA", "GGAL.BA"])
+        np.testing.assert_allclose(np.diag(first.to_numpy()), 1.0)
+
+    def test_large_heatmap_is_square_and_fits_telegram_limits(self):
+        names = [f"T{i:02d}.BA" for i in range(61)]
+        corr = pd.DataFrame(np.eye(61), index=names, columns=names)
+        token = bymacclbot._RENDER_PROFILE.set("hq")
+        try:
+            img = bymacclbot.plot_heatmap(corr, "corr", fmt="{:.2f}", square=True)
+        finally:
+            bymacclbot._RENDER_PROFILE.reset(token)
+        with Image.open(img) as im:
+            width, height = im.size
+        self.assertLessEqual(width + height, 10000)
+        self.assertLess(width / height, 1.5)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
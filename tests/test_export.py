@@ -0,0 +1,81 @@
+import asyncio
+import gzip
+import io
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+import bymacclbot
+
+
+class ExportTests(unittest.TestCase):
+    def setUp(self):
+        bymacclbot.PRICE_CACHE.clear()
+        dates = pd.date_range("2024-01-01", periods=1000)
+        self.prices = pd.DataFrame(
+            {
+                "GGAL.BA": np.linspace(10.0, 20.0, 1000),
+                "BMA.BA": np.linspace(20.0, 15.0, 1000),
+            },
+            index=dates,
+        )
+
+    def _frame(self, kind, compact=False):
+        with patch.object(bymacclbot, "download_close", return_value=(self.prices, ["YPFD.BA"])), \
+            patch.object(bymacclbot, "download_ccl", return_value=pd.Series(2.0, index=self.prices.index)), \
+            patch.object(bymacclbot, "COMPACT_PRICES", compact), \
+            patch.object(bymacclbot, "TICKERS", list(self.prices.columns)):
+            return bymacclbot.get_export_frame("2024-01-01", "2026-09-27", kind)
+
+    def test_csv_export_streams_chunks_into_gzip(self):
+        frame, msg = self._frame("series", compact=True)
+        self.assertIn("YPFD", msg)
+
+        doc = bymacclbot.write_export(frame, "csv", chunk_rows=64)
+        try:
+            out = pd.read_csv(io.BytesIO(gzip.decompress(doc.read())), index_col="date", parse_dates=True)
+        finally:
+            doc.close()
+
+        self.assertEqual(out.shape, (1000, 2))
+        self.assertEqual(out.index[0], pd.Timestamp("2024-01-01"))
+        np.testing.assert_allclose(out["GGAL.BA"], self.prices["GGAL.BA"] / 2.0, rtol=1e-5)
+
+    def test_csv_export_of_returns(self):
+        frame, _ = self._frame("vars")
+        doc = bymacclbot.write_export(frame, "csv")
+        with doc:
+            out = pd.read_csv(io.BytesIO(gzip.decompress(doc.read())), index_col="ticker")
+        self.assertEqual(list(out.index), ["GGAL.BA", "BMA.BA"])
+        np.testing.assert_allclose(out["var_pct"], [100.0, -25.0])
+
+    def test_series_export_shares_the_cached_price_matrix(self):
+        bymacclbot.LAST_GOOD.clear()
+        self.addCleanup(bymacclbot.LAST_GOOD.clear)
+        with patch.object(bymacclbot, "download_close", return_value=(self.prices, [])), \
+            patch.object(bymacclbot, "download_ccl", return_value=pd.Series(2.0, index=self.prices.index)), \
+            patch.object(bymacclbot, "COMPACT_PRICES", False), \
+            patch.object(bymacclbot, "TICKERS", list(self.prices.columns)):
+            (close_usd, failed), _ = asyncio.run(bymacclbot.fetch_with_stale(
+                "prices", bymacclbot.close_usd_range, "2024-01-01", "2026-09-27", None
+            ))
+        frame, _ = bymacclbot.export_frame(close_usd, failed, "series")
+
+        cached = bymacclbot.PRICE_CACHE.get(("2024-01-01", "2026-09-27", tuple(self.prices.columns)))
+        stale = bymacclbot.LAST_GOOD.get(("prices", "2024-01-01", "2026-09-27", None))
+        self.assertIs(stale[1][0], cached[1][0])
+        self.assertTrue(np.shares_memory(frame.to_numpy(), close_usd.to_numpy()))
+        self.assertEqual(frame.index.name, "date")
+        self.assertIsNone(close_usd.index.name)
+
+    def test_parquet_without_pyarrow_raises_friendly_error(self):
+        frame, _ = self._frame("vars")
+        with patch.dict("sys.modules", {"pyarrow": None, "pyarrow.parquet": None}):
+            with self.assertRaisesRegex(RuntimeError, "pyarrow"):
+                bymacclbot.write_export(frame, "parquet")
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
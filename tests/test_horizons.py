@@ -0,0 +1,56 @@
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+import bymacclbot
+
+
+class HorizonTests(unittest.TestCase):
+    def test_horizon_start(self):
+        self.assertEqual(bymacclbot.horizon_start("2024-05-31", "1M"), "2024-04-30")
+        self.assertEqual(bymacclbot.horizon_start("2024-05-31", "3M"), "2024-02-29")
+        self.assertEqual(bymacclbot.horizon_start("2024-05-31", "YTD"), "2024-01-01")
+        self.assertEqual(bymacclbot.horizon_start("2024-05-31", "1Y"), "2023-05-31")
+        with self.assertRaises(ValueError):
+            bymacclbot.horizon_start("2024-05-31", "1Q")
+
+    def test_get_var_horizons_uses_single_download_and_matches_get_var_bases(self):
+        dates = pd.date_range("2023-05-01", "2024-05-31", freq="B")
+        prices = pd.DataFrame(
+            {
+                "ALUA.BA": np.linspace(100.0, 200.0, len(dates)),
+                "BMA.BA": np.linspace(300.0, 150.0, len(dates)),
+            },
+            index=dates,
+        )
+        close_usd = prices / 10.0
+        calls = []
+
+        def fake_close_usd(start, end, **kwargs):
+            calls.append((start, end))
+            return close_usd.loc[start:], ["GGAL.BA"]
+
+        with patch.object(bymacclbot, "get_close_usd", side_effect=fake_close_usd):
+            table, msg = bymacclbot.get_var_horizons("2024-05-31", ["1M", "YTD", "1Y"])
+
+        self.assertEqual(calls, [("2023-05-31", "2024-05-31")])
+        self.assertEqual(list(table.columns), ["1M", "YTD", "1Y"])
+        self.assertEqual(msg, "Tickers omitidos por error de descarga: GGAL")
+        for horizon in table.columns:
+            window = close_usd.loc[bymacclbot.horizon_start("2024-05-31", horizon):]
+            expected = (window.iloc[-1] / window.iloc[0] - 1.0) * 100.0
+            np.testing.assert_allclose(table[horizon].values, expected.values)
+
+    def test_plot_horizons_renders_png(self):
+        table = pd.DataFrame(
+            {"1M": [1.0, -2.0, np.nan], "1Y": [10.0, -20.0, 5.0]},
+            index=["ALUA.BA", "BMA.BA", "GGAL.BA"],
+        )
+        bio = bymacclbot.plot_horizons(table, "2024-05-31", top_n=1)
+        self.assertTrue(bio.getvalue().startswith(b"\x89PNG"))
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import numpy as np
+import pandas as pd
+
+import bymacclbot
+
+
+class InlineModeTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        dates = pd.bdate_range("2025-10-01", "2026-10-16")
+        self.prices = pd.DataFrame(
+            {
+                "GGAL.BA": np.linspace(2.0, 4.0, len(dates)),
+                "GARO.BA": np.linspace(1.0, 0.5, len(dates)),
+                "BMA.BA": np.full(len(dates), 3.0),
+            },
+            index=dates,
+        )
+        self.index = bymacclbot.InlineIndex(900)
+        self.index.entries = self.index.build(self.prices)
+        self.index.as_of = "2026-10-16"
+
+    def test_sparkline_scales_to_block_characters(self):
+        self.assertEqual(bymacclbot.sparkline([1, 2, 3, 4, 5, 6, 7, 8]), "▁▂▃▄▅▆▇█")
+        self.assertEqual(len(bymacclbot.sparkline(np.arange(500.0), width=20)), 20)
+        self.assertEqual(bymacclbot.sparkline([np.nan]), "")
+
+    def test_search_and_describe_from_precomputed_entries(self):
+        self.assertEqual(self.index.search("ga"), ["GARO.BA"])
+        self.assertEqual(self.index.search("ggal.ba bm"), ["GGAL.BA", "BMA.BA"])
+        self.assertEqual(self.index.search(""), ["BMA.BA", "GARO.BA", "GGAL.BA"])
+        short, text = self.index.describe("GGAL.BA")
+        self.assertTrue(short.startswith("USD 4.00"))
+        self.assertRegex(text, r"YTD \+\d+\.\d% · 1Y \+\d+\.\d%")
+        self.assertIn("Datos al 2026-10-16", text)
+
+    async def test_inline_query_answers_without_downloading(self):
+        query = SimpleNamespace(query="GGAL", answer=AsyncMock())
+        update = SimpleNamespace(inline_query=query)
+
+        with patch.object(bymacclbot, "INLINE_INDEX", self.index), \
+            patch.object(bymacclbot.yf, "download", side_effect=AssertionError("no downloads")):
+            await bymacclbot.inline_query(update, SimpleNamespace())
+
+        results = query.answer.await_args.args[0]
+        self.assertEqual(len(results), 1)
+        self.assertIsInstance(results[0], bymacclbot.InlineQueryResultArticle)
+        self.assertEqual(results[0].id, "GGAL.BA:2026-10-16")
+        self.assertIn("GGAL", results[0].title)
+
+    def test_refresh_only_while_closes_can_change(self):
+        tz = bymacclbot.SUBSCRIPTION_TZ
+        friday_night = datetime(2026, 10, 16, 20, 0, tzinfo=tz)
+        self.assertTrue(self.index.needs_refresh(friday_night))
+        self.index._refreshed_for = bymacclbot.InlineIndex.last_session(friday_night)
+        self.assertEqual(self.index._refreshed_for.isoformat(), "2026-10-16")
+        for now in (
+            friday_night,
+            datetime(2026, 10, 17, 12, 0, tzinfo=tz),
+            datetime(2026, 10, 19, 9, 0, tzinfo=tz),
+        ):
+            self.assertFalse(self.index.needs_refresh(now), now)
+        self.assertTrue(self.index.needs_refresh(datetime(2026, 10, 19, 11, 30, tzinfo=tz)))
+        self.assertTrue(self.index.needs_refresh(datetime(2026, 10, 19, 18, 0, tzinfo=tz)))
+
+    async def test_refresh_records_the_session_it_covers(self):
+        index = bymacclbot.InlineIndex(900)
+        with patch.object(bymacclbot, "get_close_usd", return_value=(self.prices, [])) as mock_close:
+            await index.refresh()
+        mock_close.assert_called_once()
+        self.assertEqual(
+            index._refreshed_for,
+            index.last_session(datetime.now(bymacclbot.SUBSCRIPTION_TZ)),
+        )
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
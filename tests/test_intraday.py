@@ -0,0 +1,106 @@
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+import bymacclbot
+
+
+def bars(times, **columns):
+    index = pd.DatetimeIndex(times).tz_localize("America/Argentina/Buenos_Aires")
+    return pd.DataFrame(columns, index=index)
+
+
+class IntradayBufferTests(unittest.TestCase):
+    def test_ring_buffer_overwrites_open_bar_and_drops_oldest(self):
+        buf = bymacclbot.IntradayBuffer(["A", "B"], capacity=3)
+
+        added = buf.extend(bars(["2026-10-19 11:00", "2026-10-19 11:01"], A=[1.0, 2.0], B=[5.0, 5.0]))
+        self.assertEqual(added, 2)
+        # la barra de 11:01 se actualiza y llegan dos nuevas: se descarta la de 11:00
+        added = buf.extend(bars(
+            ["2026-10-19 11:00", "2026-10-19 11:01", "2026-10-19 11:02", "2026-10-19 11:03"],
+            A=[1.0, 2.5, 3.0, 4.0], B=[5.0, 5.0, 6.0, np.nan],
+        ))
+        self.assertEqual(added, 2)
+
+        frame = buf.frame()
+        self.assertEqual(len(frame), 3)
+        self.assertEqual(list(frame["A"]), [2.5, 3.0, 4.0])
+        self.assertEqual(frame.index[0], pd.Timestamp("2026-10-19 14:01"))
+
+    def test_new_session_clears_buffer(self):
+        buf = bymacclbot.IntradayBuffer(["A"], capacity=5)
+        buf.extend(bars(["2026-10-16 16:59"], A=[1.0]))
+        buf.extend(bars(["2026-10-19 11:00"], A=[2.0]))
+        self.assertEqual(list(buf.frame()["A"]), [2.0])
+
+
+class IntradayPollerTests(unittest.IsolatedAsyncioTestCase):
+    async def test_poll_serves_live_ccl_and_usd_movers_from_memory(self):
+        with patch.object(bymacclbot, "TICKERS", ["GGAL.BA", "BMA.BA"]):
+            poller = bymacclbot.IntradayPoller("1m", 60, 10)
+        raw = pd.concat({"Close": bars(
+            ["2026-10-19 11:00", "2026-10-19 11:01"],
+            **{"GGAL.BA": [1000.0, 1100.0], "BMA.BA": [2000.0, 1900.0],
+               "YPFD.BA": [40000.0, 40000.0], "YPF": [40.0, 40.0]},
+        )}, axis=1)
+        baseline = pd.DataFrame({"GGAL.BA": [1.0], "BMA.BA": [2.0]}, index=pd.DatetimeIndex(["2026-10-16"]))
+
+        with patch.object(bymacclbot, "TICKERS", ["GGAL.BA", "BMA.BA"]), \
+            patch.object(bymacclbot.yf, "download", return_value=raw) as mock_download, \
+            patch.object(bymacclbot, "get_close_usd", return_value=(baseline, [])) as mock_close:
+            await poller.poll_once()
+            await poller.poll_once()
+            moves = poller.movers()
+
+        self.assertEqual(mock_download.call_count, 2)
+        mock_close.assert_called_once()
+        self.assertEqual(list(poller.live_ccl()), [1000.0, 1000.0])
+        np.testing.assert_allclose(moves.loc[["GGAL.BA", "BMA.BA"]], [10.0, -5.0])
+
+    async def test_restart_while_closed_uses_close_before_buffered_session(self):
+        with patch.object(bymacclbot, "TICKERS", ["GGAL.BA"]):
+            poller = bymacclbot.IntradayPoller("1m", 60, 10)
+        # Sábado: Yahoo devuelve la rueda del viernes
+        raw = pd.concat({"Close": bars(
+            ["2026-10-16 16:59"],
+            **{"GGAL.BA": [1100.0], "YPFD.BA": [40000.0], "YPF": [40.0]},
+        )}, axis=1)
+        history = pd.DataFrame(
+            {"GGAL.BA": [1.0, 1.1]}, index=pd.DatetimeIndex(["2026-10-15", "2026-10-16"])
+        )
+
+        with patch.object(bymacclbot, "TICKERS", ["GGAL.BA"]), \
+            patch.object(bymacclbot.yf, "download", return_value=raw), \
+            patch.object(bymacclbot, "get_close_usd", return_value=(history, [])) as mock_close:
+            await poller.poll_once()
+            moves = poller.movers()
+
+        self.assertEqual(mock_close.call_args.args[1], "2026-10-16")
+        self.assertAlmostEqual(moves["GGAL.BA"], 10.0, places=4)
+
+    def test_closed_market_polls_once_then_backs_off(self):
+        poller = bymacclbot.IntradayPoller("1m", 60, 10)
+        saturday = datetime(2026, 10, 17, 12, 0, tzinfo=bymacclbot.SUBSCRIPTION_TZ)
+        clock = [1000.0]
+        with patch.object(bymacclbot.time, "monotonic", side_effect=lambda: clock[0]):
+            self.assertTrue(poller.should_poll(saturday))
+            # sin barras: reintento recién después del backoff (120 s, luego 240 s)
+            self.assertFalse(poller.should_poll(saturday))
+            clock[0] += 121
+            self.assertTrue(poller.should_poll(saturday))
+            clock[0] += 121
+            self.assertFalse(poller.should_poll(saturday))
+            # con la rueda en el buffer no vuelve a consultar hasta la apertura
+            poller.buffer.extend(bars(["2026-10-16 16:59"], **{"GGAL.BA": [1.0]}))
+            clock[0] += 10_000
+            self.assertFalse(poller.should_poll(saturday))
+            monday = datetime(2026, 10, 19, 11, 30, tzinfo=bymacclbot.SUBSCRIPTION_TZ)
+            self.assertTrue(poller.should_poll(monday))
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import bymacclbot
+
+MB = 1024 * 1024
+
+
+class MemoryWatchdogTests(unittest.TestCase):
+    def test_alerts_on_growth_leaked_figures_and_fires_limit_once(self):
+        on_limit = MagicMock()
+        watchdog = bymacclbot.MemoryWatchdog(60, growth_mb=100, limit_mb=500, on_limit=on_limit)
+        rss = iter([200 * MB, 250 * MB, 320 * MB, 340 * MB, 600 * MB, 700 * MB])
+
+        with patch.object(bymacclbot, "rss_bytes", side_effect=lambda: next(rss)):
+            self.assertEqual(watchdog.check(), [])
+            self.assertEqual(watchdog.check(), [])
+            with self.assertLogs(bymacclbot.log, level="WARNING"):
+                growth = watchdog.check()
+            self.assertEqual(growth, ["RSS 320 MB (+120 MB desde el inicio)"])
+            self.assertEqual(watchdog.check(), [])  # no repite hasta crecer otros 100 MB
+            watchdog.check()
+            watchdog.check()
+
+        on_limit.assert_called_once()
+        self.assertEqual(len(watchdog.samples), 6)
+
+        figs = [bymacclbot.plt.figure() for _ in range(bymacclbot.RENDER_CONCURRENCY + 1)]
+        try:
+            with patch.object(bymacclbot, "rss_bytes", return_value=200 * MB):
+                alerts = bymacclbot.MemoryWatchdog(60, growth_mb=100).check()
+        finally:
+            for fig in figs:
+                bymacclbot.plt.close(fig)
+        self.assertIn(f"{len(figs)} figuras de matplotlib abiertas", alerts)
+
+    def test_live_buffers_are_counted_until_released(self):
+        before = len(bymacclbot._LIVE_BUFFERS)
+        buffers = [bymacclbot.new_buffer(b"x") for _ in range(3)]
+        self.assertEqual(len(bymacclbot._LIVE_BUFFERS), before + 3)
+        del buffers
+        self.assertEqual(len(bymacclbot._LIVE_BUFFERS), before)
+
+    def test_rss_and_tracemalloc_on_demand(self):
+        watchdog = bymacclbot.MemoryWatchdog(60, growth_mb=100)
+        self.assertGreater(bymacclbot.rss_bytes(), 0)
+        try:
+            self.assertIn("activado", watchdog.trace_top())
+            blob = [bytearray(1024) for _ in range(2000)]
+            top = watchdog.trace_top()
+            self.assertIn("test_memory_watchdog.py", top)
+            del blob
+        finally:
+            watchdog.trace_stop()
+        self.assertIn("tracemalloc: inactivo", watchdog.report())
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
@@ -0,0 +1,78 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import bymacclbot
+
+
+class MultiBotTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = Path(self.tmp.name)
+
+    def _write_bots(self, entries):
+        path = self.dir / "bots.json"
+        path.write_text(json.dumps(entries), encoding="utf-8")
+        return path
+
+    def test_load_bots_reads_tokens_universes_and_state_files(self):
+        path = self._write_bots([
+            {"name": "bancos", "token_env": "BANCOS_TOKEN", "tickers": ["ggal", "BMA"]},
+            {"name": "merval", "token": "123:abc", "state_file": str(self.dir / "m.json")},
+        ])
+        with patch.dict(os.environ, {"BANCOS_TOKEN": "456:def"}):
+            bancos, merval = bymacclbot.load_bots(path)
+        self.assertEqual(bancos.token, "456:def")
+        self.assertEqual(bancos.tickers, ["GGAL.BA", "BMA.BA"])
+        self.assertEqual(bancos.state_file, Path("state-bancos.json"))
+        self.assertIsNone(merval.tickers)
+        self.assertEqual(merval.state_file, self.dir / "m.json")
+
+    def test_load_bots_rejects_missing_token_and_duplicate_names(self):
+        with self.assertRaises(SystemExit):
+            bymacclbot.load_bots(self._write_bots([{"name": "a", "token_env": "NO_SUCH_TOKEN_VAR"}]))
+        with self.assertRaises(SystemExit):
+            bymacclbot.load_bots(self._write_bots([
+                {"name": "a", "token": "1:x"}, {"name": "a", "token": "2:y"},
+            ]))
+
+    def test_handlers_see_their_own_state_and_universe(self):
+        bancos = bymacclbot.BotProfile("bancos", "1:x", tickers=["GGAL"], state_file=self.dir / "b.json")
+        merval = bymacclbot.BotProfile("merval", "2:y", state_file=self.dir / "m.json")
+        seen = {}
+
+        async def handler(update, context):
+            bymacclbot.set_chat_state(42, start=update)
+            seen[update] = (bymacclbot.universe(), bymacclbot._cache_key("get_var", ("a", "b")))
+
+        asyncio.run(bymacclbot.with_bot(bancos, handler)("2024-01-01", None))
+        asyncio.run(bymacclbot.with_bot(merval, handler)("2023-01-01", None))
+
+        self.assertIsNone(bymacclbot.current_bot())
+        self.assertEqual(json.loads((self.dir / "b.json").read_text())["42"]["start"], "2024-01-01")
+        self.assertEqual(json.loads((self.dir / "m.json").read_text())["42"]["start"], "2023-01-01")
+        self.assertEqual(seen["2024-01-01"][0], ["GGAL.BA"])
+        self.assertIs(seen["2023-01-01"][0], bymacclbot.TICKERS)
+        # Universos distintos no comparten cache; el universo por defecto conserva su clave
+        self.assertNotEqual(seen["2024-01-01"][1], seen["2023-01-01"][1])
+        self.assertEqual(seen["2023-01-01"][1], ("get_var", "a", "b"))
+
+    def test_inline_search_is_limited_to_bot_universe(self):
+        index = bymacclbot.InlineIndex(60)
+        index.entries = {"GGAL.BA": {}, "GBAN.BA": {}, "YPFD.BA": {}}
+        bancos = bymacclbot.BotProfile("bancos", "1:x", tickers=["GGAL", "YPFD"])
+        token = bymacclbot._BOT.set(bancos)
+        try:
+            self.assertEqual(index.search("G"), ["GGAL.BA"])
+        finally:
+            bymacclbot._BOT.reset(token)
+        self.assertEqual(index.search("G"), ["GBAN.BA", "GGAL.BA"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+import bymacclbot
+
+
+class PeriodReturnsTests(unittest.TestCase):
+    def test_monthly_returns_match_boundary_prices(self):
+        dates = pd.date_range("2024-01-15", "2024-04-10", freq="B")
+        prices = pd.DataFrame(
+            {
+                "ALUA.BA": np.linspace(100.0, 130.0, len(dates)),
+                "BMA.BA": np.linspace(50.0, 40.0, len(dates)),
+            },
+            index=dates,
+        )
+        prices.loc["2024-02-05":"2024-02-09", "BMA.BA"] = np.nan
+
+        table = bymacclbot.period_returns(prices, "M")
+
+        self.assertEqual(list(table.columns), ["2024-01", "2024-02", "2024-03", "2024-04"])
+        month_end = prices.ffill().groupby(prices.index.to_period("M")).last()
+        bounds = pd.concat([prices.iloc[[0]], month_end])
+        expected = (bounds.iloc[1:].to_numpy() / bounds.iloc[:-1].to_numpy() - 1.0) * 100.0
+        np.testing.assert_allclose(table.to_numpy(), expected.T)
+
+    def test_weekly_labels_and_late_listing(self):
+        dates = pd.date_range("2024-01-01", periods=15, freq="B")
+        prices = pd.DataFrame(
+            {"ALUA.BA": np.arange(1.0, 16.0), "BMA.BA": [np.nan] * 7 + list(range(1, 9))},
+            index=dates,
+        )
+
+        table = bymacclbot.period_returns(prices, "W")
+
+        self.assertEqual(list(table.columns), ["2024-01-01", "2024-01-08", "2024-01-15"])
+        self.assertTrue(np.isnan(table.loc["BMA.BA", "2024-01-01"]))
+        self.assertAlmostEqual(table.loc["BMA.BA", "2024-01-15"], (8 / 3 - 1) * 100.0)
+
+
+    def test_long_weekly_heatmap_is_transposed_and_fits_telegram_limits(self):
+        dates = pd.date_range("2023-01-02", periods=95 * 5, freq="B")
+        rng = np.random.default_rng(5)
+        prices = pd.DataFrame(
+            np.exp(rng.normal(0, 0.02, size=(len(dates), 61)).cumsum(axis=0)),
+            index=dates,
+            columns=[f"T{i:02d}.BA" for i in range(61)],
+        )
+        table = bymacclbot.period_returns(prices, "W")
+        self.assertEqual(table.shape, (61, 95))
+
+        token = bymacclbot._RENDER_PROFILE.set("hq")
+        try:
+            img = bymacclbot.plot_heatmap(table, "semanal")
+        finally:
+            bymacclbot._RENDER_PROFILE.reset(token)
+        with Image.open(img) as im:
+            width, height = im.size
+        self.assertLessEqual(width + height, 10000)
+        self.assertGreater(height, width)
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
@@ -1,6 +1,6 @@
 import io
 import unittest
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 import numpy as np
 import pandas as pd
@@ -127,5 +127,125 @@ class PlotTickersUsdNormalizationTests(unittest.TestCase):
         self.assertIn("No se encontraron valores válidos para normalizar", message)
 
 
+class PlotTickersUsdDownsamplingTests(unittest.TestCase):
+    def test_lttb_keeps_endpoints_and_spikes(self):
+        x = np.arange(1000, dtype=float)
+        y = np.zeros(1000)
+        y[437] = 50.0
+
+        idx = bymacclbot.lttb_indices(x, y, 20)
+
+        self.assertEqual(len(idx), 20)
+        self.assertEqual((idx[0], idx[-1]), (0, 999))
+        self.assertIn(437, idx)
+        self.assertTrue(np.all(np.diff(idx) > 0))
+
+    def _plot(self, downsample):
+        start, end = "2000-01-01", "2020-01-01"
+        dates = pd.date_range(start, periods=5000, freq="D")
+        close_df = pd.DataFrame(
+            {"Close": np.linspace(100.0, 500.0, 5000)}, index=dates
+        )
+        ccl_series = pd.Series(100.0, index=dates, name="CCL")
+        ax = MagicMock()
+        fig = MagicMock()
+        fig.savefig.side_effect = lambda bio, *a, **k: bio.write(b"png")
+
+        with patch.object(bymacclbot.yf, "download", return_value=close_df), \
+            patch.object(bymacclbot, "download_ccl", return_value=ccl_series), \
+            patch.object(bymacclbot.plt, "subplots", return_value=(fig, ax)), \
+            patch.object(bymacclbot.plt, "close"):
+            bymacclbot.plot_tickers_usd(
+                ["ALUA"], start, end, normalize_flag=False, downsample=downsample
+            )
+        (x, y), _ = ax.plot.call_args
+        return x, y
+
+    def test_plot_tickers_usd_downsamples_to_pixel_budget(self):
+        x, y = self._plot(downsample=True)
+        self.assertEqual(len(x), 1500)
+        self.assertEqual(len(y), 1500)
+
+    def test_plot_tickers_usd_downsampling_opt_out(self):
+        x, _ = self._plot(downsample=False)
+        self.assertEqual(len(x), 5000)
+
+
+class PlotTickersUsdSmallMultiplesTests(unittest.TestCase):
+    def test_many_tickers_render_as_grid_of_line_collections(self):
+        start, end = "2024-01-01", "2024-12-31"
+        dates = pd.date_range(start, periods=200, freq="D")
+        tickers = [f"T{i}.BA" for i in range(12)]
+        rng = np.random.default_rng(0)
+        prices = 100.0 + rng.standard_normal((200, 12)).cumsum(axis=0)
+        close_df = pd.concat(
+            {"Close": pd.DataFrame(prices, index=dates, columns=tickers)}, axis=1
+        )
+        ccl_series = pd.Series(100.0, index=dates, name="CCL")
+
+        with patch.object(bymacclbot.yf, "download", return_value=close_df), \
+            patch.object(bymacclbot, "download_ccl", return_value=ccl_series), \
+            patch.object(bymacclbot, "_draw_small_multiples",
+                         wraps=bymacclbot._draw_small_multiples) as grid, \
+            patch.object(bymacclbot.plt, "close") as close:
+            bio = bymacclbot.plot_tickers_usd(
+                [t[:-3] for t in tickers], start, end, normalize_flag=True
+            )
+
+        self.assertTrue(bio.getvalue().startswith(b"\x89PNG"))
+        fig = close.call_args.args[0]
+        visible = [ax for ax in fig.axes if ax.get_visible()]
+        self.assertEqual(len(visible), 12)
+        for ax in visible:
+            self.assertEqual(ax.get_lines(), [])
+            self.assertEqual(len(ax.collections), 1)
+            self.assertEqual(len(ax.collections[0].get_segments()), 1)
+        grid.assert_called_once()
+        bymacclbot.plt.close(fig)
+
+    def test_absolute_panels_scale_to_their_own_series(self):
+        dates = pd.date_range("2024-01-01", periods=50, freq="D")
+        plot_df = pd.DataFrame(
+            {
+                "CHEAP.BA": np.linspace(1.0, 2.0, 50),
+                "PRICEY.BA": np.linspace(100.0, 200.0, 50),
+            },
+            index=dates,
+        )
+        fig = bymacclbot._draw_small_multiples(plot_df, "USD", "", False, sharey=False)
+        try:
+            cheap, pricey = fig.axes[:2]
+            low, high = cheap.get_ylim()
+            self.assertGreater(low, 0.5)
+            self.assertLess(high, 2.5)
+            low, high = pricey.get_ylim()
+            self.assertGreater(low, 50.0)
+        finally:
+            bymacclbot.plt.close(fig)
+
+
+class RenderTickersUsdQueueTests(unittest.IsolatedAsyncioTestCase):
+    async def test_download_runs_outside_the_render_queue(self):
+        queue = bymacclbot.RenderQueue(concurrency=1, limit=10)
+        dates = pd.date_range("2024-01-01", periods=5, freq="D")
+        seen = {}
+
+        def frame(tickers, start, end, normalize_flag, *, meter=None):
+            seen["pending"] = queue.pending
+            return pd.DataFrame({"ALUA.BA": np.arange(1.0, 6.0)}, index=dates), ["ALUA.BA"]
+
+        def render(plot_df, tickers_ba, start, end, normalize_flag, downsample=None, **kwargs):
+            seen["rendering"] = queue.pending
+            return io.BytesIO(b"img")
+
+        with patch.object(bymacclbot, "RENDER_QUEUE", queue), \
+            patch.object(bymacclbot, "tickers_usd_frame", side_effect=frame), \
+            patch.object(bymacclbot, "render_tickers_usd", side_effect=render):
+            bio = await bymacclbot._render_tickers_usd(["ALUA"], "2024-01-01", "2024-01-06", False)
+
+        self.assertEqual(bio.getvalue(), b"img")
+        self.assertEqual(seen, {"pending": 0, "rendering": 1})
+
+
 if __name__ == "__main__":  # pragma: no cover
     unittest.main()
@@ -0,0 +1,126 @@
+import io
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import matplotlib.pyplot as plt
+import pandas as pd
+from PIL import Image
+
+import bymacclbot
+
+
+def _figure():
+    fig, ax = plt.subplots(figsize=(4, 3), dpi=80)
+    ax.plot(range(50), [i % 7 for i in range(50)])
+    ax.set_title("test")
+    return fig
+
+
+class RenderProfileTests(unittest.TestCase):
+    def _save(self, profile):
+        fig = _figure()
+        try:
+            return bymacclbot.save_figure(fig, profile).getvalue()
+        finally:
+            plt.close(fig)
+
+    def test_encodings_follow_profile(self):
+        standard = self._save(bymacclbot.RENDER_PROFILES["standard"])
+        fast = self._save(bymacclbot.RENDER_PROFILES["fast"])
+        jpeg = self._save(dict(bymacclbot.RENDER_PROFILES["standard"], format="jpeg"))
+        self.assertTrue(standard.startswith(b"\x89PNG"))
+        self.assertTrue(jpeg.startswith(b"\xff\xd8"))
+        with Image.open(io.BytesIO(fast)) as img:
+            self.assertEqual(img.mode, "P")
+        self.assertLess(len(fast), len(standard))
+
+    def test_load_caps_profile_but_never_upgrades(self):
+        with patch.object(bymacclbot, "RENDER_LOAD_PROFILES", [(6, "fast"), (3, "standard")]):
+            self.assertEqual(bymacclbot.profile_for_load("hq", 0), "hq")
+            self.assertEqual(bymacclbot.profile_for_load("hq", 3), "standard")
+            self.assertEqual(bymacclbot.profile_for_load("hq", 7), "fast")
+            self.assertEqual(bymacclbot.profile_for_load("fast", 3), "fast")
+            self.assertEqual(bymacclbot.profile_for_load("nope", 0), bymacclbot.RENDER_PROFILE_DEFAULT)
+
+    def test_bench_reports_bytes_per_profile(self):
+        report = bymacclbot.bench_render(["fast"], tickers=3, days=60, repeat=1)
+        self.assertEqual(set(report["chart"]), {"cclvars", "cclplot", "cclplot-grid"})
+        self.assertTrue((report["bytes"] > 0).all())
+        self.assertTrue((report["encode_ms"] > 0).all())
+
+    def test_saved_images_use_the_profile_extension(self):
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.dict(bymacclbot.RENDER_PROFILES,
+                           {"web": dict(bymacclbot.RENDER_PROFILES["fast"], format="jpeg", colors=0)}):
+            bymacclbot.bench_render(["web"], tickers=3, days=60, repeat=1, out_dir=tmp)
+            self.assertEqual(
+                sorted(p.name for p in Path(tmp).iterdir()),
+                ["cclplot-grid_web.jpg", "cclplot_web.jpg", "cclvars_web.jpg"],
+            )
+            close = pd.DataFrame(
+                {"A.BA": [1.0, 2.0], "B.BA": [2.0, 1.0]},
+                index=pd.to_datetime(["2024-01-02", "2024-01-03"]),
+            )
+            row = bymacclbot._batch_job(
+                ("2024-01-01", "2024-01-04", close, tmp, bymacclbot.render_profile("web"), 1, 1)
+            )
+            self.assertEqual(row["chart"], "vars_2024-01-01_2024-01-04.jpg")
+            self.assertTrue((Path(tmp) / row["chart"]).read_bytes().startswith(b"\xff\xd8"))
+
+
+class RenderProfileSelectionTests(unittest.IsolatedAsyncioTestCase):
+    async def test_render_queue_uses_chat_profile_capped_by_load(self):
+        queue = bymacclbot.RenderQueue(concurrency=1, limit=10)
+        token = bymacclbot._RENDER_PROFILE.set("hq")
+        try:
+            seen = await queue.run(lambda: bymacclbot.render_profile()["dpi"])
+            self.assertEqual(seen, bymacclbot.RENDER_PROFILES["hq"]["dpi"])
+            queue.pending = 6
+            with patch.object(bymacclbot, "RENDER_LOAD_PROFILES", [(6, "fast")]):
+                seen = await queue.run(lambda: bymacclbot.render_profile()["dpi"])
+            self.assertEqual(seen, bymacclbot.RENDER_PROFILES["fast"]["dpi"])
+        finally:
+            bymacclbot._RENDER_PROFILE.reset(token)
+
+    async def test_stale_plot_cache_is_keyed_by_render_profile(self):
+        bymacclbot.LAST_GOOD.clear()
+        self.addCleanup(bymacclbot.LAST_GOOD.clear)
+        dates = pd.date_range("2024-01-01", periods=30, freq="D")
+        frame = pd.DataFrame({"ALUA.BA": range(30)}, index=dates, dtype=float)
+        web = dict(bymacclbot.RENDER_PROFILES["fast"], format="jpeg", colors=0)
+        args = (["ALUA"], "2024-01-01", "2024-01-31", False)
+        with patch.dict(bymacclbot.RENDER_PROFILES, {"web": web}), \
+                patch.object(bymacclbot, "tickers_usd_frame", return_value=(frame, ["ALUA.BA"])):
+            for name in ("standard", "web"):
+                await bymacclbot.fetch_with_stale(
+                    "plot_tickers_usd", bymacclbot._render_tickers_usd, *args, name
+                )
+        png = bymacclbot.LAST_GOOD.get(("plot_tickers_usd", ("ALUA",), *args[1:], "standard"))
+        jpeg = bymacclbot.LAST_GOOD.get(("plot_tickers_usd", ("ALUA",), *args[1:], "web"))
+        self.assertTrue(png[1].startswith(b"\x89PNG"))
+        self.assertTrue(jpeg[1].startswith(b"\xff\xd8"))
+
+    async def test_cmd_calidad_persists_choice_used_by_handlers(self):
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(bymacclbot, "STATE_FILE", Path(tmp) / "state.json"):
+            message = SimpleNamespace(reply_text=AsyncMock())
+            update = SimpleNamespace(effective_chat=SimpleNamespace(id=7), effective_message=message)
+            await bymacclbot.cmd_calidad(update, SimpleNamespace(args=["fast"]))
+            self.assertEqual(bymacclbot.get_render_choice(7), "fast")
+            self.assertIn("fast", message.reply_text.await_args.args[0])
+
+            async def handler(update, context):
+                return bymacclbot.render_profile()
+
+            wrapped = bymacclbot.with_render_profile(handler)
+            self.assertIs(await wrapped(update, None), bymacclbot.RENDER_PROFILES["fast"])
+
+            await bymacclbot.cmd_calidad(update, SimpleNamespace(args=["default"]))
+            self.assertIsNone(bymacclbot.get_render_choice(7))
+
+
+if __name__ == "__main__":
+    unittest.main()
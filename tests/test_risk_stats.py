@@ -0,0 +1,55 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import bymacclbot
+
+
+class RiskStatsTests(unittest.TestCase):
+    def test_matches_per_ticker_reference(self):
+        rng = np.random.default_rng(7)
+        dates = pd.date_range("2024-01-01", periods=60, freq="D")
+        prices = pd.DataFrame(
+            np.exp(np.cumsum(rng.normal(0, 0.02, size=(60, 3)), axis=0)) * 10.0,
+            index=dates,
+            columns=["ALUA.BA", "BMA.BA", "GGAL.BA"],
+        )
+        prices.iloc[::7] = np.nan  # días sin rueda para todos (fin de semana)
+
+        stats = bymacclbot.risk_stats(prices)
+
+        for ticker in prices.columns:
+            px = prices[ticker].dropna()
+            daily = px.pct_change().dropna()
+            self.assertAlmostEqual(
+                stats.loc[ticker, "vol"], daily.std() * np.sqrt(252) * 100.0
+            )
+            self.assertAlmostEqual(
+                stats.loc[ticker, "max_dd"], ((px / px.cummax()).min() - 1.0) * 100.0
+            )
+            self.assertAlmostEqual(
+                stats.loc[ticker, "sharpe"], daily.mean() / daily.std() * np.sqrt(252)
+            )
+            self.assertAlmostEqual(stats.loc[ticker, "best_day"], daily.max() * 100.0)
+            self.assertAlmostEqual(stats.loc[ticker, "worst_day"], daily.min() * 100.0)
+
+    def test_late_listing_keeps_leading_nans_out_of_stats(self):
+        prices = pd.DataFrame(
+            {"ALUA.BA": [10.0, 11.0, 12.0, 6.0], "BMA.BA": [np.nan, np.nan, 5.0, 10.0]},
+            index=pd.date_range("2024-01-01", periods=4),
+        )
+
+        stats = bymacclbot.risk_stats(prices)
+
+        self.assertAlmostEqual(stats.loc["ALUA.BA", "max_dd"], -50.0)
+        self.assertAlmostEqual(stats.loc["BMA.BA", "best_day"], 100.0)
+
+    def test_plot_ranked_metric_renders_png(self):
+        values = pd.Series([3.0, -1.0, 2.0], index=["ALUA.BA", "BMA.BA", "GGAL.BA"])
+        bio = bymacclbot.plot_ranked_metric(values, "Sharpe", "Sharpe", top_n=2)
+        self.assertTrue(bio.getvalue().startswith(b"\x89PNG"))
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
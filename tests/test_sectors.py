@@ -0,0 +1,60 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+import bymacclbot
+
+
+class SectorIndicesTests(unittest.TestCase):
+    def setUp(self):
+        bymacclbot.PRICE_CACHE.clear()
+        dates = pd.date_range("2024-01-01", periods=4)
+        self.prices = pd.DataFrame(
+            {
+                "GGAL.BA": [10.0, 11.0, 12.1, 12.1],
+                "BMA.BA": [20.0, 20.0, 18.0, 19.8],
+                "YPFD.BA": [30.0, np.nan, 33.0, 36.3],
+            },
+            index=dates,
+        )
+
+    def test_equal_and_cap_weight_indices(self):
+        sectors = {"Bancos": ["GGAL.BA", "BMA.BA"], "Energía": ["YPFD.BA"]}
+        shares = {"GGAL.BA": 3.0, "BMA.BA": 1.0}
+
+        out = bymacclbot.sector_indices(self.prices, sectors, shares)
+
+        self.assertEqual(list(out.columns), ["Bancos EW", "Bancos CW", "Energía EW"])
+        # EW: promedio simple de retornos diarios (10%/0%, 10%/-10%, 0%/10%)
+        np.testing.assert_allclose(out["Bancos EW"], [100.0, 105.0, 105.0, 110.25])
+        # CW: ponderado por capitalización del día anterior (30/20, 33/20, 36.3/18)
+        cw = [100.0]
+        for prev, ret in [((30, 20), (0.1, 0.0)), ((33, 20), (0.1, -0.1)), ((36.3, 18), (0.0, 0.1))]:
+            cw.append(cw[-1] * (1 + np.dot(prev, ret) / sum(prev)))
+        np.testing.assert_allclose(out["Bancos CW"], cw)
+        # día sin cotización: se arrastra el precio y el salto 30 → 33 no se pierde
+        np.testing.assert_allclose(out["Energía EW"], [100.0, 100.0, 110.0, 121.0])
+
+    def test_sectors_reuse_cached_universe_prices(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as fh:
+            json.dump({"sectors": {"Bancos": ["GGAL", "BMA"]}}, fh)
+        self.addCleanup(os.unlink, fh.name)
+
+        with patch.object(bymacclbot, "SECTORS_FILE", fh.name), \
+            patch.object(bymacclbot, "download_close", return_value=(self.prices, [])) as mock_close, \
+            patch.object(bymacclbot, "download_ccl", return_value=pd.Series(1.0, index=self.prices.index)), \
+            patch.object(bymacclbot, "TICKERS", list(self.prices.columns)):
+            bymacclbot.get_close_usd("2024-01-01", "2024-01-05")
+            out, _ = bymacclbot.get_sector_indices("2024-01-01", "2024-01-05")
+
+        mock_close.assert_called_once()
+        self.assertEqual(list(out.columns), ["Bancos EW"])
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
@@ -0,0 +1,108 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import AsyncMock
+
+from telegram.error import RetryAfter
+
+import bymacclbot
+
+
+class SendQueueTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.queue = bymacclbot.SendQueue(
+            global_rate=1000, global_burst=1000, chat_rate=20, chat_burst=1, max_retries=2
+        )
+        self.queue.start()
+
+    async def asyncTearDown(self):
+        await self.queue.stop()
+
+    async def test_per_chat_rate_does_not_block_other_chats(self):
+        sent = []
+
+        async def send(chat_id, n):
+            sent.append((chat_id, n, time.monotonic()))
+            return n
+
+        started = time.monotonic()
+        results = await asyncio.gather(
+            *(self.queue.submit(1, send, 1, n) for n in range(3)),
+            self.queue.submit(2, send, 2, 0),
+        )
+
+        self.assertEqual(results, [0, 1, 2, 0])
+        chat1 = [t for c, _, t in sent if c == 1]
+        chat2 = [t for c, _, t in sent if c == 2]
+        self.assertGreaterEqual(chat1[-1] - started, 0.09)
+        self.assertLess(chat2[0] - started, 0.04)
+
+    async def test_retry_after_pauses_and_retries(self):
+        func = AsyncMock(side_effect=[RetryAfter(0), "ok"])
+
+        self.assertEqual(await self.queue.submit(1, func, "hola"), "ok")
+        self.assertEqual(func.await_count, 2)
+
+        failing = AsyncMock(side_effect=RetryAfter(0))
+        with self.assertRaises(RetryAfter):
+            await self.queue.submit(1, failing)
+        self.assertEqual(failing.await_count, 3)
+
+    async def test_interactive_replies_go_before_bulk(self):
+        order = []
+
+        async def send(label):
+            order.append(label)
+
+        self.queue._paused_until[None] = asyncio.get_running_loop().time() + 0.05
+        bulk = [
+            asyncio.create_task(
+                self.queue.submit(None, send, f"bulk{i}", priority=bymacclbot.PRIORITY_BULK)
+            )
+            for i in range(3)
+        ]
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(self.queue.submit(None, send, "reply"))
+        await asyncio.sleep(0)
+        self.assertEqual(self.queue.depth, 4)
+        await asyncio.gather(*bulk, interactive)
+
+        self.assertEqual(order[0], "reply")
+        self.assertEqual(self.queue.depth, 0)
+
+    async def test_flood_control_and_chat_rate_are_per_bot(self):
+        bots = [bymacclbot.BotProfile(name, f"{i}:x") for i, name in enumerate(("a", "b"))]
+        flooded = AsyncMock(side_effect=[RetryAfter(1), "a"])
+        sent = []
+
+        async def send(label):
+            sent.append((label, time.monotonic()))
+            return label
+
+        async def submit_as(profile, func, *args):
+            token = bymacclbot._BOT.set(profile)
+            try:
+                return await self.queue.submit(7, func, *args)
+            finally:
+                bymacclbot._BOT.reset(token)
+
+        started = time.monotonic()
+        first = asyncio.create_task(submit_as(bots[0], flooded))
+        await asyncio.sleep(0.02)
+        # mismo chat_id (usuario privado) en el otro bot: ni la pausa ni su bucket lo frenan
+        results = await asyncio.gather(submit_as(bots[1], send, "b1"), submit_as(bots[1], send, "b2"))
+        self.assertEqual(results, ["b1", "b2"])
+        self.assertLess(sent[0][1] - started, 0.2)
+        self.assertFalse(first.done())
+        self.assertEqual(await first, "a")
+        self.assertGreaterEqual(time.monotonic() - started, 0.9)
+
+    async def test_direct_call_when_not_started(self):
+        await self.queue.stop()
+        func = AsyncMock(return_value="x")
+        self.assertEqual(await self.queue.submit(1, func, 2, a=3), "x")
+        func.assert_awaited_once_with(2, a=3)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
@@ -0,0 +1,95 @@
+import json
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pandas as pd
+
+import bymacclbot
+
+
+class SubscriptionTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.state_file = Path(tmp.name) / "state.json"
+        sub = {"time": "18:00", "window": "1M", "top": 5, "bottom": 5}
+        state = {
+            "1": {"normalize": False, "subscription": dict(sub)},
+            "2": {"normalize": False, "subscription": dict(sub)},
+            "3": {"normalize": False, "subscription": dict(sub)},
+            "4": {"normalize": False, "subscription": dict(sub, top=3)},
+            "5": {"normalize": False, "subscription": dict(sub, time="20:00")},
+            "6": {"normalize": False},
+        }
+        self.state_file.write_text(json.dumps(state), encoding="utf-8")
+        patcher = patch.object(bymacclbot, "STATE_FILE", self.state_file)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        bymacclbot.LAST_GOOD.clear()
+
+    def test_due_subscriptions_groups_by_spec(self):
+        state = bymacclbot.load_state()
+        now = datetime(2026, 10, 19, 18, 5, tzinfo=bymacclbot.SUBSCRIPTION_TZ)
+
+        groups = bymacclbot.due_subscriptions(state, now)
+
+        self.assertEqual(groups, {("1M", 5, 5, False): [1, 2, 3], ("1M", 3, 5, False): [4]})
+        saturday = datetime(2026, 10, 17, 18, 5, tzinfo=bymacclbot.SUBSCRIPTION_TZ)
+        self.assertEqual(bymacclbot.due_subscriptions(state, saturday), {})
+
+    async def test_run_due_renders_once_per_group_and_reuses_file_id(self):
+        sent = SimpleNamespace(photo=[SimpleNamespace(file_id="small"), SimpleNamespace(file_id="big")])
+        bot = SimpleNamespace(send_photo=AsyncMock(return_value=sent))
+        scheduler = bymacclbot.SubscriptionScheduler(tick=60, fanout=2)
+        scheduler._bot = bot
+        series = pd.Series([-1.0, 2.0], index=["A.BA", "B.BA"])
+        now = datetime(2026, 10, 19, 18, 5, tzinfo=bymacclbot.SUBSCRIPTION_TZ)
+
+        with patch.object(bymacclbot, "get_var", return_value=(series, "")) as mock_var, \
+            patch.object(bymacclbot, "plot_top_bottom", side_effect=lambda *a: bymacclbot.io.BytesIO(b"png")) as mock_plot:
+            delivered = await scheduler.run_due(now)
+            again = await scheduler.run_due(now)
+
+        self.assertEqual((delivered, again), (4, 0))
+        mock_var.assert_called_once_with("2026-09-19", "2026-10-20")
+        self.assertEqual(mock_plot.call_count, 2)
+        photos = [c.args[1] for c in bot.send_photo.await_args_list]
+        self.assertEqual(sum(p == "big" for p in photos), 2)
+        state = bymacclbot.load_state()
+        self.assertEqual(state["1"]["subscription"]["last_sent"], "2026-10-19")
+        self.assertNotIn("last_sent", state["5"]["subscription"])
+
+    async def test_failed_window_is_not_retried_every_tick(self):
+        bot = SimpleNamespace(send_photo=AsyncMock())
+        scheduler = bymacclbot.SubscriptionScheduler(tick=30, fanout=2)
+        scheduler._bot = bot
+        now = datetime(2026, 10, 19, 18, 5, tzinfo=bymacclbot.SUBSCRIPTION_TZ)
+        clock = [1000.0]
+
+        with patch.object(bymacclbot, "get_var", side_effect=RuntimeError("No hay datos")) as mock_var, \
+            patch.object(bymacclbot.time, "monotonic", side_effect=lambda: clock[0]), \
+            patch.object(bymacclbot, "SUBSCRIPTION_RETRY_SECONDS", 120.0):
+            self.assertEqual(await scheduler.run_due(now), 0)
+            # los dos grupos comparten ventana: una sola llamada por tick
+            self.assertEqual(mock_var.call_count, 1)
+            clock[0] += 30
+            await scheduler.run_due(now)
+            self.assertEqual(mock_var.call_count, 1)
+            clock[0] += 100
+            await scheduler.run_due(now)
+            self.assertEqual(mock_var.call_count, 2)
+            # segunda falla: el próximo intento espera el doble
+            clock[0] += 130
+            await scheduler.run_due(now)
+            self.assertEqual(mock_var.call_count, 2)
+
+        bot.send_photo.assert_not_awaited()
+        self.assertNotIn("last_sent", bymacclbot.load_state()["1"]["subscription"])
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
@@ -0,0 +1,152 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import pandas as pd
+
+import bymacclbot
+
+
+class TickerIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.index = bymacclbot.TickerIndex(negative_ttl=60, slack_days=10)
+
+    def test_listing_and_delisting_are_deduced_from_covered_range(self):
+        days = pd.date_range("2022-03-01", "2022-06-30", freq="B")
+        close = pd.DataFrame({"NEW.BA": 1.0}, index=days)
+        self.index.record_prices(close, "2021-01-01", "2023-01-01")
+        entry = self.index.get("NEW.BA")
+        self.assertEqual(entry["listed"], "2022-03-01")
+        self.assertEqual(entry["delisted"], "2022-06-30")
+
+        keep, skipped = self.index.select(["NEW.BA"], "2022-07-15", "2023-01-01")
+        self.assertEqual((keep, skipped), ([], ["NEW.BA"]))
+        keep, _ = self.index.select(["NEW.BA"], "2022-01-01", "2022-05-01")
+        self.assertEqual(keep, ["NEW.BA"])
+        # get_var necesita precio en la fecha inicial
+        _, skipped = self.index.select(["NEW.BA"], "2022-01-01", "2022-05-01", full=True)
+        self.assertEqual(skipped, ["NEW.BA"])
+
+    def test_partial_range_does_not_claim_listing(self):
+        days = pd.date_range("2022-03-01", "2022-06-30", freq="B")
+        self.index.record_prices(pd.DataFrame({"OLD.BA": 1.0}, index=days), "2022-03-01", "2022-07-01")
+        entry = self.index.get("OLD.BA")
+        self.assertIsNone(entry["listed"])
+        self.assertIsNone(entry["delisted"])
+
+        # Un rango posterior vacío pero contiguo sí revela el deslistado
+        self.index.record_missing(["OLD.BA"], "2022-07-01", "2022-12-31")
+        self.assertEqual(self.index.get("OLD.BA")["delisted"], "2022-06-30")
+        self.assertTrue(self.index.get("OLD.BA")["valid"])
+
+    def test_unknown_symbol_is_invalid_until_expiry(self):
+        today = pd.Timestamp.today().normalize()
+        start = (today - pd.Timedelta(days=30)).strftime("%Y-%m-%d")
+        end = today.strftime("%Y-%m-%d")
+        self.index.record_missing(["NOPE.BA"], start, end)
+        self.assertTrue(self.index.is_invalid("NOPE.BA"))
+        self.assertEqual(self.index.invalid(["NOPE.BA", "GGAL.BA"]), ["NOPE.BA"])
+        expires = self.index.get("NOPE.BA")["expires"]
+        self.assertFalse(self.index.is_invalid("NOPE.BA", now=expires + 1))
+
+    def test_universe_members_are_never_negative_cached(self):
+        today = pd.Timestamp.today().normalize()
+        start = (today - pd.Timedelta(days=30)).strftime("%Y-%m-%d")
+        self.index.record_missing(["BMA.BA"], start, today.strftime("%Y-%m-%d"))
+        self.assertIsNone(self.index.get("BMA.BA"))
+        self.assertFalse(self.index.is_invalid("BMA.BA"))
+
+    def test_inferred_delisting_expires(self):
+        index = bymacclbot.TickerIndex(slack_days=10, range_ttl=60)
+        days = pd.date_range("2022-03-01", "2022-06-30", freq="B")
+        index.record_prices(pd.DataFrame({"HALT.BA": 1.0}, index=days), "2022-03-01", "2023-01-01")
+        self.assertEqual(index.select(["HALT.BA"], "2022-08-01", "2023-01-01")[1], ["HALT.BA"])
+        delisted_at = index.get("HALT.BA")["delisted_at"]
+        with patch.object(bymacclbot.time, "time", return_value=delisted_at + 61):
+            self.assertEqual(index.select(["HALT.BA"], "2022-08-01", "2023-01-01")[0], ["HALT.BA"])
+        # Si vuelve a cotizar, la deducción se descarta
+        later = pd.date_range("2022-09-01", periods=5, freq="B")
+        index.record_prices(pd.DataFrame({"HALT.BA": 1.0}, index=later), "2022-09-01", "2022-09-08")
+        self.assertIsNone(index.get("HALT.BA")["delisted"])
+
+    def test_empty_historical_range_is_not_negative_cached(self):
+        self.index.record_missing(["IPO.BA"], "2015-01-01", "2015-06-01")
+        self.assertIsNone(self.index.get("IPO.BA"))
+
+    def test_flush_and_reload_roundtrip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "tickers.json"
+            index = bymacclbot.TickerIndex(path, slack_days=10)
+            days = pd.date_range("2022-03-01", periods=5, freq="B")
+            index.record_prices(pd.DataFrame({"GGAL.BA": 1.0}, index=days), "2022-01-01", "2022-03-08")
+            self.assertTrue(index.flush())
+            self.assertFalse(index.flush())
+
+            reloaded = bymacclbot.TickerIndex(path)
+            self.assertEqual(reloaded.get("GGAL.BA")["listed"], "2022-03-01")
+
+
+class TickerIndexIntegrationTests(unittest.TestCase):
+    def setUp(self):
+        self.index = bymacclbot.TickerIndex()
+        today = pd.Timestamp.today().normalize()
+        self.index.record_missing(
+            ["NOPE.BA"],
+            (today - pd.Timedelta(days=30)).strftime("%Y-%m-%d"),
+            today.strftime("%Y-%m-%d"),
+        )
+
+    def test_download_close_skips_known_invalid_tickers(self):
+        days = pd.date_range("2024-01-01", periods=3)
+        bulk = pd.concat({"Close": pd.DataFrame({"GGAL.BA": [1.0, 2.0, 3.0]}, index=days)}, axis=1)
+        with patch.object(bymacclbot, "TICKER_INDEX", self.index), \
+            patch.object(bymacclbot, "yf_download", return_value=bulk) as download:
+            close, failed = bymacclbot.download_close(
+                "2024-01-01", "2024-01-04", tickers=["GGAL.BA", "NOPE.BA"]
+            )
+        self.assertEqual(download.call_args.args[0], ["GGAL.BA"])
+        self.assertEqual(list(close.columns), ["GGAL.BA"])
+        self.assertEqual(failed, ["NOPE.BA"])
+        self.assertEqual(self.index.get("GGAL.BA")["last"], "2024-01-03")
+
+    def test_transient_empty_universe_ticker_is_retried_and_reported(self):
+        today = pd.Timestamp.today().normalize()
+        days = pd.date_range(today - pd.Timedelta(days=3), periods=3)
+        start, end = days[0].strftime("%Y-%m-%d"), today.strftime("%Y-%m-%d")
+        bulk = pd.concat({"Close": pd.DataFrame({"GGAL.BA": [1.0, 2.0, 3.0]}, index=days)}, axis=1)
+
+        def fake_download(tickers, **kwargs):
+            # yfinance esconde el error: el reintento de BMA vuelve vacío
+            return bulk if len(tickers) > 1 else pd.DataFrame()
+
+        with patch.object(bymacclbot, "TICKER_INDEX", self.index), \
+            patch.object(bymacclbot, "TICKERS", ["GGAL.BA", "BMA.BA"]), \
+            patch.object(bymacclbot, "download_ccl", return_value=pd.Series(1.0, index=days)), \
+            patch.object(bymacclbot, "yf_download", side_effect=fake_download) as download:
+            for _ in range(2):
+                _, msg = bymacclbot.get_var(start, end)
+                self.assertIn("BMA", msg)
+            self.assertEqual(download.call_args_list[-2].args[0], ["GGAL.BA", "BMA.BA"])
+        self.assertFalse(self.index.is_invalid("BMA.BA"))
+
+    def test_get_var_reports_tickers_skipped_by_the_index(self):
+        days = pd.date_range("2024-01-01", periods=3)
+        bulk = pd.concat({"Close": pd.DataFrame({"GGAL.BA": [1.0, 2.0, 3.0]}, index=days)}, axis=1)
+        with patch.object(bymacclbot, "TICKER_INDEX", self.index), \
+            patch.object(bymacclbot, "TICKERS", ["GGAL.BA", "NOPE.BA"]), \
+            patch.object(bymacclbot, "download_ccl", return_value=pd.Series(1.0, index=days)), \
+            patch.object(bymacclbot, "yf_download", return_value=bulk):
+            _, msg = bymacclbot.get_var("2024-01-01", "2024-01-04")
+        self.assertIn("NOPE", msg)
+
+    def test_plot_rejects_unknown_tickers_without_downloading(self):
+        with patch.object(bymacclbot, "TICKER_INDEX", self.index), \
+            patch.object(bymacclbot, "yf_download") as download:
+            with self.assertRaisesRegex(RuntimeError, "NOPE"):
+                bymacclbot.plot_tickers_usd(["nope"], "2024-01-01", "2024-02-01", False)
+        download.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
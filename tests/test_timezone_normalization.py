@@ -152,6 +152,64 @@ class GetVarRetryBehaviourTests(unittest.TestCase):
             self.assertEqual(list(result.index), ["ALUA.BA"])
             self.assertEqual(message, "Tickers omitidos por error de descarga: BMA")
 
+    def test_progress_downloads_in_chunks_and_reports_counts(self):
+        tickers = ["ALUA.BA", "BMA.BA", "GGAL.BA"]
+        dates = pd.date_range("2024-01-01", periods=3)
+        ccl_series = pd.Series([100.0, 101.0, 102.0], index=dates, name="CCL")
+
+        def fake_download(tickers_arg, *args, **kwargs):
+            columns = pd.MultiIndex.from_product([["Close"], list(tickers_arg)])
+            return pd.DataFrame(100.0, index=dates, columns=columns)
+
+        progress = []
+        with patch.object(bymacclbot, "TICKERS", tickers), \
+            patch.object(bymacclbot, "download_ccl", return_value=ccl_series), \
+            patch.object(bymacclbot.yf, "download", side_effect=fake_download) as mock_download:
+            result, _ = bymacclbot.get_var(
+                "2024-01-01",
+                "2024-01-04",
+                progress=lambda done, total: progress.append((done, total)),
+                chunk_size=2,
+            )
+
+        self.assertEqual(
+            [list(call.args[0]) for call in mock_download.call_args_list],
+            [["ALUA.BA", "BMA.BA"], ["GGAL.BA"]],
+        )
+        self.assertEqual(progress, [(2, 3), (3, 3)])
+        self.assertEqual(set(result.index), set(tickers))
+
+    def test_deadline_returns_completed_chunks_and_omits_the_rest(self):
+        tickers = ["ALUA.BA", "BMA.BA", "GGAL.BA", "YPFD.BA"]
+        dates = pd.date_range("2024-01-01", periods=3)
+        ccl_series = pd.Series([100.0, 101.0, 102.0], index=dates, name="CCL")
+        now = [0.0]
+        deadline = bymacclbot.Deadline(5.0, clock=lambda: now[0])
+
+        def slow_download(tickers_arg, *args, **kwargs):
+            now[0] += 6.0  # el primer lote consume todo el presupuesto
+            columns = pd.MultiIndex.from_product([["Close"], list(tickers_arg)])
+            return pd.DataFrame(100.0, index=dates, columns=columns)
+
+        token = bymacclbot._DEADLINE.set(deadline)
+        try:
+            with patch.object(bymacclbot, "TICKERS", tickers), \
+                patch.object(bymacclbot, "download_ccl", return_value=ccl_series), \
+                patch.object(bymacclbot.yf, "download", side_effect=slow_download) as mock_download:
+                result, message = bymacclbot.get_var("2024-01-01", "2024-01-04", chunk_size=2)
+        finally:
+            bymacclbot._DEADLINE.reset(token)
+
+        mock_download.assert_called_once()
+        self.assertEqual(mock_download.call_args.kwargs["timeout"], 5.0)
+        self.assertEqual(set(result.index), {"ALUA.BA", "BMA.BA"})
+        self.assertEqual(message, "")
+        self.assertEqual(deadline.omitted, ["GGAL.BA", "YPFD.BA"])
+        self.assertEqual(
+            bymacclbot.deadline_message(deadline),
+            "Tickers omitidos por límite de tiempo (5 s): GGAL, YPFD",
+        )
+
 
 if __name__ == "__main__":  # pragma: no cover
     unittest.main()
@@ -0,0 +1,111 @@
+import gzip
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+
+import bymacclbot
+
+FIXTURES = Path(__file__).parent / "fixtures" / "yahoo_chart"
+
+
+class _ChartHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        symbol = self.path.split("?", 1)[0].rsplit("/", 1)[-1]
+        fixture = FIXTURES / f"{symbol}.json"
+        self.server.connections.add(self.client_address)
+        if symbol in self.server.slow:
+            time.sleep(1.5)
+        if not fixture.exists():
+            body = b'{"chart":{"result":null,"error":{"code":"Not Found"}}}'
+            status = 404
+        else:
+            body = fixture.read_bytes()
+            status = 200
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+            self.server.gzipped += 1
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class YahooChartClientTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _ChartHandler)
+        self.server.connections = set()
+        self.server.gzipped = 0
+        self.server.slow = set()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        host, port = self.server.server_address
+        self.client = bymacclbot.YahooChartClient(
+            f"http://{host}:{port}", max_connections=2
+        )
+        self.breaker = bymacclbot.CircuitBreaker("test")
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+        self.server.shutdown()
+        self.server.server_close()
+
+    async def test_fetch_chart_parses_into_numpy_arrays(self):
+        with patch.object(bymacclbot, "YAHOO_BREAKER", self.breaker):
+            days, closes = await self.client.fetch_chart("BMA.BA", "2024-01-01", "2024-01-05")
+
+        self.assertEqual(days.dtype, np.dtype("datetime64[D]"))
+        self.assertEqual(str(days[0]), "2024-01-02")
+        np.testing.assert_array_equal(closes, [3990.0, 4090.0, 3790.0])
+        self.assertGreater(self.server.gzipped, 0)
+
+    async def test_get_var_async_reuses_pooled_connections(self):
+        tickers = ["ALUA.BA", "BMA.BA", "MISSING.BA"]
+        with patch.object(bymacclbot, "YAHOO_BREAKER", self.breaker), \
+            patch.object(bymacclbot, "TICKERS", tickers):
+            for _ in range(3):
+                result, message = await bymacclbot.get_var_async(
+                    "2024-01-01", "2024-01-05", client=self.client
+                )
+
+        self.assertEqual(list(result.index), ["BMA.BA", "ALUA.BA"])
+        self.assertAlmostEqual(result["ALUA.BA"], (880 / 1050 / 0.8 - 1) * 100)
+        self.assertAlmostEqual(result["BMA.BA"], (3790 / 1050 / 3.99 - 1) * 100)
+        self.assertEqual(message, "Tickers omitidos por error de descarga: MISSING")
+        self.assertLessEqual(len(self.server.connections), 2)
+
+    async def test_result_cut_by_deadline_is_not_stored_as_last_good(self):
+        self.server.slow.add("BMA.BA")
+        bymacclbot.LAST_GOOD.clear()
+        self.addCleanup(bymacclbot.LAST_GOOD.clear)
+        deadline = bymacclbot.Deadline(0.5)
+        token = bymacclbot._DEADLINE.set(deadline)
+        try:
+            with patch.object(bymacclbot, "YAHOO_BREAKER", self.breaker), \
+                patch.object(bymacclbot, "TICKER_INDEX", bymacclbot.TickerIndex()), \
+                patch.object(bymacclbot, "TICKERS", ["ALUA.BA", "BMA.BA"]):
+                (result, _), age = await bymacclbot.fetch_with_stale(
+                    "get_var", bymacclbot.get_var_async, "2024-01-01", "2024-01-05",
+                    client=self.client,
+                )
+        finally:
+            bymacclbot._DEADLINE.reset(token)
+
+        self.assertIsNone(age)
+        self.assertEqual(list(result.index), ["ALUA.BA"])
+        self.assertEqual(deadline.omitted, ["BMA.BA"])
+        self.assertIsNone(bymacclbot.LAST_GOOD.get(("get_var", "2024-01-01", "2024-01-05")))
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()